@@ -0,0 +1,241 @@
+# In-memory stand-in for the Bot API server, enough for aiogram bots pointed at it with
+# AiohttpSession(api=TelegramAPIServer.from_base(url)) or TG_API_BASE: getMe, getUpdates (long polling),
+# setWebhook / deleteWebhook (updates are then pushed like Telegram does) and the send/copy/forward/
+# sendMediaGroup methods. Every call can be delayed (--latency-ms) and a share of the send calls answered
+# with 429 retry_after (--flood-rate, --retry-after) to exercise the rate limiter's retry path.
+#   python -m app.bench.fake_bot_api [--host 127.0.0.1] [--port 8081] [--latency-ms 0] [--flood-rate 0] [--retry-after 1]
+# Control endpoints:
+#   POST /control/generate {"total": N, "rate": 0}  N group text updates round-robin over known bots
+#   GET  /control/stats                               bots, generated/pushed updates, method call counts,
+#                                                     deliveries and generate->delivery latency percentiles
+#   POST /control/reset                               clears counters and latency samples
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+
+_SEND_METHODS = {"sendmessage", "forwardmessage", "copymessage", "sendphoto", "senddocument", "sendvideo"}
+_MULTI_METHODS = {"copymessages", "forwardmessages"}
+_FLOODABLE = _SEND_METHODS | _MULTI_METHODS | {"sendmediagroup"}
+
+def percentile(samples: list[float], q: float) -> float:
+	if not samples:
+		return 0.0
+	ordered = sorted(samples)
+	return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class _FakeBot:
+	__slots__ = ("bot_id", "updates", "wakeup", "webhook", "secret")
+
+	def __init__(self, bot_id: int) -> None:
+		self.bot_id = bot_id
+		self.updates: list[dict] = []
+		self.wakeup = asyncio.Event()
+		self.webhook: str | None = None
+		self.secret: str | None = None
+
+class FakeBotAPI:
+	def __init__(self, latency_ms: float = 0.0, flood_rate: float = 0.0, retry_after: int = 1) -> None:
+		self.latency = latency_ms / 1000.0
+		self.flood_rate = flood_rate
+		self.retry_after = retry_after
+		self.bots: dict[str, _FakeBot] = {}
+		self.calls: Counter[str] = Counter()
+		self.generated = 0
+		self.pushed = 0
+		self.push_failed = 0
+		self.flooded = 0
+		self.delivered = 0
+		# (chat_id, message_id) -> when the update was generated; a copy/forward of it is a delivery
+		self._born: dict[tuple[int, int], float] = {}
+		self.latencies: list[float] = []
+		self._update_ids = itertools.count(1)
+		self._message_ids = itertools.count(1)
+		self._session: ClientSession | None = None
+		self._tasks: set[asyncio.Task] = set()
+		self.app = web.Application(client_max_size=64 * 1024 * 1024)
+		self.app.router.add_route("*", "/bot{token}/{method}", self._method)
+		self.app.router.add_post("/control/generate", self._generate)
+		self.app.router.add_get("/control/stats", self._stats)
+		self.app.router.add_post("/control/reset", self._reset)
+		self.app.on_cleanup.append(self._close)
+
+	def _bot(self, token: str) -> _FakeBot:
+		bot = self.bots.get(token)
+		if bot is None:
+			bot = self.bots[token] = _FakeBot(int(token.split(":", 1)[0]))
+		return bot
+
+	async def _method(self, request: web.Request) -> web.Response:
+		token = request.match_info["token"]
+		method = request.match_info["method"].lower()
+		self.calls[method] += 1
+		params = dict(await request.post()) if request.can_read_body else {}
+		params.update(request.query)
+		bot = self._bot(token)
+		if self.latency and method != "getupdates":
+			await asyncio.sleep(self.latency)
+		if method in _FLOODABLE and self.flood_rate and random.random() < self.flood_rate:
+			self.flooded += 1
+			return web.json_response({
+				"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+				"parameters": {"retry_after": self.retry_after},
+			}, status=429)
+		result = await self._call(bot, method, params)
+		return web.json_response({"ok": True, "result": result})
+
+	def _delivered(self, chat_id, message_ids) -> None:
+		now = time.perf_counter()
+		for message_id in message_ids:
+			born = self._born.get((int(chat_id), int(message_id)))
+			if born is not None:
+				self.delivered += 1
+				self.latencies.append(now - born)
+
+	async def _call(self, bot: _FakeBot, method: str, params: dict):
+		if method == "getme":
+			return {"id": bot.bot_id, "is_bot": True, "first_name": "bench", "username": f"bench{bot.bot_id}_bot"}
+		if method == "getupdates":
+			return await self._get_updates(bot, params)
+		if method == "setwebhook":
+			bot.webhook, bot.secret = params.get("url"), params.get("secret_token")
+			return True
+		if method == "deletewebhook":
+			bot.webhook = bot.secret = None
+			return True
+		if method in ("copymessage", "forwardmessage"):
+			self._delivered(params.get("from_chat_id", 0), [params.get("message_id", 0)])
+		elif method in _MULTI_METHODS:
+			self._delivered(params.get("from_chat_id", 0), json.loads(params.get("message_ids", "[]")))
+		if method in _SEND_METHODS:
+			chat_id = int(params.get("chat_id", 0))
+			message_id = next(self._message_ids)
+			if method == "copymessage":
+				return {"message_id": message_id}
+			return {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "supergroup", "title": "bench"}}
+		if method in _MULTI_METHODS:
+			ids = params.get("message_ids", "[]").strip("[]").split(",")
+			return [{"message_id": next(self._message_ids)} for _ in ids]
+		if method == "sendmediagroup":
+			chat_id = int(params.get("chat_id", 0))
+			media = json.loads(params.get("media", "[]"))
+			return [
+				{"message_id": next(self._message_ids), "date": int(time.time()), "chat": {"id": chat_id, "type": "supergroup", "title": "bench"}, "media_group_id": "1"}
+				for _ in media
+			]
+		return True
+
+	async def _get_updates(self, bot: _FakeBot, params: dict) -> list[dict]:
+		offset = int(params.get("offset") or 0)
+		if offset:
+			bot.updates = [u for u in bot.updates if u["update_id"] >= offset]
+		if not bot.updates:
+			bot.wakeup.clear()
+			try:
+				await asyncio.wait_for(bot.wakeup.wait(), timeout=float(params.get("timeout") or 0))
+			except asyncio.TimeoutError:
+				pass
+		return bot.updates[:int(params.get("limit") or 100)]
+
+	def _update(self, bot: _FakeBot) -> dict:
+		update_id = next(self._update_ids)
+		self._born[(-1000000000000 - bot.bot_id, update_id)] = time.perf_counter()
+		return {
+			"update_id": update_id,
+			"message": {
+				"message_id": update_id,
+				"date": int(time.time()),
+				"chat": {"id": -1000000000000 - bot.bot_id, "type": "supergroup", "title": "bench"},
+				"from": {"id": 1000, "is_bot": False, "first_name": "bench"},
+				"text": f"update {update_id}",
+			},
+		}
+
+	async def _generate(self, request: web.Request) -> web.Response:
+		body = await request.json()
+		t = asyncio.create_task(self._produce(int(body["total"]), float(body.get("rate") or 0)))
+		self._tasks.add(t)
+		t.add_done_callback(self._tasks.discard)
+		return web.json_response({"ok": True, "bots": len(self.bots)})
+
+	async def _produce(self, total: int, rate: float) -> None:
+		bots = list(self.bots.values())
+		if not bots:
+			return
+		started = time.monotonic()
+		for i in range(total):
+			bot = bots[i % len(bots)]
+			update = self._update(bot)
+			self.generated += 1
+			if bot.webhook:
+				t = asyncio.create_task(self._push(bot, update))
+				self._tasks.add(t)
+				t.add_done_callback(self._tasks.discard)
+			else:
+				bot.updates.append(update)
+				bot.wakeup.set()
+			if rate > 0:
+				delay = started + (i + 1) / rate - time.monotonic()
+				if delay > 0:
+					await asyncio.sleep(delay)
+			elif i % 1000 == 999:
+				await asyncio.sleep(0)
+
+	async def _push(self, bot: _FakeBot, update: dict) -> None:
+		if self._session is None:
+			self._session = ClientSession(connector=TCPConnector(limit=512), timeout=ClientTimeout(total=60))
+		headers = {"X-Telegram-Bot-Api-Secret-Token": bot.secret} if bot.secret else {}
+		# like Telegram: a failed push is retried until the receiver accepts it
+		for attempt in range(10):
+			try:
+				async with self._session.post(bot.webhook, json=update, headers=headers) as resp:
+					if resp.status == 200:
+						self.pushed += 1
+						return
+			except Exception:
+				pass
+			await asyncio.sleep(0.1 * (attempt + 1))
+		self.push_failed += 1
+
+	async def _stats(self, request: web.Request) -> web.Response:
+		return web.json_response({
+			"bots": len(self.bots),
+			"generated": self.generated,
+			"pushed": self.pushed,
+			"push_failed": self.push_failed,
+			"flooded": self.flooded,
+			"delivered": self.delivered,
+			"latency_p50": percentile(self.latencies, 0.50),
+			"latency_p99": percentile(self.latencies, 0.99),
+			"calls": dict(self.calls),
+		})
+
+	async def _reset(self, request: web.Request) -> web.Response:
+		self.calls.clear()
+		self.generated = self.pushed = self.push_failed = self.flooded = self.delivered = 0
+		self._born.clear()
+		self.latencies = []
+		return web.json_response({"ok": True})
+
+	async def _close(self, app: web.Application) -> None:
+		for t in list(self._tasks):
+			t.cancel()
+		if self._session is not None:
+			await self._session.close()
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8081)
+	parser.add_argument("--latency-ms", type=float, default=0.0)
+	parser.add_argument("--flood-rate", type=float, default=0.0, help="share of send calls answered with 429")
+	parser.add_argument("--retry-after", type=int, default=1)
+	args = parser.parse_args()
+	web.run_app(FakeBotAPI(args.latency_ms, args.flood_rate, args.retry_after).app, host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,115 @@
+# Stand-in for telethon.TelegramClient with just what UserbotRunner uses, so userbot runners can be
+# load-tested without an MTProto connection: app.bench.load swaps it into app.bots.userbot.userbot_runner.
+# emit() feeds a synthetic NewMessage through the registered handlers (the events.NewMessage func
+# predicate included); forward_messages records the delivery and its latency in FakeTelegram.
+import asyncio
+import datetime
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any
+from app.bench.fake_bot_api import percentile
+
+@dataclass
+class FakeMessage:
+	id: int
+	chat_id: int
+	message: str
+	date: datetime.datetime = field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+	sender_id: int | None = None
+	grouped_id: int | None = None
+	entities: list | None = None
+	fwd_from: Any = None
+	file: Any = None
+	photo: Any = None
+	gif: Any = None
+	video_note: Any = None
+	video: Any = None
+	voice: Any = None
+	audio: Any = None
+	sticker: Any = None
+	document: Any = None
+	poll: Any = None
+
+@dataclass
+class FakeEvent:
+	chat_id: int
+	message: FakeMessage
+
+class FakeTelegram:
+	# deliveries of every FakeTelegramClient in the process
+	def __init__(self, latency_ms: float = 0.0) -> None:
+		self.latency = latency_ms / 1000.0
+		self.clients: list["FakeTelegramClient"] = []
+		self.generated = 0
+		self.delivered = 0
+		self.calls = 0
+		self._born: dict[tuple[int, int], float] = {}
+		self.latencies: list[float] = []
+		self._message_ids = itertools.count(1)
+
+	def new_message(self, chat_id: int, text: str) -> FakeMessage:
+		message = FakeMessage(id=next(self._message_ids), chat_id=chat_id, message=text, sender_id=1)
+		self._born[(chat_id, message.id)] = time.perf_counter()
+		self.generated += 1
+		return message
+
+	def delivered_ids(self, chat_id: int, message_ids: list[int]) -> None:
+		now = time.perf_counter()
+		self.calls += 1
+		for message_id in message_ids:
+			born = self._born.get((chat_id, message_id))
+			if born is not None:
+				self.delivered += 1
+				self.latencies.append(now - born)
+
+	def stats(self) -> dict:
+		return {
+			"generated": self.generated,
+			"delivered": self.delivered,
+			"calls": {"forward_messages": self.calls},
+			"latency_p50": percentile(self.latencies, 0.50),
+			"latency_p99": percentile(self.latencies, 0.99),
+		}
+
+telegram = FakeTelegram()
+
+class FakeTelegramClient:
+	def __init__(self, session: Any, api_id: int, api_hash: str) -> None:
+		self.session = session
+		self.handlers: list[tuple[Any, Any]] = []
+		self._disconnected = asyncio.Event()
+		telegram.clients.append(self)
+
+	def add_event_handler(self, callback, event) -> None:
+		self.handlers.append((callback, getattr(event, "func", None)))
+
+	async def start(self) -> "FakeTelegramClient":
+		return self
+
+	async def run_until_disconnected(self) -> None:
+		try:
+			await self._disconnected.wait()
+		finally:
+			telegram.clients.remove(self)
+
+	async def disconnect(self) -> None:
+		self._disconnected.set()
+
+	async def emit(self, chat_id: int, text: str) -> None:
+		event = FakeEvent(chat_id, telegram.new_message(chat_id, text))
+		for callback, func in self.handlers:
+			if func is None or func(event):
+				await callback(event)
+
+	async def forward_messages(self, entity: int, messages: list[int], from_peer: int) -> list[FakeMessage]:
+		if telegram.latency:
+			await asyncio.sleep(telegram.latency)
+		telegram.delivered_ids(from_peer, messages)
+		return [FakeMessage(id=i, chat_id=entity, message="") for i in messages]
+
+	async def get_messages(self, entity: int, ids: int) -> FakeMessage | None:
+		return None
+
+	async def download_media(self, message: Any, file: Any = None) -> bytes | None:
+		return None
@@ -0,0 +1,66 @@
+# Cost of deciding rule filters for one message as the keyword lists grow.
+#   python -m app.bench.filters [--keywords 10000] [--rules 20] [--messages 2000]
+# Compares the compiled SourceFilters (one Aho-Corasick pass + bitmask tests per rule) with evaluating
+# every rule independently with `any(k in text for k in keywords)`.
+import argparse
+import random
+import statistics
+import string
+import time
+from app.bots.runner.filters import MessageFeatures, SourceFilters, TEXT
+
+def _word(rng: random.Random) -> str:
+	return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+
+def _naive(rule_filters: list[dict], text: str) -> list[bool]:
+	text = text.casefold()
+	return [
+		any(k in text for k in f["keywords"]) and not any(k in text for k in f["exclude_keywords"])
+		for f in rule_filters
+	]
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--keywords", type=int, default=10000)
+	parser.add_argument("--rules", type=int, default=20)
+	parser.add_argument("--messages", type=int, default=2000)
+	args = parser.parse_args()
+	rng = random.Random(1)
+	vocabulary = [_word(rng) for _ in range(args.keywords)]
+	per_rule = max(1, args.keywords // args.rules)
+	rule_filters = [
+		{
+			"keywords": vocabulary[i * per_rule:(i + 1) * per_rule],
+			"exclude_keywords": rng.sample(vocabulary, 5),
+		}
+		for i in range(args.rules)
+	]
+	texts = [" ".join(_word(rng) if rng.random() > 0.02 else rng.choice(vocabulary) for _ in range(60)) for _ in range(args.messages)]
+
+	t0 = time.perf_counter()
+	compiled = SourceFilters(rule_filters)
+	print(f"compile {args.keywords} keywords / {args.rules} rules: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+	for name, decide in (
+		("compiled", lambda text: compiled.evaluate(MessageFeatures(text, None, TEXT, False, False))),
+		("naive", lambda text: _naive(rule_filters, text)),
+	):
+		samples = []
+		for text in texts:
+			t = time.perf_counter()
+			decide(text)
+			samples.append((time.perf_counter() - t) * 1e6)
+		samples.sort()
+		print(
+			f"{name:>8}: mean={statistics.fmean(samples):.1f}us p50={samples[len(samples) // 2]:.1f}us "
+			f"p99={samples[int(len(samples) * 0.99)]:.1f}us"
+		)
+
+	mismatches = sum(
+		compiled.evaluate(MessageFeatures(text, None, TEXT, False, False)) != _naive(rule_filters, text)
+		for text in texts
+	)
+	print(f"mismatches vs naive: {mismatches}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,146 @@
+# Ingress cost of N made bots in one process: long polling per bot vs the shared webhook server.
+#   python -m app.bench.ingress [--bots 10,100,1000] [--updates 20000] [--modes polling,webhook] [--sessions own,shared]
+# Every run starts app.bench.fake_bot_api in a subprocess, brings N aiogram bots up against it, then
+# has it emit --updates group messages round-robin over the bots and measures how fast all of them
+# reach a handler. RSS and asyncio task count of this process are taken with the bots idle and after
+# the burst. "own" gives every Bot its own aiohttp pool, "shared" uses app.bots.http's single pool.
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from aiohttp import ClientSession
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from app.bots.http import SharedAiohttpSession
+from app.config import settings
+
+def free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+def rss_mb() -> float:
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	import resource
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def wait_up(url: str) -> None:
+	async with ClientSession() as http:
+		for _ in range(100):
+			try:
+				async with http.get(f"{url}/control/stats") as resp:
+					if resp.status == 200:
+						return
+			except OSError:
+				pass
+			await asyncio.sleep(0.1)
+	raise RuntimeError("fake Bot API did not start")
+
+async def _run(mode: str, sessions: str, bots: int, updates: int) -> None:
+	api_port = free_port()
+	api_url = f"http://127.0.0.1:{api_port}"
+	proc = await asyncio.create_subprocess_exec(sys.executable, "-m", "app.bench.fake_bot_api", "--port", str(api_port))
+	handled = 0
+	done = asyncio.Event()
+
+	async def on_message(message: Message) -> None:
+		nonlocal handled
+		handled += 1
+		if handled >= updates:
+			done.set()
+
+	server = None
+	shared = None
+	instances: list[tuple[Bot, Dispatcher]] = []
+	polling: list[asyncio.Task] = []
+	try:
+		await wait_up(api_url)
+		rss_before = rss_mb()
+		if mode == "webhook":
+			from app.bots.webhook import WebhookServer
+			settings.webhook_host = "127.0.0.1"
+			settings.webhook_port = free_port()
+			settings.webhook_base_url = f"http://127.0.0.1:{settings.webhook_port}"
+			server = WebhookServer()
+			await server.start()
+		slots = asyncio.Semaphore(50)
+		shared = SharedAiohttpSession(api=TelegramAPIServer.from_base(api_url)) if sessions == "shared" else None
+
+		async def bring_up(i: int) -> None:
+			bot = Bot(token=f"{i + 1}:bench", session=shared or AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+			dp = Dispatcher()
+			dp.message.register(on_message)
+			instances.append((bot, dp))
+			async with slots:
+				await bot.me()
+				if server is not None:
+					await server.attach(i + 1, bot, dp)
+			if server is None:
+				polling.append(asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=10)))
+
+		started = time.perf_counter()
+		await asyncio.gather(*(bring_up(i) for i in range(bots)))
+		up_seconds = time.perf_counter() - started
+		await asyncio.sleep(1.0)
+		rss_idle = rss_mb() - rss_before
+		tasks_idle = len(asyncio.all_tasks())
+
+		async with ClientSession() as http:
+			started = time.perf_counter()
+			async with http.post(f"{api_url}/control/generate", json={"total": updates}) as resp:
+				await resp.json()
+			try:
+				await asyncio.wait_for(done.wait(), timeout=300)
+			except asyncio.TimeoutError:
+				pass
+			elapsed = time.perf_counter() - started
+		rss_after = rss_mb() - rss_before
+		print(
+			f"{mode:>8} {sessions:>6} bots={bots:>5} up={up_seconds:6.2f}s handled={handled}/{updates} "
+			f"rate={handled / elapsed:8.0f} upd/s rss idle=+{rss_idle:6.1f}MB burst=+{rss_after:6.1f}MB tasks idle={tasks_idle}"
+		)
+	finally:
+		if polling:
+			await asyncio.gather(*(dp.stop_polling() for _, dp in instances), return_exceptions=True)
+			await asyncio.gather(*polling, return_exceptions=True)
+		if server is not None:
+			await server.stop()
+		for bot, _ in instances:
+			await bot.session.close()
+		if shared is not None:
+			await shared.close_pool()
+		proc.terminate()
+		await proc.wait()
+
+async def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--bots", default="10,100,1000")
+	parser.add_argument("--updates", type=int, default=20000)
+	parser.add_argument("--modes", default="polling,webhook")
+	parser.add_argument("--sessions", default="own,shared")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		await _run(args.modes, args.sessions, int(args.bots), args.updates)
+		return
+	# one process per scenario so memory freed by an earlier run doesn't hide the next run's growth
+	for bots in args.bots.split(","):
+		for mode in args.modes.split(","):
+			for sessions in args.sessions.split(","):
+				child = await asyncio.create_subprocess_exec(
+					sys.executable, "-m", "app.bench.ingress", "--child",
+					"--bots", bots, "--modes", mode, "--sessions", sessions, "--updates", str(args.updates),
+				)
+				await child.wait()
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,215 @@
+# End-to-end load test of the forwarding path without Telegram: N runners with M rules each, driven
+# through the real MadeBotRunner / UserbotRunner, pipeline, rate limiter, Redis and Postgres.
+#   python -m app.bench.load [--kind bot|userbot] [--bots 50] [--rules 5] [--updates 5000] [--rate 0]
+#                            [--latency-ms 0] [--flood-rate 0] [--retry-after 1] [--limits off|real] [--json]
+# Needs DATABASE_URL (migrated) and REDIS_URL; use throwaway ones (CI service containers, a local
+# docker) since the seeded owners are active while the run lasts. Bots talk to app.bench.fake_bot_api
+# in a subprocess through TG_API_BASE, userbot runners get app.bench.fake_telethon's client. The run
+# seeds one user with N bots (or sessions) each owning a task with M rules from its source chat, waits
+# for every runner to be online, sends --updates messages round-robin over the sources and waits for
+# the updates x M deliveries. Reported: throughput, generate -> delivery latency p50/p99, SQL statements
+# per update while the burst runs and RSS per runner. The seeded rows are deleted afterwards.
+# --limits off lifts TG_GLOBAL_RATE/TG_CHAT_RATE/TG_GROUP_PER_MINUTE so the pipeline, not Telegram's
+# quotas, is measured; --flood-rate still exercises the 429 retry path.
+import argparse
+import asyncio
+import json
+import sys
+import time
+from aiohttp import ClientSession
+from sqlalchemy import delete, event
+from app.bench.ingress import free_port, rss_mb, wait_up
+from app.config import settings
+from app.db.base import AsyncSessionFactory, engine
+from app.db.models import Bot, Task, TaskRoutingRule, User, UserSession
+from app.utils.crypto import encrypt_text
+
+_SOURCE = -1000000000000  # fake_bot_api's chat for the bot with token "<n>:..." is _SOURCE - n
+_DESTINATION = -2000000000000
+
+def _source(n: int) -> int:
+	return _SOURCE - n
+
+def _run_base() -> int:
+	# bots/sessions of every run get fresh numbers, hence fresh source chats: message ids restart at 1 in
+	# the fakes, and the dedup keys (destination, source, message) of an earlier run are kept for DEDUP_TTL
+	return (int(time.time()) % 100000) * 100000
+
+async def _seed(kind: str, owners: int, rules: int, base: int) -> tuple[int, list[int]]:
+	async with AsyncSessionFactory() as session:
+		user = User(telegram_user_id=-int(time.time() * 1000))
+		session.add(user)
+		await session.flush()
+		bots = [
+			Bot(owner_id=user.id, name=f"bench{n}", token_encrypted=encrypt_text(f"{n}:bench"), is_active=kind == "bot")
+			for n in range(base + 1, base + (owners if kind == "bot" else 1) + 1)
+		]
+		session.add_all(bots)
+		await session.flush()
+		sessions = []
+		if kind == "userbot":
+			sessions = [
+				UserSession(owner_id=user.id, session_type="telethon", session_encrypted=encrypt_text(f"bench:{n}"), label=f"bench{n}")
+				for n in range(base + 1, base + owners + 1)
+			]
+			session.add_all(sessions)
+			await session.flush()
+		tasks = (
+			[Task(bot_id=b.id, name="bench", task_type="bot") for b in bots] if kind == "bot"
+			else [Task(bot_id=bots[0].id, name="bench", task_type="userbot", user_session_id=s.id) for s in sessions]
+		)
+		session.add_all(tasks)
+		await session.flush()
+		session.add_all(
+			TaskRoutingRule(task_id=task.id, source_chat_id=_source(n), destination_chat_id=_DESTINATION - r)
+			for n, task in enumerate(tasks, base + 1)
+			for r in range(rules)
+		)
+		await session.commit()
+		owner_ids = [b.id for b in bots] if kind == "bot" else [s.id for s in sessions]
+		return user.id, owner_ids
+
+async def _cleanup(user_id: int) -> None:
+	async with AsyncSessionFactory() as session:
+		await session.execute(delete(User).where(User.id == user_id))
+		await session.commit()
+
+async def _drive_userbots(updates: int, rate: float) -> None:
+	from app.bench.fake_telethon import telegram
+	clients = sorted(telegram.clients, key=lambda c: c.session)
+	started = time.monotonic()
+	for i in range(updates):
+		client = clients[i % len(clients)]
+		await client.emit(_source(int(client.session.split(":", 1)[1])), f"update {i}")
+		if rate > 0:
+			delay = started + (i + 1) / rate - time.monotonic()
+			if delay > 0:
+				await asyncio.sleep(delay)
+		elif i % 100 == 99:
+			await asyncio.sleep(0)
+
+async def run(args) -> dict:
+	settings.runner_start_jitter_ms = 0
+	if args.limits == "off":
+		settings.tg_global_rate = settings.tg_chat_rate = 1e6
+		settings.tg_group_per_minute = 1e9
+	proc = None
+	api_url = ""
+	if args.kind == "bot":
+		api_url = f"http://127.0.0.1:{free_port()}"
+		proc = await asyncio.create_subprocess_exec(
+			sys.executable, "-m", "app.bench.fake_bot_api", "--port", api_url.rsplit(":", 1)[1],
+			"--latency-ms", str(args.latency_ms), "--flood-rate", str(args.flood_rate), "--retry-after", str(args.retry_after),
+		)
+		settings.tg_api_base = api_url
+	else:
+		from app.bench import fake_telethon
+		from app.bots.userbot import userbot_runner
+		fake_telethon.telegram.latency = args.latency_ms / 1000.0
+		userbot_runner.TelegramClient = fake_telethon.FakeTelegramClient
+		userbot_runner.StringSession = str
+		settings.telethon_api_id = settings.telethon_api_id or 1
+		settings.telethon_api_hash = settings.telethon_api_hash or "bench"
+	# imported after the settings above: the manager and the shared HTTP session read them once
+	from app.bots.http import close_bot_session
+	from app.bots.runner.manager import RunnerManager
+	manager = RunnerManager()
+	queries = 0
+
+	def count(*_) -> None:
+		nonlocal queries
+		queries += 1
+
+	user_id = None
+	expected = args.updates * args.rules
+	try:
+		if proc is not None:
+			await wait_up(api_url)
+		user_id, owner_ids = await _seed(args.kind, args.bots, args.rules, _run_base())
+		rss_before = rss_mb()
+		started = time.perf_counter()
+		online = await (manager.start_runners(bot_ids=owner_ids) if args.kind == "bot" else manager.start_runners(session_ids=owner_ids))
+		up_seconds = time.perf_counter() - started
+		await asyncio.sleep(1.0)
+		rss_per_runner = (rss_mb() - rss_before) / max(1, online)
+		event.listen(engine.sync_engine, "before_cursor_execute", count)
+		async with ClientSession() as http:
+			started = time.perf_counter()
+			if proc is not None:
+				async with http.post(f"{api_url}/control/generate", json={"total": args.updates, "rate": args.rate}) as resp:
+					await resp.json()
+			else:
+				await _drive_userbots(args.updates, args.rate)
+			deadline = started + args.timeout
+			while True:
+				if proc is not None:
+					async with http.get(f"{api_url}/control/stats") as resp:
+						stats = await resp.json()
+				else:
+					from app.bench.fake_telethon import telegram
+					stats = telegram.stats()
+				if stats["delivered"] >= expected or time.perf_counter() >= deadline:
+					break
+				await asyncio.sleep(0.2)
+			elapsed = time.perf_counter() - started
+		event.remove(engine.sync_engine, "before_cursor_execute", count)
+		return {
+			"kind": args.kind,
+			"runners": len(owner_ids),
+			"online": online,
+			"rules": args.rules,
+			"updates": args.updates,
+			"up_seconds": round(up_seconds, 2),
+			"delivered": stats["delivered"],
+			"expected": expected,
+			"seconds": round(elapsed, 2),
+			"updates_per_second": round(args.updates / elapsed, 1),
+			"deliveries_per_second": round(stats["delivered"] / elapsed, 1),
+			"latency_p50_ms": round(stats["latency_p50"] * 1000, 1),
+			"latency_p99_ms": round(stats["latency_p99"] * 1000, 1),
+			"flooded": stats.get("flooded", 0),
+			"db_queries_per_update": round(queries / max(1, args.updates), 3),
+			"rss_mb_per_runner": round(rss_per_runner, 2),
+			"calls": stats["calls"],
+		}
+	finally:
+		await manager.stop_runners()
+		await manager.close()
+		if user_id is not None:
+			await _cleanup(user_id)
+		await close_bot_session()
+		await engine.dispose()
+		if proc is not None:
+			proc.terminate()
+			await proc.wait()
+
+async def main() -> int:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--kind", choices=("bot", "userbot"), default="bot")
+	parser.add_argument("--bots", type=int, default=50, help="made bots, or sessions with --kind userbot")
+	parser.add_argument("--rules", type=int, default=5, help="routing rules (destinations) per bot")
+	parser.add_argument("--updates", type=int, default=5000)
+	parser.add_argument("--rate", type=float, default=0.0, help="updates/s across all bots, 0 = as fast as possible")
+	parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every Telegram call")
+	parser.add_argument("--flood-rate", type=float, default=0.0, help="share of send calls answered with 429 (bot only)")
+	parser.add_argument("--retry-after", type=int, default=1)
+	parser.add_argument("--limits", choices=("off", "real"), default="off")
+	parser.add_argument("--timeout", type=float, default=300.0)
+	parser.add_argument("--json", action="store_true")
+	args = parser.parse_args()
+	result = await run(args)
+	if args.json:
+		print(json.dumps(result))
+	else:
+		print(
+			f"{result['kind']:>7} runners={result['online']}/{result['runners']} rules={result['rules']} up={result['up_seconds']}s "
+			f"delivered={result['delivered']}/{result['expected']} in {result['seconds']}s "
+			f"rate={result['updates_per_second']} upd/s {result['deliveries_per_second']} deliveries/s "
+			f"latency p50={result['latency_p50_ms']}ms p99={result['latency_p99_ms']}ms flooded={result['flooded']} "
+			f"db={result['db_queries_per_update']} queries/update rss={result['rss_mb_per_runner']}MB/runner"
+		)
+	# non-zero when deliveries went missing, for CI
+	return 0 if result["delivered"] >= result["expected"] else 1
+
+if __name__ == "__main__":
+	sys.exit(asyncio.run(main()))
@@ -0,0 +1,89 @@
+# Forwarding latency of non-media messages while near-duplicate media detection is busy.
+#   python -m app.bench.near_dup [--messages 2000] [--media-every 5] [--image-px 1024]
+# A text-only source and a photo source (rule with skip_near_duplicates) share one runner pipeline.
+# Reports route->deliver latency of the text messages in three runs: no media traffic, media hashed in
+# the process pool (production path), and media hashed on the event loop for comparison.
+# Runs fully in-process: inline delivery, no Redis/DB, rate limits lifted.
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import time
+from app.config import settings
+from app.bots.runner import media_hash
+from app.bots.runner.media_hash import PHOTO
+from app.bots.runner.pipeline import ForwardingPipeline
+from app.bots.runner.routing import RouteRule
+
+TEXT_SOURCE = -1001
+MEDIA_SOURCE = -1002
+
+def _image(px: int) -> bytes:
+	try:
+		from PIL import Image
+	except ImportError:
+		return os.urandom(px * px)
+	buf = io.BytesIO()
+	Image.frombytes("RGB", (px, px), os.urandom(px * px * 3)).save(buf, format="PNG", compress_level=1)
+	return buf.getvalue()
+
+class _InlineDetector(media_hash.NearDuplicateDetector):
+	# what the pipeline would do without the process pool: hash on the event loop
+	async def _compute(self, source_chat_id, message_id, ref, fetch):
+		data = await fetch(source_chat_id, message_id, ref)
+		return media_hash.compute_media_hash(ref.split(":", 1)[0], data)
+
+async def _scenario(name: str, messages: int, media_every: int, images: list[bytes]) -> None:
+	sent_at: dict[int, float] = {}
+	latencies: list[float] = []
+
+	async def deliver(job):
+		if job.source_chat_id == TEXT_SOURCE:
+			now = time.perf_counter()
+			latencies.extend(now - sent_at[m] for m in job.message_ids)
+
+	async def fetch(source_chat_id: int, message_id: int, ref: str) -> bytes:
+		await asyncio.sleep(0.005)  # simulated download
+		return images[message_id % len(images)]
+
+	pipeline = ForwardingPipeline("bot", 0, deliver, fetch)
+	pipeline.near_duplicates = _InlineDetector() if name == "inline-hash" else media_hash.NearDuplicateDetector()
+	pipeline.routing.replace([
+		RouteRule(1, 1, TEXT_SOURCE, -2001, "copy", {}),
+		RouteRule(2, 1, TEXT_SOURCE, -2002, "copy", {}),
+		RouteRule(3, 1, MEDIA_SOURCE, -2003, "copy", {"skip_near_duplicates": True}, True),
+	])
+	started = time.perf_counter()
+	for m in range(1, messages + 1):
+		sent_at[m] = time.perf_counter()
+		pipeline.route(TEXT_SOURCE, m)
+		if name != "text-only" and m % media_every == 0:
+			pipeline.route(MEDIA_SOURCE, m, media_ref=f"{PHOTO}:")
+		await asyncio.sleep(0.001)
+	while pipeline.fanout.pending:
+		await asyncio.sleep(0.01)
+	await asyncio.sleep(0.1)
+	elapsed = time.perf_counter() - started
+	await pipeline.stop()
+	q = statistics.quantiles(latencies, n=100)
+	print(f"{name:<12} text deliveries={len(latencies):>6}  p50={q[49] * 1000:7.2f}ms  p99={q[98] * 1000:7.2f}ms  max={max(latencies) * 1000:8.2f}ms  wall={elapsed:.2f}s")
+
+async def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--messages", type=int, default=2000)
+	parser.add_argument("--media-every", type=int, default=5)
+	parser.add_argument("--image-px", type=int, default=1024)
+	args = parser.parse_args()
+	settings.delivery_queue = "inline"
+	settings.dedup_enabled = False
+	settings.forward_batch_window_ms = 0
+	settings.tg_global_rate = settings.tg_chat_rate = settings.tg_group_per_minute = 1e9
+	images = [_image(args.image_px) for _ in range(4)]
+	media_hash.get_executor().submit(int).result()  # warm the pool outside the measurement
+	for name in ("text-only", "pool-hash", "inline-hash"):
+		await _scenario(name, args.messages, args.media_every, images)
+	media_hash.shutdown_executor()
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -1,11 +1,13 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.base import AsyncSessionFactory
-from app.services.user_service import get_or_create_user
+from sqlalchemy import select
+from app.bots.runner import profiler
+from app.config import settings
+from app.db.models import Bot
 from app.services.bot_service import create_bot, list_bots, delete_bot, toggle_bot_active
+from .middlewares import UnitOfWork
 from app.utils.logger import logger
 from .tasks_handlers import router as tasks_router
 from .handlers_settings import router as settings_router
@@ -17,10 +19,8 @@ router.include_router(settings_router)
 MAIN_MENU = "main_menu"
 
 @router.message(CommandStart())
-async def on_start(message: Message):
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, message.from_user.id, language_code=message.from_user.language_code)
-		await session.commit()
+async def on_start(message: Message, uow: UnitOfWork):
+	await uow.user()
 	builder = InlineKeyboardBuilder()
 	builder.button(text="➕ إضافة بوت جديد", callback_data="add_bot")
 	builder.button(text="🤖 قائمة البوتات", callback_data="list_bots")
@@ -28,30 +28,53 @@ async def on_start(message: Message):
 	builder.adjust(1)
 	await message.answer("مرحباً بك في صانع البوتات", reply_markup=builder.as_markup())
 
+@router.message(Command("profile"))
+async def on_profile(message: Message, command: CommandObject, uow: UnitOfWork):
+	# /profile <bot_id> on [sample rate 0-1] | /profile <bot_id> off
+	args = (command.args or "").split()
+	if len(args) < 2 or not args[0].isdigit() or args[1] not in ("on", "off"):
+		await message.answer("الاستخدام:\n/profile <رقم البوت> on [نسبة العينة 0-1]\n/profile <رقم البوت> off")
+		return
+	bot_id = int(args[0])
+	session = await uow.session()
+	user = await uow.user()
+	res = await session.execute(select(Bot.id).where(Bot.id == bot_id, Bot.owner_id == user.id))
+	if res.scalar_one_or_none() is None:
+		await message.answer("غير موجود")
+		return
+	if args[1] == "off":
+		await profiler.disable(f"bot:{bot_id}")
+		await message.answer("تم إيقاف قياس زمن التحديثات")
+		return
+	try:
+		rate = float(args[2]) if len(args) > 2 else None
+	except ValueError:
+		await message.answer("نسبة العينة يجب أن تكون رقماً بين 0 و 1")
+		return
+	rate = await profiler.enable(f"bot:{bot_id}", rate)
+	minutes = int(settings.profile_max_seconds // 60)
+	await message.answer(f"تم تفعيل قياس زمن التحديثات لـ {rate:.0%} من الرسائل لمدة {minutes} دقيقة")
+
 @router.callback_query(F.data == "add_bot")
 async def on_add_bot(call: CallbackQuery):
 	await call.message.answer("أرسل اسم البوت ثم فاصلة ثم التوكن\nمثال:\nMyForwarderBot, 123456:ABC-XYZ")
 	await call.answer()
 
 @router.message(F.text.contains(","))
-async def on_receive_token(message: Message):
+async def on_receive_token(message: Message, uow: UnitOfWork):
 	try:
 		name, token = [x.strip() for x in message.text.split(",", 1)]
-		async with AsyncSessionFactory() as session:
-			user = await get_or_create_user(session, message.from_user.id, language_code=message.from_user.language_code)
-			bot = await create_bot(session, user, name=name, token=token)
-			await session.commit()
+		bot = await create_bot(await uow.session(), await uow.user(), name=name, token=token)
+		await uow.commit()
 		await message.answer(f"تم إضافة البوت: {name}\nالرجاء إضافتي كمطور في بوتك المصنوع وابدأ من خلال محادثته الخاصة.")
 	except Exception as e:
 		logger.exception("add bot error")
 		await message.answer("تعذر إضافة البوت. تأكد من الصيغة والصلاحيات.")
 
 @router.callback_query(F.data == "list_bots")
-async def on_list_bots(call: CallbackQuery):
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id, language_code=call.from_user.language_code)
-		bots = await list_bots(session, user)
-		await session.commit()
+async def on_list_bots(call: CallbackQuery, uow: UnitOfWork):
+	bots = await list_bots(await uow.session(), await uow.user())
+	await uow.commit()
 	builder = InlineKeyboardBuilder()
 	for b in bots:
 		status = "🟢" if b.is_active else "⚪"
@@ -68,32 +91,29 @@ async def on_bot_item(call: CallbackQuery):
 	builder.button(text="حذف", callback_data=f"delete_bot:{bot_id}")
 	builder.button(text="المهام", callback_data=f"tasks:{bot_id}")
 	builder.adjust(2, 1)
-	await call.message.answer("إدارة البوت:", reply_markup=builder.as_markup())
+	await call.message.answer(f"إدارة البوت (#{bot_id}):", reply_markup=builder.as_markup())
 	await call.answer()
 
 @router.callback_query(F.data.startswith("toggle_bot:"))
-async def on_toggle_bot(call: CallbackQuery):
+async def on_toggle_bot(call: CallbackQuery, uow: UnitOfWork):
 	bot_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id, language_code=call.from_user.language_code)
-		from sqlalchemy import select
-		from app.db.models import Bot
-		res = await session.execute(select(Bot).where(Bot.id == bot_id, Bot.owner_id == user.id))
-		b = res.scalar_one_or_none()
-		if b is None:
-			await call.answer("غير موجود", show_alert=True)
-			return
-		b.is_active = not b.is_active
-		await session.commit()
+	session = await uow.session()
+	user = await uow.user()
+	res = await session.execute(select(Bot.is_active).where(Bot.id == bot_id, Bot.owner_id == user.id))
+	active = res.scalar_one_or_none()
+	if active is None:
+		await call.answer("غير موجود", show_alert=True)
+		return
+	# through the service so the runner is started/stopped with the flag
+	await toggle_bot_active(session, user, bot_id, not active)
+	await uow.commit()
 	await call.answer("تم")
 
 @router.callback_query(F.data.startswith("delete_bot:"))
-async def on_delete_bot(call: CallbackQuery):
+async def on_delete_bot(call: CallbackQuery, uow: UnitOfWork):
 	bot_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id, language_code=call.from_user.language_code)
-		ok = await delete_bot(session, user, bot_id)
-		await session.commit()
+	ok = await delete_bot(await uow.session(), await uow.user(), bot_id)
+	await uow.commit()
 	if ok:
 		await call.answer("تم الحذف")
 	else:
@@ -1,10 +1,8 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
-from app.db.base import AsyncSessionFactory
-from app.services.user_service import get_or_create_user, update_user_prefs
 from app.services.user_session_service import list_user_sessions, create_user_session_from_string, delete_user_session
+from .middlewares import UnitOfWork
 from .userbot_login import router as userbot_login_router
 
 router = Router()
@@ -21,10 +19,8 @@ async def on_settings(call: CallbackQuery):
 	await call.answer()
 
 @router.callback_query(F.data == "userbot_settings")
-async def on_userbot_settings(call: CallbackQuery):
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id)
-		sessions = await list_user_sessions(session, user)
+async def on_userbot_settings(call: CallbackQuery, uow: UnitOfWork):
+	sessions = await list_user_sessions(await uow.session(), await uow.user())
 	builder = InlineKeyboardBuilder()
 	builder.button(text="➕ إضافة جلسة", callback_data="userbot_add")
 	builder.button(text="📱 تسجيل عبر رقم الهاتف", callback_data="userbot_add_phone")
@@ -47,25 +43,21 @@ async def on_userbot_item(call: CallbackQuery):
 	await call.answer()
 
 @router.callback_query(F.data.startswith("userbot_logout:"))
-async def on_userbot_logout(call: CallbackQuery):
+async def on_userbot_logout(call: CallbackQuery, uow: UnitOfWork):
 	session_id = int(call.data.split(":",1)[1])
 	# حذف الجلسة هو بمثابة تسجيل خروج بالنسبة لنا
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id)
-		ok = await delete_user_session(session, user, session_id)
-		await session.commit()
+	ok = await delete_user_session(await uow.session(), await uow.user(), session_id)
+	await uow.commit()
 	if ok:
 		await call.answer("تم تسجيل الخروج")
 	else:
 		await call.answer("غير موجود", show_alert=True)
 
 @router.callback_query(F.data.startswith("userbot_del:"))
-async def on_userbot_delete(call: CallbackQuery):
+async def on_userbot_delete(call: CallbackQuery, uow: UnitOfWork):
 	session_id = int(call.data.split(":",1)[1])
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id)
-		ok = await delete_user_session(session, user, session_id)
-		await session.commit()
+	ok = await delete_user_session(await uow.session(), await uow.user(), session_id)
+	await uow.commit()
 	if ok:
 		await call.answer("تم الحذف")
 	else:
@@ -77,9 +69,7 @@ async def on_userbot_add(call: CallbackQuery):
 	await call.answer()
 
 @router.message(F.text.regexp(r"^1[A-Za-z0-9_-]{85,}"))
-async def on_receive_session_string(message: Message):
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, message.from_user.id)
-		await create_user_session_from_string(session, user, session_string=message.text.strip())
-		await session.commit()
+async def on_receive_session_string(message: Message, uow: UnitOfWork):
+	await create_user_session_from_string(await uow.session(), await uow.user(), session_string=message.text.strip())
+	await uow.commit()
 	await message.answer("تم حفظ الجلسة")
\ No newline at end of file
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TgUser
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import AsyncSessionFactory
+from app.services.user_service import UserRef, upsert_user
+
+# telegram_user_id -> UserRef of users known to exist; users are never deleted, so no expiry
+_known_users: OrderedDict[int, UserRef] = OrderedDict()
+_KNOWN_USERS_MAX = 100000
+
+def _remember(user: UserRef) -> None:
+	_known_users[user.telegram_user_id] = user
+	_known_users.move_to_end(user.telegram_user_id)
+	while len(_known_users) > _KNOWN_USERS_MAX:
+		_known_users.popitem(last=False)
+
+# One unit of work per update: the DB session is opened on first use only (menus that don't touch the
+# database never take a pool connection), the sender's User is resolved once, and whatever is left
+# uncommitted when the handler returns is committed by the middleware. Handlers that must report
+# success only after the data is durable call commit() themselves.
+class UnitOfWork:
+	def __init__(self, from_user: TgUser | None) -> None:
+		self._from_user = from_user
+		self._session: AsyncSession | None = None
+		self._user: UserRef | None = None
+		self._created: UserRef | None = None
+
+	async def session(self) -> AsyncSession:
+		if self._session is None:
+			self._session = AsyncSessionFactory()
+		return self._session
+
+	async def user(self) -> UserRef:
+		if self._user is None:
+			tg = self._from_user
+			known = _known_users.get(tg.id)
+			if known is not None:
+				self._user = known
+			else:
+				self._user, created = await upsert_user(await self.session(), tg.id, language_code=tg.language_code)
+				if created:
+					# only cache a new row once it's committed
+					self._created = self._user
+				else:
+					_remember(self._user)
+		return self._user
+
+	async def commit(self) -> None:
+		if self._session is not None and self._session.in_transaction():
+			await self._session.commit()
+		if self._created is not None:
+			_remember(self._created)
+			self._created = None
+
+	async def close(self) -> None:
+		if self._session is not None:
+			await self._session.close()
+			self._session = None
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+	async def __call__(
+		self,
+		handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+		event: TelegramObject,
+		data: dict[str, Any],
+	) -> Any:
+		uow = UnitOfWork(data.get("event_from_user"))
+		data["uow"] = uow
+		try:
+			result = await handler(event, data)
+			await uow.commit()
+			return result
+		finally:
+			# rolls back anything left open by a failed handler
+			await uow.close()
@@ -2,24 +2,23 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import select
-from app.db.base import AsyncSessionFactory
 from app.db.models import Bot, Task
 from app.services.task_service import create_task, list_tasks, delete_task, toggle_task
-from app.services.user_service import get_or_create_user
+from .middlewares import UnitOfWork
 
 router = Router()
 
 @router.callback_query(F.data.startswith("tasks:"))
-async def on_tasks_menu(call: CallbackQuery):
+async def on_tasks_menu(call: CallbackQuery, uow: UnitOfWork):
 	bot_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		user = await get_or_create_user(session, call.from_user.id, language_code=call.from_user.language_code)
-		res = await session.execute(select(Bot).where(Bot.id == bot_id, Bot.owner_id == user.id))
-		bot = res.scalar_one_or_none()
-		if bot is None:
-			await call.answer("غير موجود", show_alert=True)
-			return
-		tasks = await list_tasks(session, bot)
+	session = await uow.session()
+	user = await uow.user()
+	res = await session.execute(select(Bot).where(Bot.id == bot_id, Bot.owner_id == user.id))
+	bot = res.scalar_one_or_none()
+	if bot is None:
+		await call.answer("غير موجود", show_alert=True)
+		return
+	tasks = await list_tasks(session, bot)
 	builder = InlineKeyboardBuilder()
 	builder.button(text="➕ إضافة مهمة", callback_data=f"task_add:{bot_id}")
 	for t in tasks:
@@ -42,35 +41,34 @@ async def on_task_item(call: CallbackQuery):
 	await call.answer()
 
 @router.callback_query(F.data.startswith("task_toggle:"))
-async def on_task_toggle(call: CallbackQuery):
+async def on_task_toggle(call: CallbackQuery, uow: UnitOfWork):
 	task_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		res = await session.execute(select(Task).where(Task.id == task_id))
-		t = res.scalar_one_or_none()
-		if t is None:
-			await call.answer("غير موجود", show_alert=True)
-			return
-		await toggle_task(session, task_id, not t.is_active)
-		await session.commit()
+	session = await uow.session()
+	res = await session.execute(select(Task).where(Task.id == task_id))
+	t = res.scalar_one_or_none()
+	if t is None:
+		await call.answer("غير موجود", show_alert=True)
+		return
+	await toggle_task(session, task_id, not t.is_active)
+	await uow.commit()
 	await call.answer("تم")
 
 @router.callback_query(F.data.startswith("task_delete:"))
-async def on_task_delete(call: CallbackQuery):
+async def on_task_delete(call: CallbackQuery, uow: UnitOfWork):
 	task_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		ok = await delete_task(session, task_id)
-		await session.commit()
+	ok = await delete_task(await uow.session(), task_id)
+	await uow.commit()
 	if ok:
 		await call.answer("تم الحذف")
 	else:
 		await call.answer("غير موجود", show_alert=True)
 
 @router.callback_query(F.data.startswith("task_info:"))
-async def on_task_info(call: CallbackQuery):
+async def on_task_info(call: CallbackQuery, uow: UnitOfWork):
 	task_id = int(call.data.split(":", 1)[1])
-	async with AsyncSessionFactory() as session:
-		res = await session.execute(select(Task).where(Task.id == task_id))
-		t = res.scalar_one_or_none()
+	session = await uow.session()
+	res = await session.execute(select(Task).where(Task.id == task_id))
+	t = res.scalar_one_or_none()
 	if not t:
 		await call.answer("غير موجود", show_alert=True)
 		return
@@ -6,11 +6,10 @@ from telethon import TelegramClient
 from telethon.sessions import StringSession
 from telethon.errors import SessionPasswordNeededError
 from app.config import settings
-from app.services.user_service import get_or_create_user
 from app.services.user_session_service import create_user_session_from_string
-from app.db.base import AsyncSessionFactory
 from app.utils.logger import logger
 from app.bots.builder.states import UserbotState
+from .middlewares import UnitOfWork
 
 router = Router()
 
@@ -39,7 +38,7 @@ async def receive_phone(message: Message, state: FSMContext):
 	await message.answer("أدخل كود التحقق المرسل")
 
 @router.message(UserbotState.waiting_code)
-async def receive_code(message: Message, state: FSMContext):
+async def receive_code(message: Message, state: FSMContext, uow: UnitOfWork):
 	data = await state.get_data()
 	phone = data.get("phone")
 	phone_code_hash = data.get("phone_code_hash")
@@ -51,10 +50,8 @@ async def receive_code(message: Message, state: FSMContext):
 	try:
 		await client.sign_in(phone=phone, code=message.text.strip(), phone_code_hash=phone_code_hash)
 		new_session = client.session.save()
-		async with AsyncSessionFactory() as session:
-			user = await get_or_create_user(session, message.from_user.id)
-			await create_user_session_from_string(session, user, new_session)
-			await session.commit()
+		await create_user_session_from_string(await uow.session(), await uow.user(), new_session)
+		await uow.commit()
 		await message.answer("تم تسجيل الدخول وحفظ الجلسة")
 		await state.clear()
 	finally:
@@ -62,7 +59,7 @@ async def receive_code(message: Message, state: FSMContext):
 	return
 
 @router.message(UserbotState.waiting_code)
-async def receive_code_with_2fa(message: Message, state: FSMContext):
+async def receive_code_with_2fa(message: Message, state: FSMContext, uow: UnitOfWork):
 	# fallback in case 2FA is needed; Telethon raises SessionPasswordNeededError
 	data = await state.get_data()
 	phone = data.get("phone")
@@ -76,10 +73,8 @@ async def receive_code_with_2fa(message: Message, state: FSMContext):
 		try:
 			await client.sign_in(phone=phone, code=message.text.strip(), phone_code_hash=phone_code_hash)
 			new_session = client.session.save()
-			async with AsyncSessionFactory() as session:
-				user = await get_or_create_user(session, message.from_user.id)
-				await create_user_session_from_string(session, user, new_session)
-				await session.commit()
+			await create_user_session_from_string(await uow.session(), await uow.user(), new_session)
+			await uow.commit()
 			await message.answer("تم تسجيل الدخول وحفظ الجلسة")
 			await state.clear()
 			return
@@ -92,7 +87,7 @@ async def receive_code_with_2fa(message: Message, state: FSMContext):
 		await client.disconnect()
 
 @router.message(UserbotState.waiting_2fa)
-async def receive_2fa(message: Message, state: FSMContext):
+async def receive_2fa(message: Message, state: FSMContext, uow: UnitOfWork):
 	data = await state.get_data()
 	session_str = data.get("session")
 	phone = data.get("phone")
@@ -103,10 +98,8 @@ async def receive_2fa(message: Message, state: FSMContext):
 	try:
 		await client.sign_in(password=message.text.strip())
 		new_session = client.session.save()
-		async with AsyncSessionFactory() as session:
-			user = await get_or_create_user(session, message.from_user.id)
-			await create_user_session_from_string(session, user, new_session)
-			await session.commit()
+		await create_user_session_from_string(await uow.session(), await uow.user(), new_session)
+		await uow.commit()
 		await message.answer("تم تسجيل الدخول وحفظ الجلسة")
 		await state.clear()
 	finally:
@@ -0,0 +1,26 @@
+from aiogram.fsm.storage.base import DefaultKeyBuilder
+from aiogram.fsm.storage.redis import RedisStorage
+from app.cache.redis import get_redis
+from app.config import settings
+
+# One FSM storage for every made bot in the process, on the shared Redis client: conversation states
+# survive restarts, are visible to whichever replica runs the bot, and expire after FSM_STATE_TTL /
+# FSM_DATA_TTL when a user abandons a flow instead of piling up in each Dispatcher's memory. Keys carry
+# the bot id, so bots sharing a chat with the same user don't see each other's state. aiogram closes a
+# dispatcher's storage at shutdown; the client belongs to app.cache.redis, so close() is a no-op here.
+class SharedRedisStorage(RedisStorage):
+	async def close(self) -> None:
+		pass
+
+_storage: SharedRedisStorage | None = None
+
+async def get_fsm_storage() -> SharedRedisStorage:
+	global _storage
+	if _storage is None:
+		_storage = SharedRedisStorage(
+			redis=await get_redis(),
+			key_builder=DefaultKeyBuilder(prefix="fsm", with_bot_id=True),
+			state_ttl=settings.fsm_state_ttl or None,
+			data_ttl=settings.fsm_data_ttl or None,
+		)
+	return _storage
@@ -0,0 +1,52 @@
+from typing import Any
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from app.config import settings
+
+# One connection pool to the Bot API for every aiogram Bot in the process (builder bot, made bots,
+# getMe checks): sockets, TLS sessions and DNS lookups are reused across tokens instead of each Bot
+# opening its own pool. aiogram closes a bot's session when polling stops, so close() is a no-op here
+# and the pool lives until close_bot_session() at process exit.
+class SharedAiohttpSession(AiohttpSession):
+	def __init__(self, **kwargs: Any) -> None:
+		super().__init__(limit=settings.tg_http_pool_limit, **kwargs)
+		self._connector_init.update(
+			keepalive_timeout=settings.tg_http_keepalive,
+			ttl_dns_cache=settings.tg_http_dns_ttl,
+		)
+
+	async def close(self) -> None:
+		pass
+
+	async def close_pool(self) -> None:
+		await super().close()
+
+	def pool_stats(self) -> dict[str, int]:
+		session = self._session
+		if session is None or session.closed:
+			return {"limit": settings.tg_http_pool_limit, "in_use": 0, "idle": 0, "hosts": 0}
+		connector = session.connector
+		idle = getattr(connector, "_conns", {})
+		return {
+			"limit": connector.limit,
+			"in_use": len(getattr(connector, "_acquired", ())),
+			"idle": sum(len(conns) for conns in idle.values()),
+			"hosts": len(idle),
+		}
+
+_session: SharedAiohttpSession | None = None
+
+def get_bot_session() -> SharedAiohttpSession:
+	global _session
+	if _session is None:
+		if settings.tg_api_base:
+			_session = SharedAiohttpSession(api=TelegramAPIServer.from_base(settings.tg_api_base))
+		else:
+			_session = SharedAiohttpSession()
+	return _session
+
+async def close_bot_session() -> None:
+	global _session
+	if _session is not None:
+		await _session.close_pool()
+		_session = None
@@ -1,20 +1,33 @@
 import asyncio
+import io
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import Message
 from sqlalchemy import select
 from app.db.base import AsyncSessionFactory
-from app.db.models import Bot as BotModel, Task, TaskRoutingRule
+from app.db.models import Bot as BotModel
+from app.bots.runner import filters
+from app.bots.runner.delivery import DeliveryJob
+from app.bots.runner.media_hash import PHOTO, FILE
+from app.bots.runner.pipeline import ForwardingPipeline
+from app.bots.fsm import get_fsm_storage
+from app.bots.http import get_bot_session
+from app.bots.webhook import WebhookServer
+from app.config import settings
 from app.utils.crypto import decrypt_text
 from app.utils.logger import logger
 from .panel import build_router
 
 class MadeBotRunner:
-	def __init__(self, bot_id: int) -> None:
+	def __init__(self, bot_id: int, ready: asyncio.Event | None = None, webhook: WebhookServer | None = None) -> None:
 		self.bot_id = bot_id
+		self.ready = ready or asyncio.Event()
+		# with a webhook server updates are pushed to the shared server instead of polled per bot
+		self.webhook = webhook
 		self.dp: Dispatcher | None = None
 		self.bot: Bot | None = None
+		self.pipeline = ForwardingPipeline("bot", bot_id, self._deliver, self._fetch_media, _features)
 
 	async def start(self) -> None:
 		async with AsyncSessionFactory() as session:
@@ -23,31 +36,114 @@ class MadeBotRunner:
 			token = decrypt_text(bm.token_encrypted) if bm.token_encrypted else None
 		if not token:
 			raise RuntimeError("Token not configured for made bot")
-		self.bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-		self.dp = Dispatcher()
+		self.bot = Bot(token=token, session=get_bot_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+		self.dp = Dispatcher(storage=await get_fsm_storage())
 		self.dp.include_router(build_router(self.bot_id))
 		self.dp.message.register(self._on_message)
 		logger.info(f"Starting made bot {bm.name} ({self.bot_id})")
 		try:
-			await self.dp.start_polling(self.bot, allowed_updates=self.dp.resolve_used_update_types())
+			await self.pipeline.start()
+			# getMe up front (cached for polling) so a revoked token fails here and "online" means authorized
+			await self.bot.me()
+			if self.webhook is not None:
+				await self._serve_webhook()
+				return
+			# a webhook left from webhook mode would make getUpdates fail with a conflict
+			await self.bot.delete_webhook()
+			self.ready.set()
+			await self._poll()
 		except asyncio.CancelledError:
-			logger.info(f"Polling cancelled for made bot {self.bot_id}")
+			logger.info(f"Updates cancelled for made bot {self.bot_id}")
 			raise
+		finally:
+			await self.pipeline.stop()
+
+	async def _poll(self) -> None:
+		# signals belong to the process entry point, not to each of the many bots polling in it
+		polling = asyncio.ensure_future(self.dp.start_polling(self.bot, allowed_updates=self.dp.resolve_used_update_types(), handle_signals=False, close_bot_session=False))
+		try:
+			await asyncio.shield(polling)
+		finally:
+			if not polling.done():
+				# cancelling start_polling itself leaves aiogram's inner polling task running, stop it properly
+				try:
+					await self.dp.stop_polling()
+				except RuntimeError:
+					polling.cancel()
+				await asyncio.gather(polling, return_exceptions=True)
+
+	async def _serve_webhook(self) -> None:
+		# mirrors start_polling's lifecycle: startup/shutdown hooks run around serving
+		await self.dp.emit_startup(bot=self.bot)
+		try:
+			await self.webhook.attach(self.bot_id, self.bot, self.dp)
+			self.ready.set()
+			await asyncio.Event().wait()
+		finally:
+			self.webhook.detach(self.bot_id)
+			await self.dp.emit_shutdown(bot=self.bot)
 
 	async def _on_message(self, message: Message):
 		if message.chat.type == "private" or (message.text and message.text.startswith("/")):
 			return
-		source_chat_id = message.chat.id
-		async with AsyncSessionFactory() as session:
-			res = await session.execute(select(Task).where(Task.bot_id == self.bot_id, Task.is_active == True))
-			tasks = list(res.scalars().all())
-			for task in tasks:
-				res2 = await session.execute(select(TaskRoutingRule).where(TaskRoutingRule.task_id == task.id, TaskRoutingRule.source_chat_id == source_chat_id))
-				for rule in res2.scalars().all():
-					try:
-						if rule.forward_mode == "copy":
-							await message.copy_to(chat_id=rule.destination_chat_id)
-						else:
-							await message.forward(chat_id=rule.destination_chat_id)
-					except Exception:
-						logger.exception("forward error")
\ No newline at end of file
+		self.pipeline.route(message.chat.id, message.message_id, message.media_group_id, _media_ref(message), message)
+
+	async def _deliver(self, job: DeliveryJob) -> None:
+		# several ids (an album or a batched burst) go out in one copyMessages/forwardMessages call; albums keep their grouping
+		if len(job.message_ids) > 1:
+			if job.forward_mode == "copy":
+				await self.bot.copy_messages(chat_id=job.destination_chat_id, from_chat_id=job.source_chat_id, message_ids=list(job.message_ids))
+			else:
+				await self.bot.forward_messages(chat_id=job.destination_chat_id, from_chat_id=job.source_chat_id, message_ids=list(job.message_ids))
+		elif job.forward_mode == "copy":
+			await self.bot.copy_message(chat_id=job.destination_chat_id, from_chat_id=job.source_chat_id, message_id=job.message_ids[0])
+		else:
+			await self.bot.forward_message(chat_id=job.destination_chat_id, from_chat_id=job.source_chat_id, message_id=job.message_ids[0])
+
+	async def _fetch_media(self, source_chat_id: int, message_id: int, ref: str) -> bytes | None:
+		file = await self.bot.get_file(ref.split(":", 1)[1])
+		if not file.file_path or (file.file_size or 0) > settings.near_dup_max_bytes:
+			return None
+		buf = io.BytesIO()
+		await self.bot.download_file(file.file_path, destination=buf)
+		return buf.getvalue()
+
+def _media_ref(message: Message) -> str:
+	# Bot API can't fetch a message by id later, so the file_id travels with the job
+	if message.photo:
+		return f"{PHOTO}:{message.photo[-1].file_id}"
+	media = message.video or message.document or message.animation or message.audio or message.voice or message.video_note
+	return f"{FILE}:{media.file_id}" if media else ""
+
+def _media_type(message: Message) -> int:
+	if message.photo:
+		return filters.PHOTO
+	if message.animation:
+		return filters.ANIMATION
+	if message.video:
+		return filters.VIDEO
+	if message.video_note:
+		return filters.VIDEO_NOTE
+	if message.voice:
+		return filters.VOICE
+	if message.audio:
+		return filters.AUDIO
+	if message.sticker:
+		return filters.STICKER
+	if message.document:
+		return filters.DOCUMENT
+	if message.poll:
+		return filters.POLL
+	return filters.TEXT if message.text else filters.OTHER
+
+def _features(message: Message) -> filters.MessageFeatures:
+	text = message.text or message.caption or ""
+	entities = message.entities or message.caption_entities or ()
+	sender = message.from_user or message.sender_chat
+	return filters.MessageFeatures(
+		text=text,
+		sender_id=sender.id if sender else None,
+		media_type=_media_type(message),
+		has_link=any(e.type in ("url", "text_link") for e in entities) or filters.has_link(text),
+		is_forward=message.forward_origin is not None,
+	)
@@ -5,8 +5,9 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import select
 from app.db.base import AsyncSessionFactory
 from app.db.models import Bot as BotModel, Task, User, UserSession
-from app.services.task_service import create_task, list_tasks, update_task, delete_task, toggle_task
-from app.services.user_service import get_or_create_user, update_user_prefs
+from app.cache.owners import owner_cache
+from app.services.task_service import create_task, list_bot_tasks, update_task, delete_task, toggle_task
+from app.services.user_service import UserRef, get_or_create_user, update_user_prefs
 from app.services.user_session_service import list_user_sessions, create_user_session_from_string, delete_user_session
 from zoneinfo import ZoneInfo
 
@@ -17,18 +18,11 @@ from app.bots.builder.states import TaskState, SettingsState, UserbotState
 def build_router(bot_id: int) -> Router:
 	router = Router()
 
-	async def _ensure_owner(message: Message | CallbackQuery) -> User | None:
-		telegram_id = message.from_user.id if isinstance(message, Message) else message.from_user.id
-		async with AsyncSessionFactory() as session:
-			res = await session.execute(select(BotModel).where(BotModel.id == bot_id))
-			bm = res.scalar_one_or_none()
-			if not bm:
-				return None
-			res2 = await session.execute(select(User).where(User.id == bm.owner_id))
-			owner = res2.scalar_one()
-			if owner.telegram_user_id != telegram_id:
-				return None
-			return owner
+	async def _ensure_owner(message: Message | CallbackQuery) -> UserRef | None:
+		owner = await owner_cache.get(bot_id)
+		if owner is None or owner.telegram_user_id != message.from_user.id:
+			return None
+		return owner
 
 	@router.message(CommandStart())
 	async def start(message: Message):
@@ -49,8 +43,7 @@ def build_router(bot_id: int) -> Router:
 			await call.answer("غير مصرح", show_alert=True)
 			return
 		async with AsyncSessionFactory() as session:
-			res = await session.execute(select(Task).where(Task.bot_id == bot_id).order_by(Task.id.desc()))
-			tasks = list(res.scalars().all())
+			tasks = await list_bot_tasks(session, bot_id)
 		kb = InlineKeyboardBuilder()
 		for t in tasks:
 			status = "🟢" if t.is_active else "⚪"
@@ -163,10 +156,10 @@ def build_router(bot_id: int) -> Router:
 			new_type = "userbot" if t.task_type == "bot" else "bot"
 			if new_type == "userbot":
 				# اختيار جلسة
-				resb = await session.execute(select(BotModel).where(BotModel.id == bot_id))
-				bm = resb.scalar_one()
-				res_owner = await session.execute(select(User).where(User.id == bm.owner_id))
-				owner = res_owner.scalar_one()
+				owner = await owner_cache.get(bot_id)
+				if not owner:
+					await call.answer("غير مصرح", show_alert=True)
+					return
 				sessions = await list_user_sessions(session, owner)
 				if not sessions:
 					await call.answer("لا توجد جلسات يوزربوت. أضف جلسة أولاً", show_alert=True)
@@ -216,13 +209,13 @@ def build_router(bot_id: int) -> Router:
 	@router.callback_query(F.data.startswith("mb:lang:"))
 	async def lang_set(call: CallbackQuery):
 		lang = call.data.split(":", 2)[2]
+		owner = await _ensure_owner(call)
+		if not owner:
+			await call.answer("غير مصرح", show_alert=True)
+			return
 		async with AsyncSessionFactory() as session:
-			owner = await _ensure_owner(call)
-			if not owner:
-				await call.answer("غير مصرح", show_alert=True)
-				return
-			owner.language_code = lang
-			await session.merge(owner)
+			user = await session.get(User, owner.id)
+			await update_user_prefs(session, user, language_code=lang)
 			await session.commit()
 		await call.answer("تم")
 
@@ -240,13 +233,13 @@ def build_router(bot_id: int) -> Router:
 		except Exception:
 			await message.answer("منطقة زمنية غير صالحة")
 			return
+		owner = await _ensure_owner(message)
+		if not owner:
+			await state.clear()
+			return
 		async with AsyncSessionFactory() as session:
-			owner = await _ensure_owner(message)
-			if not owner:
-				await state.clear()
-				return
-			owner.timezone = candidate
-			await session.merge(owner)
+			user = await session.get(User, owner.id)
+			await update_user_prefs(session, user, timezone=candidate)
 			await session.commit()
 		await state.clear()
 		await message.answer("تم التحديث")
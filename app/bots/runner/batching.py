@@ -0,0 +1,134 @@
+import asyncio
+from typing import Callable
+from app.bots.runner.delivery import DeliveryJob
+from app.bots.runner.filters import MessageFeatures
+
+# (source_chat_id, message_ids, media_refs aligned with message_ids ("" for non-media), filter features
+# of the items when the source has filtered rules)
+Emit = Callable[[int, tuple[int, ...], tuple[str, ...], list[MessageFeatures] | None], None]
+EmitJobs = Callable[[list[DeliveryJob]], None]
+
+# Bot API copyMessages/forwardMessages and MTProto forwardMessages accept at most 100 ids
+MAX_BATCH_IDS = 100
+
+class _PendingAlbum:
+	__slots__ = ("media_group_id", "items", "features", "timer")
+
+	def __init__(self, media_group_id: str) -> None:
+		self.media_group_id = media_group_id
+		self.items: list[tuple[int, str]] = []
+		self.features: list[MessageFeatures] = []
+		self.timer: asyncio.TimerHandle | None = None
+
+# Telegram delivers every item of an album as its own update. Items sharing a media_group_id are held
+# for a short window (extended by each new item) and emitted together, so the album is delivered as one
+# grouped copy/forward per destination. At most one album is pending per source chat; any other message
+# from that chat flushes it first, which keeps source order intact.
+class AlbumBuffer:
+	def __init__(self, window: float, emit: Emit) -> None:
+		self.window = window
+		self._emit = emit
+		self._pending: dict[int, _PendingAlbum] = {}
+
+	def add(self, source_chat_id: int, message_id: int, media_group_id: str | None, media_ref: str = "", features: MessageFeatures | None = None) -> None:
+		pending = self._pending.get(source_chat_id)
+		if pending is not None and pending.media_group_id != media_group_id:
+			self.flush(source_chat_id)
+			pending = None
+		if media_group_id is None:
+			self._emit(source_chat_id, (message_id,), (media_ref,), [features] if features is not None else None)
+			return
+		if pending is None:
+			pending = self._pending[source_chat_id] = _PendingAlbum(media_group_id)
+		pending.items.append((message_id, media_ref))
+		if features is not None:
+			pending.features.append(features)
+		if pending.timer is not None:
+			pending.timer.cancel()
+		pending.timer = asyncio.get_running_loop().call_later(self.window, self.flush, source_chat_id)
+
+	def flush(self, source_chat_id: int) -> None:
+		pending = self._pending.pop(source_chat_id, None)
+		if pending is None:
+			return
+		if pending.timer is not None:
+			pending.timer.cancel()
+		items = sorted(pending.items)
+		self._emit(source_chat_id, tuple(i for i, _ in items), tuple(ref for _, ref in items), pending.features or None)
+
+	def flush_all(self) -> None:
+		for source_chat_id in list(self._pending):
+			self.flush(source_chat_id)
+
+
+class _OpenBatch:
+	__slots__ = ("items", "timer", "received_at")
+
+	def __init__(self, timer: asyncio.TimerHandle) -> None:
+		self.items: list[tuple[int, str]] = []
+		self.timer = timer
+		self.received_at = 0.0
+
+# Merges consecutive jobs for the same (source, destination, mode) into multi-id jobs. The first job for
+# a key is passed through immediately and opens a window; jobs arriving while it is open are collected and
+# emitted as one job when it closes (the window then reopens while the burst lasts). Isolated messages
+# therefore pay no extra latency and bursts cost one request per window instead of one per message.
+class JobBatcher:
+	def __init__(self, window: float, emit: EmitJobs, max_ids: int = MAX_BATCH_IDS) -> None:
+		self.window = window
+		self.max_ids = max_ids
+		self._emit = emit
+		# key: (source, destination, mode); one window per destination, media or not, so order holds
+		self._open: dict[tuple[int, int, str], _OpenBatch] = {}
+
+	def add(self, jobs: list[DeliveryJob]) -> None:
+		if self.window <= 0:
+			self._emit(jobs)
+			return
+		ready: list[DeliveryJob] = []
+		loop = asyncio.get_running_loop()
+		for job in jobs:
+			key = (job.source_chat_id, job.destination_chat_id, job.forward_mode)
+			batch = self._open.get(key)
+			if batch is None:
+				ready.append(job)
+				self._open[key] = _OpenBatch(loop.call_later(self.window, self._close, key))
+				continue
+			if len(batch.items) + len(job.message_ids) > self.max_ids:
+				ready.append(self._take(key, batch))
+			if not batch.items:
+				# the merged job is as old as its oldest message
+				batch.received_at = job.received_at
+			batch.items.extend(zip(job.message_ids, job.media or ("",) * len(job.message_ids)))
+		if ready:
+			self._emit(ready)
+
+	def _take(self, key: tuple[int, int, str], batch: _OpenBatch) -> DeliveryJob:
+		source_chat_id, destination_chat_id, forward_mode = key
+		# copyMessages/forwardMessages require ids in increasing order
+		items, batch.items = sorted(batch.items), []
+		media = tuple(ref for _, ref in items)
+		if not any(media):
+			media = ()
+		return DeliveryJob(source_chat_id, tuple(i for i, _ in items), destination_chat_id, forward_mode, media=media, received_at=batch.received_at)
+
+	def _close(self, key: tuple[int, int, str]) -> None:
+		batch = self._open.get(key)
+		if batch is None:
+			return
+		if not batch.items:
+			del self._open[key]
+			return
+		job = self._take(key, batch)
+		batch.timer = asyncio.get_running_loop().call_later(self.window, self._close, key)
+		self._emit([job])
+
+	def flush_all(self) -> None:
+		jobs = []
+		for key, batch in list(self._open.items()):
+			batch.timer.cancel()
+			if batch.items:
+				jobs.append(self._take(key, batch))
+		self._open.clear()
+		if jobs:
+			self._emit(jobs)
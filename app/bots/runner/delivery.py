@@ -0,0 +1,201 @@
+import asyncio
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Callable
+from redis.exceptions import ResponseError
+from app.cache.redis import get_redis
+from app.config import settings
+from app.utils.logger import logger, throttled
+
+@dataclass(frozen=True, slots=True)
+class DeliveryJob:
+	source_chat_id: int
+	message_ids: tuple[int, ...]
+	destination_chat_id: int
+	forward_mode: str
+	attempt: int = 0
+	# media refs aligned with message_ids, only set for rules that skip near-duplicates
+	media: tuple[str, ...] = ()
+	# wall clock when the pipeline routed it (survives the stream hop), for the latency histogram
+	received_at: float = 0.0
+
+	def to_fields(self) -> dict[str, str]:
+		# compact stream entry: only ids travel, senders copy/forward by reference
+		fields = {
+			"s": str(self.source_chat_id),
+			"m": ",".join(map(str, self.message_ids)),
+			"d": str(self.destination_chat_id),
+			"f": self.forward_mode,
+			"a": str(self.attempt),
+		}
+		if self.media:
+			fields["x"] = "|".join(self.media)
+		if self.received_at:
+			fields["t"] = f"{self.received_at:.3f}"
+		return fields
+
+	@classmethod
+	def from_fields(cls, fields: dict[str, str]) -> "DeliveryJob":
+		return cls(
+			source_chat_id=int(fields["s"]),
+			message_ids=tuple(int(x) for x in fields["m"].split(",")),
+			destination_chat_id=int(fields["d"]),
+			forward_mode=fields["f"],
+			attempt=int(fields.get("a", 0)),
+			media=tuple(fields["x"].split("|")) if fields.get("x") else (),
+			received_at=float(fields.get("t", 0)),
+		)
+
+# Submits a job for sending and returns a future resolved when the send finished (or failed)
+Dispatch = Callable[[DeliveryJob], asyncio.Future]
+
+# Durable hand-off between ingestion and sending, backed by one Redis Stream per runner.
+# Producers append jobs without waiting on Telegram; consumers in the "senders" group read them and
+# acknowledge after a successful send. Failed sends are retried in place by the pipeline (so a
+# destination's order holds) and moved to "<stream>:dead" once DELIVERY_MAX_ATTEMPTS are spent.
+# Entries left pending by a crashed consumer, or by an earlier runner of this process, are reclaimed
+# with XPENDING + XCLAIM; entries this queue still has in flight are never taken twice.
+class DeliveryQueue:
+	GROUP = "senders"
+
+	def __init__(self, owner_kind: str, owner_id: int, dispatch: Dispatch) -> None:
+		self.stream = f"deliveries:{owner_kind}:{owner_id}"
+		self.dead_stream = f"{self.stream}:dead"
+		self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+		self._dispatch = dispatch
+		self._buffer: list[DeliveryJob] = []
+		self._wakeup = asyncio.Event()
+		self._inflight = asyncio.Semaphore(max(1, settings.delivery_max_inflight))
+		self._tasks: list[asyncio.Task] = []
+		self._completions: set[asyncio.Task] = set()
+		# entry ids dispatched and not yet acknowledged, possibly waiting minutes behind rate limits
+		self._pending: set[str] = set()
+
+	def enqueue(self, jobs: list[DeliveryJob]) -> None:
+		# synchronous append keeps arrival order; the writer flushes everything pending in one pipeline
+		if not jobs:
+			return
+		self._buffer.extend(jobs)
+		self._wakeup.set()
+
+	async def start(self) -> None:
+		r = await get_redis()
+		try:
+			await r.xgroup_create(self.stream, self.GROUP, id="0", mkstream=True)
+		except ResponseError as e:
+			if "BUSYGROUP" not in str(e):
+				raise
+		self._tasks = [
+			asyncio.create_task(self._writer(), name=f"{self.stream}:writer"),
+			asyncio.create_task(self._reader(), name=f"{self.stream}:reader"),
+		]
+
+	async def stop(self) -> None:
+		for t in self._tasks:
+			t.cancel()
+		await asyncio.gather(*self._tasks, return_exceptions=True)
+		self._tasks = []
+		if self._buffer:
+			# best effort: don't drop jobs accepted but not yet written
+			try:
+				await self._flush()
+			except Exception:
+				logger.exception(f"Failed to flush {len(self._buffer)} deliveries on stop stream={self.stream}")
+
+	async def _flush(self) -> None:
+		jobs, self._buffer = self._buffer, []
+		r = await get_redis()
+		try:
+			async with r.pipeline(transaction=False) as pipe:
+				for job in jobs:
+					pipe.xadd(self.stream, job.to_fields(), maxlen=settings.delivery_stream_maxlen, approximate=True)
+				await pipe.execute()
+		except Exception:
+			self._buffer = jobs + self._buffer
+			raise
+
+	async def _writer(self) -> None:
+		while True:
+			await self._wakeup.wait()
+			self._wakeup.clear()
+			try:
+				await self._flush()
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception(f"Delivery enqueue failed, retrying stream={self.stream}")
+				await asyncio.sleep(1.0)
+				self._wakeup.set()
+
+	async def _reader(self) -> None:
+		r = await get_redis()
+		claim_from: str | None = "-"
+		claim_every = settings.delivery_claim_idle_ms / 1000.0
+		last_claim = time.monotonic()
+		while True:
+			try:
+				# periodically take over entries a dead consumer left unacknowledged, otherwise read new ones
+				if claim_from is None and time.monotonic() - last_claim >= claim_every:
+					claim_from = "-"
+				if claim_from is not None:
+					claim_from, entries = await self._reclaim(r, claim_from)
+					if claim_from is None:
+						last_claim = time.monotonic()
+				else:
+					res = await r.xreadgroup(self.GROUP, self.consumer, {self.stream: ">"}, count=100, block=5000)
+					entries = res[0][1] if res else []
+				for entry_id, fields in entries:
+					if not fields:
+						# trimmed away while pending
+						await r.xack(self.stream, self.GROUP, entry_id)
+						continue
+					await self._inflight.acquire()
+					job = DeliveryJob.from_fields(fields)
+					fut = self._dispatch(job)
+					self._pending.add(entry_id)
+					t = asyncio.create_task(self._complete(entry_id, job, fut))
+					self._completions.add(t)
+					t.add_done_callback(self._completions.discard)
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception(f"Delivery reader error stream={self.stream}")
+				await asyncio.sleep(1.0)
+
+	async def _reclaim(self, r, start: str) -> tuple[str | None, list]:
+		# one page of idle pending entries; returns where the next page starts (None when done)
+		page = await r.xpending_range(self.stream, self.GROUP, min=start, max="+", count=100, idle=settings.delivery_claim_idle_ms)
+		ids = [p["message_id"] for p in page if p["message_id"] not in self._pending]
+		entries = []
+		if ids:
+			# XCLAIM re-checks the idle time, so an entry another consumer just took is left alone
+			entries = await r.xclaim(self.stream, self.GROUP, self.consumer, settings.delivery_claim_idle_ms, ids)
+		if len(page) < 100:
+			return None, entries
+		return f"({page[-1]['message_id']}", entries
+
+	async def _complete(self, entry_id: str, job: DeliveryJob, fut: asyncio.Future) -> None:
+		try:
+			try:
+				await fut
+				error = None
+			except asyncio.CancelledError:
+				# runner stopping: leave the entry pending so it's reclaimed later
+				return
+			except Exception as e:
+				error = f"{type(e).__name__}: {e}"
+			r = await get_redis()
+			async with r.pipeline(transaction=True) as pipe:
+				if error is not None:
+					# the pipeline already retried it in place
+					throttled.warning((self.stream, job.destination_chat_id, error.split(":", 1)[0]), f"Delivery dead-lettered stream={self.stream} destination={job.destination_chat_id} error={error}")
+					pipe.xadd(self.dead_stream, {**job.to_fields(), "e": error[:512]}, maxlen=settings.delivery_stream_maxlen, approximate=True)
+				pipe.xack(self.stream, self.GROUP, entry_id)
+				await pipe.execute()
+		except Exception:
+			logger.exception(f"Delivery ack failed stream={self.stream} entry={entry_id}")
+		finally:
+			self._pending.discard(entry_id)
+			self._inflight.release()
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+from app.utils.logger import throttled
+
+Send = Callable[[], Awaitable[Any]]
+
+# Delivers to many destinations concurrently while keeping strict submission order per destination:
+# every key (destination chat) gets its own FIFO drained by a single worker, and the shared `slots`
+# semaphore bounds how many requests are in flight across all keys. Sends take a slot only around the
+# request itself (see TelegramRateLimiter.call), so waiting on a rate limit doesn't hold one.
+class FanOut:
+	def __init__(self, concurrency: int, name: str = "fanout") -> None:
+		self.name = name
+		self.slots = asyncio.Semaphore(max(1, concurrency))
+		self._queues: dict[Hashable, asyncio.Queue] = {}
+		self._workers: dict[Hashable, asyncio.Task] = {}
+
+	def submit(self, key: Hashable, send: Send) -> asyncio.Future:
+		# synchronous on purpose: callers enqueue before their first await, so arrival order is kept
+		fut = asyncio.get_running_loop().create_future()
+		fut.add_done_callback(_silence)
+		queue = self._queues.get(key)
+		if queue is None:
+			queue = self._queues[key] = asyncio.Queue()
+		queue.put_nowait((send, fut))
+		if key not in self._workers:
+			self._workers[key] = asyncio.create_task(self._drain(key, queue), name=f"{self.name}:{key}")
+		return fut
+
+	@property
+	def pending(self) -> int:
+		return sum(q.qsize() for q in self._queues.values())
+
+	async def _drain(self, key: Hashable, queue: asyncio.Queue) -> None:
+		try:
+			while not queue.empty():
+				send, fut = queue.get_nowait()
+				if fut.cancelled():
+					continue
+				try:
+					result = await send()
+				except asyncio.CancelledError:
+					fut.cancel()
+					raise
+				except Exception as e:
+					throttled.error((self.name, key, type(e).__name__), f"forward error {self.name} destination={key}: {type(e).__name__}: {e}", e)
+					fut.set_exception(e)
+				else:
+					fut.set_result(result)
+		finally:
+			# no await between the empty() check and here, so a concurrent submit either saw this worker
+			# (and its item was drained above) or will start a fresh one
+			self._workers.pop(key, None)
+			if queue.empty():
+				self._queues.pop(key, None)
+
+	async def close(self) -> None:
+		workers = list(self._workers.values())
+		for w in workers:
+			w.cancel()
+		await asyncio.gather(*workers, return_exceptions=True)
+		for queue in self._queues.values():
+			while not queue.empty():
+				_, fut = queue.get_nowait()
+				fut.cancel()
+		self._queues.clear()
+
+def _silence(fut: asyncio.Future) -> None:
+	# errors are already logged (throttled) in _drain; mark them retrieved for callers that fire-and-forget
+	if not fut.cancelled():
+		fut.exception()
@@ -0,0 +1,247 @@
+import re
+from dataclasses import dataclass
+from app.utils.logger import logger
+
+# TaskRoutingRule.filters keys understood here:
+#   keywords / exclude_keywords: list[str]    case-insensitive substring match on text/caption
+#   regex / exclude_regex: str | list[str]    re.search on text/caption
+#   allow_senders / deny_senders: list[int]   sender user/chat ids
+#   media_types: list[str]                    see MEDIA_TYPES; message must be one of them
+#   links / forwards: "only" | "block"
+# Other keys (e.g. skip_near_duplicates) are delivery options and ignored by the matcher.
+# media_types and skip_near_duplicates are also kept in typed columns of the rule (task_service).
+
+TEXT = 1 << 0
+PHOTO = 1 << 1
+VIDEO = 1 << 2
+DOCUMENT = 1 << 3
+AUDIO = 1 << 4
+VOICE = 1 << 5
+ANIMATION = 1 << 6
+STICKER = 1 << 7
+VIDEO_NOTE = 1 << 8
+POLL = 1 << 9
+OTHER = 1 << 10
+
+MEDIA_TYPES = {
+	"text": TEXT,
+	"photo": PHOTO,
+	"video": VIDEO,
+	"document": DOCUMENT,
+	"audio": AUDIO,
+	"voice": VOICE,
+	"animation": ANIMATION,
+	"sticker": STICKER,
+	"video_note": VIDEO_NOTE,
+	"poll": POLL,
+	"other": OTHER,
+}
+
+FILTER_KEYS = frozenset({
+	"keywords", "exclude_keywords", "regex", "exclude_regex", "allow_senders", "deny_senders",
+	"media_types", "links", "forwards",
+})
+
+_LINK_RE = re.compile(r"(?:https?://|www\.|t\.me/|telegram\.me/)", re.IGNORECASE)
+
+def has_link(text: str) -> bool:
+	return bool(_LINK_RE.search(text))
+
+@dataclass(frozen=True, slots=True)
+class MessageFeatures:
+	text: str
+	sender_id: int | None
+	media_type: int
+	has_link: bool
+	is_forward: bool
+
+def merge_features(items: list[MessageFeatures]) -> MessageFeatures:
+	# an album is judged as one message: captions joined, any link/forward counts
+	if len(items) == 1:
+		return items[0]
+	media_type = 0
+	for f in items:
+		media_type |= f.media_type
+	return MessageFeatures(
+		text="\n".join(f.text for f in items if f.text),
+		sender_id=items[0].sender_id,
+		media_type=media_type,
+		has_link=any(f.has_link for f in items),
+		is_forward=any(f.is_forward for f in items),
+	)
+
+# Aho-Corasick automaton: one pass over the text reports every keyword it contains as a bitmask of
+# keyword indexes, whatever the number of keywords.
+class KeywordMatcher:
+	__slots__ = ("_goto", "_fail", "_out")
+
+	def __init__(self, keywords: list[str]) -> None:
+		goto: list[dict[str, int]] = [{}]
+		out: list[int] = [0]
+		for index, kw in enumerate(keywords):
+			node = 0
+			for ch in kw:
+				nxt = goto[node].get(ch)
+				if nxt is None:
+					nxt = len(goto)
+					goto[node][ch] = nxt
+					goto.append({})
+					out.append(0)
+				node = nxt
+			out[node] |= 1 << index
+		fail = [0] * len(goto)
+		queue = list(goto[0].values())
+		for node in queue:
+			for ch, child in goto[node].items():
+				queue.append(child)
+				f = fail[node]
+				while f and ch not in goto[f]:
+					f = fail[f]
+				fail[child] = goto[f].get(ch, 0)
+				out[child] |= out[fail[child]]
+		self._goto = goto
+		self._fail = fail
+		self._out = out
+
+	def scan(self, text: str) -> int:
+		goto, fail, out = self._goto, self._fail, self._out
+		node = 0
+		hits = 0
+		for ch in text:
+			while node and ch not in goto[node]:
+				node = fail[node]
+			node = goto[node].get(ch, 0)
+			o = out[node]
+			if o:
+				hits |= o
+		return hits
+
+def _as_list(value) -> list:
+	if value is None:
+		return []
+	return [value] if isinstance(value, (str, int)) else list(value)
+
+# a backreference points at a group number that joining the patterns would shift
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+class _AnyRegex:
+	__slots__ = ("patterns",)
+
+	def __init__(self, patterns: list[re.Pattern]) -> None:
+		self.patterns = patterns
+
+	def search(self, text: str) -> bool:
+		return any(p.search(text) for p in self.patterns)
+
+def _compile_regexes(patterns: list[str]) -> re.Pattern | _AnyRegex | None:
+	valid = []
+	for p in patterns:
+		try:
+			valid.append(re.compile(str(p), re.IGNORECASE))
+		except re.error as e:
+			# a bad pattern must not break loading the other rules
+			logger.warning(f"Ignoring invalid filter regex {p!r}: {e}")
+	if not valid:
+		return None
+	if len(valid) == 1:
+		return valid[0]
+	if not any(_BACKREF_RE.search(p.pattern) for p in valid):
+		# a single alternation is one search instead of one per pattern; patterns that can't be joined
+		# (inline global flags, duplicate group names) are searched one by one
+		try:
+			return re.compile("|".join(f"(?:{p.pattern})" for p in valid), re.IGNORECASE)
+		except re.error:
+			pass
+	return _AnyRegex(valid)
+
+def _sender_ids(values: list) -> frozenset[int]:
+	ids = set()
+	for x in values:
+		try:
+			ids.add(int(x))
+		except (TypeError, ValueError):
+			logger.warning(f"Ignoring invalid filter sender id {x!r}")
+	return frozenset(ids)
+
+class CompiledFilter:
+	__slots__ = ("include_keywords", "exclude_keywords", "regex", "exclude_regex", "allow_senders", "deny_senders", "media_mask", "links", "forwards")
+
+	def __init__(self, filters: dict, keyword_index: dict[str, int]) -> None:
+		self.include_keywords = _keyword_mask(filters.get("keywords"), keyword_index)
+		self.exclude_keywords = _keyword_mask(filters.get("exclude_keywords"), keyword_index)
+		self.regex = _compile_regexes(_as_list(filters.get("regex")))
+		self.exclude_regex = _compile_regexes(_as_list(filters.get("exclude_regex")))
+		allow = _as_list(filters.get("allow_senders"))
+		# an allow list left empty by invalid ids still restricts: it matches nobody
+		self.allow_senders = _sender_ids(allow) if allow else None
+		self.deny_senders = _sender_ids(_as_list(filters.get("deny_senders")))
+		self.media_mask = media_mask(filters.get("media_types"))
+		self.links = filters.get("links")
+		self.forwards = filters.get("forwards")
+
+	def matches(self, f: MessageFeatures, keyword_hits: int) -> bool:
+		# cheapest checks first
+		if self.media_mask and not f.media_type & self.media_mask:
+			return False
+		if self.forwards == "block" and f.is_forward or self.forwards == "only" and not f.is_forward:
+			return False
+		if self.links == "block" and f.has_link or self.links == "only" and not f.has_link:
+			return False
+		if f.sender_id in self.deny_senders:
+			return False
+		if self.allow_senders is not None and f.sender_id not in self.allow_senders:
+			return False
+		if keyword_hits & self.exclude_keywords:
+			return False
+		if self.include_keywords and not keyword_hits & self.include_keywords:
+			return False
+		if self.exclude_regex is not None and self.exclude_regex.search(f.text):
+			return False
+		if self.regex is not None and not self.regex.search(f.text):
+			return False
+		return True
+
+def _normalize_keyword(kw) -> str:
+	return str(kw).casefold().strip()
+
+def _keyword_mask(keywords, keyword_index: dict[str, int]) -> int:
+	mask = 0
+	for kw in _as_list(keywords):
+		kw = _normalize_keyword(kw)
+		if kw:
+			mask |= 1 << keyword_index[kw]
+	return mask
+
+def media_mask(media_types) -> int:
+	mask = 0
+	for name in _as_list(media_types):
+		mask |= MEDIA_TYPES.get(str(name).lower(), 0)
+	return mask
+
+def has_predicates(filters: dict | None) -> bool:
+	return bool(filters) and any(filters.get(k) for k in FILTER_KEYS)
+
+# All rules of one source chat, compiled together: keywords of every rule share one automaton so a
+# message is scanned once, then each rule is decided with bitmask tests.
+class SourceFilters:
+	__slots__ = ("matcher", "filters")
+
+	def __init__(self, rule_filters: list[dict]) -> None:
+		keyword_index: dict[str, int] = {}
+		for filters in rule_filters:
+			if not has_predicates(filters):
+				continue
+			for key in ("keywords", "exclude_keywords"):
+				for kw in _as_list(filters.get(key)):
+					kw = _normalize_keyword(kw)
+					if kw and kw not in keyword_index:
+						keyword_index[kw] = len(keyword_index)
+		self.matcher = KeywordMatcher(list(keyword_index)) if keyword_index else None
+		self.filters = [CompiledFilter(f, keyword_index) if has_predicates(f) else None for f in rule_filters]
+
+	def evaluate(self, f: MessageFeatures | None) -> list[bool]:
+		if f is None:
+			# features unavailable: only unfiltered rules can be decided
+			return [flt is None for flt in self.filters]
+		hits = self.matcher.scan(f.text.casefold()) if self.matcher is not None and f.text else 0
+		return [flt is None or flt.matches(f, hits) for flt in self.filters]
@@ -1,41 +1,229 @@
 import asyncio
+import random
+import time
+from typing import Any, Callable, Sequence
+from aiogram.exceptions import TelegramUnauthorizedError
+from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+from telethon.errors import UnauthorizedError
+from app.config import settings
+from app.db.base import AsyncSessionFactory
+from app.db.models import Bot, Task
 from app.utils.logger import logger
 from app.bots.made_bot.bot_runner import MadeBotRunner
 from app.bots.userbot.userbot_runner import UserbotRunner
+from app.bots.runner.sharding import ShardCoordinator
+from app.bots.webhook import WebhookServer
+from app.cache.events import publish_runners_changed
+
+# Builds a fresh runner for every (re)start; the runner sets the event once it's online
+RunnerFactory = Callable[[asyncio.Event], Any]
+
+# runs that lasted this long count as healthy and reset the restart backoff
+_STABLE_AFTER = 60.0
+# errors a restart can't fix: the bot/session was deleted or its token/session revoked
+_FATAL = (NoResultFound, TelegramUnauthorizedError, UnauthorizedError)
 
 class RunnerManager:
 	def __init__(self) -> None:
 		self.bot_runners: dict[int, asyncio.Task] = {}
 		self.userbot_runners: dict[int, asyncio.Task] = {}
+		self.stats: dict[str, float] = {}
+		self._start_slots: asyncio.Semaphore | None = None
+		self.webhooks: WebhookServer | None = WebhookServer() if settings.webhook_enabled else None
+		# with sharding, this process only runs the owners whose leases it holds
+		self.shards: ShardCoordinator | None = ShardCoordinator(self._desired, self._shard_start, self._shard_stop) if settings.sharding_enabled else None
+		# owner -> its pending staggered start under sharding
+		self._starting: dict[str, asyncio.Task] = {}
+
+	async def close(self) -> None:
+		if self.shards is not None:
+			await self.shards.stop()
+		if self.webhooks is not None:
+			await self.webhooks.stop()
+
+	async def _active_owners(self) -> tuple[list[int], list[int]]:
+		async with AsyncSessionFactory() as session:
+			bot_ids = list((await session.execute(select(Bot.id).where(Bot.is_active == True))).scalars().all())
+			session_ids = list((await session.execute(
+				select(Task.user_session_id)
+				.where(Task.is_active == True, Task.task_type == "userbot", Task.user_session_id.is_not(None))
+				.distinct()
+			)).scalars().all())
+		return bot_ids, session_ids
+
+	async def _desired(self) -> set[str]:
+		bot_ids, session_ids = await self._active_owners()
+		return {f"bot:{i}" for i in bot_ids} | {f"session:{i}" for i in session_ids}
+
+	async def resume_all(self) -> None:
+		# boot: bring every active made bot and every session used by an active userbot task back online
+		if self.webhooks is not None:
+			await self.webhooks.start()
+		if self.shards is not None:
+			await self.shards.start()
+			return
+		bot_ids, session_ids = await self._active_owners()
+		if self.webhooks is None and len(bot_ids) >= settings.tg_http_pool_limit:
+			logger.warning(f"{len(bot_ids)} polling bots but TG_HTTP_POOL_LIMIT={settings.tg_http_pool_limit}: long polls will starve sends")
+		started = time.monotonic()
+		online = await self.start_runners(bot_ids, session_ids)
+		elapsed = time.monotonic() - started
+		total = len(bot_ids) + len(session_ids)
+		self.stats.update(
+			boot_runners_total=total,
+			boot_runners_online=online,
+			boot_time_to_online_seconds=elapsed,
+		)
+		logger.info(f"Runners resumed online={online}/{total} bots={len(bot_ids)} sessions={len(session_ids)} in {elapsed:.1f}s")
+
+	async def start_runners(self, bot_ids: Sequence[int] = (), session_ids: Sequence[int] = ()) -> int:
+		# staggered start in this process, sharding aside (resume_all, app.bench.load); returns how many came online
+		results = await asyncio.gather(
+			*(self._staggered_start(self._spawn_bot, self.bot_runners, bot_id) for bot_id in bot_ids),
+			*(self._staggered_start(self._spawn_userbot, self.userbot_runners, sid) for sid in session_ids),
+		)
+		return sum(results)
+
+	async def stop_runners(self) -> None:
+		# every runner of this process, waiting for each to be down
+		await asyncio.gather(
+			*(self._halt(self.bot_runners, bot_id) for bot_id in list(self.bot_runners)),
+			*(self._halt(self.userbot_runners, sid) for sid in list(self.userbot_runners)),
+		)
+
+	async def _staggered_start(self, spawn: Callable[[int], tuple[asyncio.Task, asyncio.Event]], runners: dict[int, asyncio.Task], owner_id: int) -> bool:
+		# jitter spreads the first getMe/get_updates/connects, the slots cap how many are connecting at once;
+		# a slot is held until the runner is online (or has failed / timed out)
+		if self._start_slots is None:
+			self._start_slots = asyncio.Semaphore(max(1, settings.runner_start_concurrency))
+		await asyncio.sleep(random.uniform(0, settings.runner_start_jitter_ms / 1000.0))
+		async with self._start_slots:
+			running = runners.get(owner_id)
+			if running is not None and not running.done():
+				# started meanwhile (ensure_*_running): a second runner would poll/connect next to it
+				return True
+			task, ready = spawn(owner_id)
+			waiter = asyncio.ensure_future(ready.wait())
+			try:
+				await asyncio.wait({waiter, task}, timeout=settings.runner_start_timeout, return_when=asyncio.FIRST_COMPLETED)
+			finally:
+				waiter.cancel()
+			return ready.is_set()
+
+	async def _supervise(self, name: str, factory: RunnerFactory, ready: asyncio.Event, runners: dict[int, asyncio.Task], owner_id: int) -> None:
+		delay = settings.runner_restart_min_delay
+		while True:
+			started = time.monotonic()
+			try:
+				await factory(ready).start()
+				# deliberate stops cancel the task; returning on its own (Telethon disconnected, polling
+				# ended) while still registered is a failure like any other
+				if runners.get(owner_id) is not asyncio.current_task():
+					logger.info(f"Runner {name} stopped")
+					return
+				logger.warning(f"Runner {name} returned unexpectedly")
+			except asyncio.CancelledError:
+				raise
+			except _FATAL as e:
+				logger.error(f"Runner {name} can't run, not restarting: {type(e).__name__}: {e}")
+				return
+			except Exception:
+				logger.exception(f"Runner {name} crashed")
+			if time.monotonic() - started >= _STABLE_AFTER:
+				delay = settings.runner_restart_min_delay
+			wait = delay * random.uniform(0.5, 1.0)
+			logger.info(f"Restarting runner {name} in {wait:.1f}s")
+			await asyncio.sleep(wait)
+			delay = min(delay * 2, settings.runner_restart_max_delay)
+
+	def _spawn_bot(self, bot_id: int) -> tuple[asyncio.Task, asyncio.Event]:
+		ready = asyncio.Event()
+		task = asyncio.create_task(self._supervise(f"madebot:{bot_id}", lambda ev: MadeBotRunner(bot_id, ev, self.webhooks), ready, self.bot_runners, bot_id), name=f"madebot:{bot_id}")
+		self.bot_runners[bot_id] = task
+		logger.info(f"Spawned made bot runner bot_id={bot_id}")
+		return task, ready
+
+	def _spawn_userbot(self, user_session_id: int) -> tuple[asyncio.Task, asyncio.Event]:
+		ready = asyncio.Event()
+		task = asyncio.create_task(self._supervise(f"userbot:{user_session_id}", lambda ev: UserbotRunner(user_session_id, ev), ready, self.userbot_runners, user_session_id), name=f"userbot:{user_session_id}")
+		self.userbot_runners[user_session_id] = task
+		logger.info(f"Spawned userbot runner session_id={user_session_id}")
+		return task, ready
+
+	async def _shard_start(self, owner: str) -> None:
+		# don't hold up the rebalance: starts go through the usual staggered slots in the background
+		kind, owner_id = owner.split(":", 1)
+		if kind == "bot":
+			start = self._staggered_start(self._spawn_bot, self.bot_runners, int(owner_id))
+		else:
+			start = self._staggered_start(self._spawn_userbot, self.userbot_runners, int(owner_id))
+		t = asyncio.create_task(start)
+		self._starting[owner] = t
+		t.add_done_callback(lambda _: self._started(owner, t))
+
+	def _started(self, owner: str, task: asyncio.Task) -> None:
+		if self._starting.get(owner) is task:
+			del self._starting[owner]
+
+	async def _shard_stop(self, owner: str, deactivated: bool) -> None:
+		# returns only once the runner is down: the lease is released right after, and the next holder
+		# must not poll or connect while this one still does
+		start = self._starting.pop(owner, None)
+		if start is not None:
+			start.cancel()
+			await asyncio.gather(start, return_exceptions=True)
+		kind, owner_id = owner.split(":", 1)
+		if kind == "bot":
+			await self._stop_bot(int(owner_id), deactivated)
+		else:
+			await self._halt(self.userbot_runners, int(owner_id))
 
 	async def ensure_bot_running(self, bot_id: int) -> None:
+		if self.shards is not None:
+			# whichever worker the bot hashes to picks it up
+			await publish_runners_changed(f"bot:{bot_id}")
+			return
 		if bot_id in self.bot_runners and not self.bot_runners[bot_id].done():
 			return
-		async def _run():
-			runner = MadeBotRunner(bot_id)
-			await runner.start()
-		self.bot_runners[bot_id] = asyncio.create_task(_run(), name=f"madebot:{bot_id}")
-		logger.info(f"Spawned made bot runner bot_id={bot_id}")
+		if self.webhooks is not None:
+			await self.webhooks.start()
+		self._spawn_bot(bot_id)
 
 	async def stop_bot(self, bot_id: int) -> None:
-		task = self.bot_runners.get(bot_id)
+		if self.shards is not None:
+			await publish_runners_changed(f"bot:{bot_id}")
+			return
+		await self._stop_bot(bot_id, True)
+
+	async def _stop_bot(self, bot_id: int, deactivated: bool) -> None:
+		if self.webhooks is not None and deactivated:
+			try:
+				await self.webhooks.remove(bot_id)
+			except Exception:
+				logger.exception(f"deleteWebhook failed bot_id={bot_id}")
+		await self._halt(self.bot_runners, bot_id)
+
+	async def _halt(self, runners: dict[int, asyncio.Task], owner_id: int) -> None:
+		task = runners.pop(owner_id, None)
 		if task:
 			task.cancel()
-			self.bot_runners.pop(bot_id, None)
+			_, pending = await asyncio.wait({task}, timeout=settings.runner_stop_timeout)
+			if pending:
+				logger.warning(f"Runner {task.get_name()} still stopping after {settings.runner_stop_timeout:.0f}s")
 
 	async def ensure_userbot_running(self, user_session_id: int) -> None:
+		if self.shards is not None:
+			await publish_runners_changed(f"session:{user_session_id}")
+			return
 		if user_session_id in self.userbot_runners and not self.userbot_runners[user_session_id].done():
 			return
-		async def _run():
-			runner = UserbotRunner(user_session_id)
-			await runner.start()
-		self.userbot_runners[user_session_id] = asyncio.create_task(_run(), name=f"userbot:{user_session_id}")
-		logger.info(f"Spawned userbot runner session_id={user_session_id}")
+		self._spawn_userbot(user_session_id)
 
 	async def stop_userbot(self, user_session_id: int) -> None:
-		task = self.userbot_runners.get(user_session_id)
-		if task:
-			task.cancel()
-			self.userbot_runners.pop(user_session_id, None)
+		if self.shards is not None:
+			await publish_runners_changed(f"session:{user_session_id}")
+			return
+		await self._halt(self.userbot_runners, user_session_id)
 
-runner_manager = RunnerManager()
\ No newline at end of file
+runner_manager = RunnerManager()
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import io
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable
+from app.config import settings
+from app.utils.logger import logger
+
+# media refs travel with delivery jobs: "<kind>:<locator>", kind "p" = photo, "d" = document/video/other file
+PHOTO = "p"
+FILE = "d"
+
+# Downloads the referenced media of (source_chat_id, message_id); None when unavailable or too large
+FetchMedia = Callable[[int, int, str], Awaitable[bytes | None]]
+
+def _dhash(data: bytes) -> str | None:
+	try:
+		from PIL import Image
+	except ImportError:
+		return None
+	try:
+		with Image.open(io.BytesIO(data)) as img:
+			pixels = list(img.convert("L").resize((9, 8)).getdata())
+	except Exception:
+		return None
+	bits = 0
+	for row in range(8):
+		for col in range(8):
+			bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+	return f"{bits:016x}"
+
+def compute_media_hash(kind: str, data: bytes) -> str:
+	# runs in a worker process: perceptual difference hash for photos (needs Pillow), exact content hash
+	# for everything else and as the fallback
+	if kind == PHOTO:
+		h = _dhash(data)
+		if h is not None:
+			return f"{PHOTO}:{h}"
+	return f"{FILE}:{hashlib.sha256(data).hexdigest()}"
+
+def _distance(a: str, b: str) -> int:
+	if a[0] != PHOTO or b[0] != PHOTO:
+		return 0 if a == b else 64
+	return bin(int(a[2:], 16) ^ int(b[2:], 16)).count("1")
+
+_executor: ProcessPoolExecutor | None = None
+
+def get_executor() -> ProcessPoolExecutor:
+	global _executor
+	if _executor is None:
+		_executor = ProcessPoolExecutor(max_workers=settings.media_hash_workers or None)
+	return _executor
+
+def shutdown_executor() -> None:
+	global _executor
+	if _executor is not None:
+		_executor.shutdown(wait=False, cancel_futures=True)
+		_executor = None
+
+# Per-destination window of recently delivered media hashes, shared by every runner in the process.
+# Downloading is async I/O on the loop; hashing runs in a process pool so it never blocks other updates.
+# A source message is hashed once no matter how many destinations ask about it.
+class NearDuplicateDetector:
+	def __init__(self, window: int | None = None, max_distance: int | None = None) -> None:
+		self.window = window or settings.near_dup_window
+		self.max_distance = settings.near_dup_max_distance if max_distance is None else max_distance
+		self._recent: dict[int, deque[str]] = {}
+		self._hashes: OrderedDict[tuple[int, int], asyncio.Future] = OrderedDict()
+
+	def prefetch(self, source_chat_id: int, message_id: int, ref: str, fetch: FetchMedia) -> asyncio.Future:
+		key = (source_chat_id, message_id)
+		fut = self._hashes.get(key)
+		if fut is None:
+			fut = self._hashes[key] = asyncio.ensure_future(self._compute(source_chat_id, message_id, ref, fetch))
+			while len(self._hashes) > 1024:
+				self._hashes.popitem(last=False)
+		return fut
+
+	async def media_hash(self, source_chat_id: int, message_id: int, ref: str, fetch: FetchMedia) -> str | None:
+		return await asyncio.shield(self.prefetch(source_chat_id, message_id, ref, fetch))
+
+	async def _compute(self, source_chat_id: int, message_id: int, ref: str, fetch: FetchMedia) -> str | None:
+		try:
+			data = await fetch(source_chat_id, message_id, ref)
+			if not data:
+				return None
+			loop = asyncio.get_running_loop()
+			return await loop.run_in_executor(get_executor(), compute_media_hash, ref.split(":", 1)[0], data)
+		except Exception:
+			logger.exception(f"Media hashing failed chat={source_chat_id} message={message_id}")
+			return None
+
+	def check(self, destination_chat_id: int, media_hash: str, pending: list[str] = ()) -> bool:
+		# True means a near-duplicate was delivered (or is in `pending`, the same send); nothing is recorded
+		# here so a send that fails doesn't leave its own hash behind to drop the retry
+		recent = self._recent.get(destination_chat_id, ())
+		return any(_distance(media_hash, h) <= self.max_distance for h in (*recent, *pending))
+
+	def record(self, destination_chat_id: int, hashes: list[str]) -> None:
+		# after the delivery succeeded
+		recent = self._recent.get(destination_chat_id)
+		if recent is None:
+			recent = self._recent[destination_chat_id] = deque(maxlen=self.window)
+		recent.extend(hashes)
+
+near_duplicates = NearDuplicateDetector()
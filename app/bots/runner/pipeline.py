@@ -0,0 +1,234 @@
+import asyncio
+import time
+from dataclasses import replace
+from typing import Any, Awaitable, Callable
+from app.bots.runner.batching import AlbumBuffer, JobBatcher
+from app.bots.runner.delivery import DeliveryJob, DeliveryQueue
+from app.bots.runner.fanout import FanOut
+from app.bots.runner.filters import MessageFeatures, merge_features
+from app.bots.runner.media_hash import FetchMedia, near_duplicates
+from app.bots.runner import profiler
+from app.bots.runner.ratelimit import TelegramRateLimiter, is_permanent
+from app.bots.runner.routing import RoutingIndex
+from app.cache.dedup import deduplicator
+from app.cache.events import event_bus, PROFILING_CHANNEL
+from app.config import settings
+from app.utils.logger import logger, log_enabled
+from app.utils.metrics import FORWARD_LATENCY, FORWARDS_ATTEMPTED, FORWARDS_FAILED, FORWARDS_SUCCEEDED, UPDATES_RECEIVED
+
+Deliver = Callable[[DeliveryJob], Awaitable[Any]]
+# Extracts filter features from a runner-native message (aiogram Message / Telethon Message)
+FeaturesOf = Callable[[Any], MessageFeatures]
+
+# Shared forwarding path of both runners: album buffering -> routing lookup + rule filters -> micro-batching ->
+# (optional Redis Stream hand-off) -> per-destination fan-out -> duplicate / near-duplicate suppression ->
+# rate limiter -> runner-specific deliver(job).
+class ForwardingPipeline:
+	def __init__(self, owner_kind: str, owner_id: int, deliver: Deliver, fetch_media: FetchMedia | None = None, features_of: FeaturesOf | None = None) -> None:
+		self.routing = RoutingIndex(owner_kind, owner_id)
+		self.limiter = TelegramRateLimiter()
+		self.fanout = FanOut(settings.forward_concurrency, name=f"{owner_kind}:{owner_id}")
+		self.queue = DeliveryQueue(owner_kind, owner_id, self.dispatch) if settings.delivery_queue == "stream" else None
+		self.albums = AlbumBuffer(settings.album_window_ms / 1000.0, self._emit)
+		self.batcher = JobBatcher(settings.forward_batch_window_ms / 1000.0, self._submit)
+		self._deliver = deliver
+		self._fetch_media = fetch_media
+		self._features_of = features_of
+		self.near_duplicates = near_duplicates
+		self._labels = (owner_kind, str(owner_id))
+		# every update that reaches the runner, routed or not (see UPDATES_RECEIVED)
+		self.received = UPDATES_RECEIVED.labels(*self._labels)
+		self.owner = f"{owner_kind}:{owner_id}"
+		self.profiler: profiler.UpdateProfiler | None = None
+
+	async def start(self) -> None:
+		event_bus.subscribe(PROFILING_CHANNEL, self._on_profiling)
+		await self._on_profiling(self.owner)
+		await self.routing.start()
+		if self.queue is not None:
+			await self.queue.start()
+
+	async def _on_profiling(self, payload: str) -> None:
+		if payload == self.owner or payload == "*":
+			if self.profiler is not None:
+				self.profiler.close()
+				self.profiler = None
+			try:
+				self.profiler = await profiler.load(self.owner)
+			except Exception:
+				logger.exception(f"Failed to load profiling state for {self.owner}")
+			logger.info(f"Update profiling {'on' if self.profiler else 'off'} for {self.owner}")
+
+	async def stop(self) -> None:
+		event_bus.unsubscribe(PROFILING_CHANNEL, self._on_profiling)
+		if self.profiler is not None:
+			self.profiler.close()
+			self.profiler = None
+		self.albums.flush_all()
+		self.batcher.flush_all()
+		self.routing.stop()
+		if self.queue is not None:
+			await self.queue.stop()
+		await self.fanout.close()
+		# the runner is gone from this process (stopped, or its shard moved): drop its series
+		try:
+			UPDATES_RECEIVED.remove(*self._labels)
+		except KeyError:
+			pass
+
+	def route(self, source_chat_id: int, message_id: int, media_group_id: str | None = None, media_ref: str = "", message: Any = None) -> None:
+		# must stay synchronous: updates are handled as concurrent tasks and order is fixed here
+		self.received.inc()
+		if source_chat_id not in self.routing:
+			return
+		prof = self.profiler
+		if prof is not None:
+			if prof.expired:
+				prof.close()
+				prof = self.profiler = None
+			else:
+				prof.start(source_chat_id, message_id, message)
+		features = None
+		if message is not None and self._features_of is not None and self.routing.has_filters(source_chat_id):
+			features = self._features_of(message)
+		if prof is not None and prof.traces:
+			prof.mark(source_chat_id, (message_id,), "routed")
+		self.albums.add(source_chat_id, message_id, media_group_id, media_ref, features)
+
+	def _emit(self, source_chat_id: int, message_ids: tuple[int, ...], media_refs: tuple[str, ...], features: list[MessageFeatures] | None) -> None:
+		has_media = any(media_refs)
+		prof = self.profiler if self.profiler is not None and self.profiler.traces else None
+		if prof is not None:
+			prof.mark(source_chat_id, message_ids, "emitted")
+		rules = self.routing.match(source_chat_id, merge_features(features) if features else None)
+		# album items are timed from their flush, after the album window
+		now = time.time()
+		jobs = [
+			DeliveryJob(
+				source_chat_id, message_ids, rule.destination_chat_id, rule.forward_mode,
+				media=media_refs if has_media and rule.skip_near_duplicates else (),
+				received_at=now,
+			)
+			for rule in rules
+		]
+		if prof is not None:
+			prof.mark(source_chat_id, message_ids, "filtered", pending=len(jobs))
+		if self._fetch_media is not None and any(job.media for job in jobs):
+			# start downloading/hashing now so destination workers (which must keep order) rarely wait on it
+			for message_id, ref in zip(message_ids, media_refs):
+				if ref:
+					self.near_duplicates.prefetch(source_chat_id, message_id, ref, self._fetch_media)
+		if jobs:
+			self.batcher.add(jobs)
+
+	def _submit(self, jobs: list[DeliveryJob]) -> None:
+		if self.queue is not None:
+			self.queue.enqueue(jobs)
+		else:
+			for job in jobs:
+				self.dispatch(job)
+
+	def dispatch(self, job: DeliveryJob) -> asyncio.Future:
+		return self.fanout.submit(job.destination_chat_id, lambda: self._send_attempts(job))
+
+	async def _send_attempts(self, job: DeliveryJob) -> None:
+		# failures are retried here, inside the destination's worker, so later jobs for that chat wait
+		# behind the retry instead of overtaking it; errors a retry can't fix fail right away
+		attempt = job.attempt
+		while True:
+			try:
+				return await self._send(job)
+			except Exception as e:
+				attempt += 1
+				if attempt >= settings.delivery_max_attempts or is_permanent(e):
+					raise
+			await asyncio.sleep(min(30.0, settings.delivery_retry_delay * 2 ** (attempt - 1)))
+
+	async def _send(self, job: DeliveryJob) -> None:
+		prof = self.profiler if self.profiler is not None and self.profiler.traces else None
+		if prof is None:
+			return await self._send_job(job)
+		started = time.perf_counter()
+		delivering: list[float] = []
+		deliver = self._deliver
+
+		async def timed(job: DeliveryJob) -> Any:
+			delivering.append(time.perf_counter())
+			return await deliver(job)
+
+		error = None
+		try:
+			await self._send_job(job, timed)
+		except Exception as e:
+			error = type(e).__name__
+			raise
+		finally:
+			prof.sent(job.source_chat_id, job.message_ids, job.destination_chat_id, started, delivering[-1] if delivering else None, error)
+
+	async def _send_job(self, job: DeliveryJob, deliver: Deliver | None = None) -> None:
+		deliver = deliver or self._deliver
+		if settings.dedup_enabled:
+			ids = await deduplicator.claim(job.destination_chat_id, job.source_chat_id, job.message_ids)
+			if len(ids) != len(job.message_ids):
+				if log_enabled("DEBUG"):
+					logger.debug(f"Suppressed {len(job.message_ids) - len(ids)} duplicate deliveries to {job.destination_chat_id}")
+			if not ids:
+				return
+			job = _subset(job, ids)
+		claimed = job.message_ids
+		# the claim would expire while the limiter holds the send back for minutes
+		keeper = asyncio.create_task(deduplicator.keep_claimed(job.destination_chat_id, job.source_chat_id, claimed)) if settings.dedup_enabled else None
+		hashes: list[str] = []
+		try:
+			if job.media and self._fetch_media is not None:
+				job = _subset(job, await self._drop_near_duplicates(job, hashes))
+			if job.message_ids:
+				mode = job.forward_mode
+				FORWARDS_ATTEMPTED.labels(mode).inc()
+				try:
+					await self.limiter.call(job.destination_chat_id, lambda: deliver(job), self.fanout.slots)
+				except Exception:
+					FORWARDS_FAILED.labels(mode).inc()
+					raise
+				FORWARDS_SUCCEEDED.labels(mode).inc()
+				if hashes:
+					self.near_duplicates.record(job.destination_chat_id, hashes)
+				if job.received_at:
+					FORWARD_LATENCY.labels(mode).observe(time.time() - job.received_at)
+		except BaseException:
+			if keeper is not None:
+				await _stop(keeper)
+				await deduplicator.release(job.destination_chat_id, job.source_chat_id, claimed)
+			raise
+		if keeper is not None:
+			# stopped first so a late refresh can't shorten the confirmed TTL
+			await _stop(keeper)
+			await deduplicator.confirm(job.destination_chat_id, job.source_chat_id, claimed)
+
+	async def _drop_near_duplicates(self, job: DeliveryJob, hashes: list[str]) -> tuple[int, ...]:
+		# runs inside the destination's fan-out worker, so order towards that destination is kept;
+		# the kept items' hashes are collected in `hashes` and recorded once the send succeeded
+		keep = []
+		for message_id, ref in zip(job.message_ids, job.media):
+			if ref:
+				h = await self.near_duplicates.media_hash(job.source_chat_id, message_id, ref, self._fetch_media)
+				if h is not None:
+					if self.near_duplicates.check(job.destination_chat_id, h, hashes):
+						if log_enabled("DEBUG"):
+							logger.debug(f"Skipped near-duplicate media chat={job.source_chat_id} message={message_id} destination={job.destination_chat_id}")
+						continue
+					hashes.append(h)
+			keep.append(message_id)
+		return tuple(keep)
+
+async def _stop(task: asyncio.Task) -> None:
+	task.cancel()
+	await asyncio.gather(task, return_exceptions=True)
+
+def _subset(job: DeliveryJob, message_ids: tuple[int, ...]) -> DeliveryJob:
+	if message_ids == job.message_ids:
+		return job
+	if not job.media:
+		return replace(job, message_ids=message_ids)
+	refs = dict(zip(job.message_ids, job.media))
+	return replace(job, message_ids=message_ids, media=tuple(refs[m] for m in message_ids))
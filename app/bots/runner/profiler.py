@@ -0,0 +1,193 @@
+import cProfile
+import os
+import random
+import time
+from typing import Any
+from app.cache.events import publish, PROFILING_CHANNEL
+from app.cache.redis import get_redis
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import UPDATE_STAGE_SECONDS
+
+# Stages of one update through ForwardingPipeline, as reported per destination:
+#   telegram  message date -> handler (Telegram's own delivery delay, 1 s resolution)
+#   routing   route(): routing table lookup + filter feature extraction
+#   album     waiting in the album buffer
+#   filter    compiled rule filters
+#   queue     batch window, stream hand-off and the destination's FIFO
+#   limits    dedup claim, near-duplicate check and rate-limiter wait
+#   send      the Telegram request itself
+_MAX_TRACES = 1000
+# a trace nobody completes (its jobs went to another worker through the stream) is dropped after this
+_TRACE_TTL = 300.0
+
+def _key(owner: str) -> str:
+	return f"profiling:{owner}"
+
+class Trace:
+	__slots__ = ("source_chat_id", "message_id", "started", "telegram", "marks", "pending", "sends", "profile")
+
+	def __init__(self, source_chat_id: int, message_id: int, telegram: float | None) -> None:
+		self.source_chat_id = source_chat_id
+		self.message_id = message_id
+		self.started = time.perf_counter()
+		self.telegram = telegram
+		self.marks: dict[str, float] = {}
+		self.pending = 0
+		# destination -> (queue, limits, send, error)
+		self.sends: dict[int, tuple[float, float, float, str | None]] = {}
+		self.profile: cProfile.Profile | None = None
+
+	def stages(self) -> dict[str, float]:
+		out: dict[str, float] = {}
+		if self.telegram is not None:
+			out["telegram"] = self.telegram
+		previous = self.started
+		for stage, mark in (("routing", "routed"), ("album", "emitted"), ("filter", "filtered")):
+			at = self.marks.get(mark)
+			if at is None:
+				break
+			out[stage] = at - previous
+			previous = at
+		return out
+
+# Opt-in per runner (see enable()). A sampled update gets a Trace keyed by (source chat, message id);
+# the pipeline marks it as the update moves on and the trace is finished when every destination's send
+# is done. Stage times go to the tg_update_stage_seconds histogram; updates slower than PROFILE_SLOW_MS
+# are logged with their full breakdown and, with PROFILE_CPROFILE, a cProfile dump. cProfile sees the
+# whole event loop while the update is in flight, so only one update is profiled at a time.
+class UpdateProfiler:
+	_profiling: Trace | None = None
+
+	def __init__(self, owner: str, rate: float, until: float) -> None:
+		self.owner = owner
+		self.rate = rate
+		self.until = until
+		self.traces: dict[tuple[int, int], Trace] = {}
+
+	@property
+	def expired(self) -> bool:
+		return time.time() >= self.until
+
+	def start(self, source_chat_id: int, message_id: int, message: Any) -> Trace | None:
+		# on every update, sampled or not: a stale trace holding cProfile would otherwise keep the
+		# whole event loop profiled until enough traces pile up
+		self._expire()
+		if random.random() >= self.rate or len(self.traces) >= _MAX_TRACES:
+			return None
+		date = getattr(message, "date", None)
+		telegram = max(0.0, time.time() - date.timestamp()) if date is not None else None
+		trace = Trace(source_chat_id, message_id, telegram)
+		if settings.profile_cprofile and UpdateProfiler._profiling is None:
+			trace.profile = cProfile.Profile()
+			trace.profile.enable()
+			UpdateProfiler._profiling = trace
+		self.traces[(source_chat_id, message_id)] = trace
+		return trace
+
+	def mark(self, source_chat_id: int, message_ids: tuple[int, ...], name: str, pending: int | None = None) -> None:
+		now = time.perf_counter()
+		for message_id in message_ids:
+			trace = self.traces.get((source_chat_id, message_id))
+			if trace is None:
+				continue
+			trace.marks[name] = now
+			if pending is not None:
+				trace.pending = pending
+				if not pending:
+					self._finish(trace)
+
+	def sent(self, source_chat_id: int, message_ids: tuple[int, ...], destination_chat_id: int, send_started: float, deliver_started: float | None, error: str | None) -> None:
+		now = time.perf_counter()
+		for message_id in message_ids:
+			trace = self.traces.get((source_chat_id, message_id))
+			if trace is None:
+				continue
+			filtered = trace.marks.get("filtered", send_started)
+			if deliver_started is None:
+				# dropped before sending (duplicate) or failed before the request
+				deliver_started = now
+			trace.sends[destination_chat_id] = (send_started - filtered, deliver_started - send_started, now - deliver_started, error)
+			trace.pending -= 1
+			if trace.pending <= 0:
+				self._finish(trace)
+
+	def _finish(self, trace: Trace) -> None:
+		self.traces.pop((trace.source_chat_id, trace.message_id), None)
+		if trace.profile is not None:
+			trace.profile.disable()
+			UpdateProfiler._profiling = None
+		stages = trace.stages()
+		for name, seconds in stages.items():
+			UPDATE_STAGE_SECONDS.labels(name).observe(seconds)
+		for queue, limits, send, _ in trace.sends.values():
+			UPDATE_STAGE_SECONDS.labels("queue").observe(queue)
+			UPDATE_STAGE_SECONDS.labels("limits").observe(limits)
+			UPDATE_STAGE_SECONDS.labels("send").observe(send)
+		total = time.perf_counter() - trace.started
+		if total * 1000 < settings.profile_slow_ms:
+			return
+		local = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in stages.items())
+		sends = "; ".join(
+			f"{dest}: queue={q * 1000:.1f}ms limits={l * 1000:.1f}ms send={s * 1000:.1f}ms" + (f" error={e}" if e else "")
+			for dest, (q, l, s, e) in trace.sends.items()
+		)
+		dump = ""
+		if trace.profile is not None:
+			os.makedirs(settings.profile_dir, exist_ok=True)
+			dump = os.path.join(settings.profile_dir, f"{self.owner.replace(':', '-')}-{trace.source_chat_id}-{trace.message_id}-{int(time.time())}.prof")
+			trace.profile.dump_stats(dump)
+			dump = f" profile={dump}"
+		logger.warning(
+			f"Slow update {self.owner} chat={trace.source_chat_id} message={trace.message_id} total={total * 1000:.0f}ms "
+			f"{local} | {sends or 'no sends'}{dump}"
+		)
+
+	def _expire(self) -> None:
+		# traces are kept in start order, so only the oldest ones need looking at
+		cutoff = time.perf_counter() - _TRACE_TTL
+		while self.traces:
+			key, trace = next(iter(self.traces.items()))
+			if trace.started >= cutoff:
+				break
+			self._drop(key, trace)
+		# the profiled trace may belong to another runner's profiler that sees no more updates
+		profiling = UpdateProfiler._profiling
+		if profiling is not None and profiling.started < cutoff:
+			profiling.profile.disable()
+			profiling.profile = None
+			UpdateProfiler._profiling = None
+
+	def _drop(self, key: tuple[int, int], trace: Trace) -> None:
+		del self.traces[key]
+		if trace.profile is not None:
+			trace.profile.disable()
+			UpdateProfiler._profiling = None
+
+	def close(self) -> None:
+		for key, trace in list(self.traces.items()):
+			self._drop(key, trace)
+
+async def load(owner: str) -> UpdateProfiler | None:
+	r = await get_redis()
+	value = await r.get(_key(owner))
+	if not value:
+		return None
+	rate, until = value.split(":", 1)
+	return UpdateProfiler(owner, float(rate), float(until))
+
+async def enable(owner: str, rate: float | None = None, seconds: float | None = None) -> float:
+	# turns profiling on for a runner ("bot:<id>" / "session:<id>") in whichever process runs it;
+	# it switches itself off after `seconds` so a forgotten toggle doesn't keep costing
+	rate = settings.profile_sample_rate if rate is None else min(1.0, max(0.0, rate))
+	seconds = seconds or settings.profile_max_seconds
+	until = time.time() + seconds
+	r = await get_redis()
+	await r.set(_key(owner), f"{rate}:{until}", ex=int(seconds))
+	await publish(PROFILING_CHANNEL, owner)
+	return rate
+
+async def disable(owner: str) -> None:
+	r = await get_redis()
+	await r.delete(_key(owner))
+	await publish(PROFILING_CHANNEL, owner)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter, TelegramUnauthorizedError
+from telethon.errors import BadRequestError, FloodWaitError, ForbiddenError, UnauthorizedError
+from app.config import settings
+from app.utils.logger import throttled
+from app.utils.metrics import TELEGRAM_ERRORS
+
+class TokenBucket:
+	__slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+	def __init__(self, rate: float, capacity: float) -> None:
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated = time.monotonic()
+		self.blocked_until = 0.0
+
+	def reserve(self, now: float) -> float:
+		# takes a token now (going into debt if needed) and returns how long the caller must wait;
+		# debt makes concurrent callers queue up in order instead of being rejected
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= 1
+		wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+		return max(wait, self.blocked_until - now)
+
+	def block(self, now: float, seconds: float) -> None:
+		self.blocked_until = max(self.blocked_until, now + seconds)
+
+	def idle(self, now: float) -> bool:
+		return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+def retry_after_of(exc: BaseException) -> float | None:
+	if isinstance(exc, TelegramRetryAfter):
+		return float(exc.retry_after)
+	if isinstance(exc, FloodWaitError):
+		return float(exc.seconds)
+	return None
+
+# errors a retry can't fix: bot banned/kicked from the chat, chat gone, malformed request
+_PERMANENT = (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramUnauthorizedError, BadRequestError, ForbiddenError, UnauthorizedError)
+
+def is_permanent(exc: BaseException) -> bool:
+	return isinstance(exc, _PERMANENT)
+
+# Models Telegram's outbound limits for one bot/account: a global rate across all chats, a per-chat rate
+# and a per-minute budget for groups/channels (negative chat ids). Sends wait for capacity instead of
+# failing, and server-provided retry_after / FloodWait durations pause the affected chat.
+class TelegramRateLimiter:
+	_MAX_CHAT_BUCKETS = 10_000
+
+	def __init__(self, global_rate: float | None = None, chat_rate: float | None = None, group_per_minute: float | None = None, max_retries: int | None = None) -> None:
+		self.global_rate = global_rate or settings.tg_global_rate
+		self.chat_rate = chat_rate or settings.tg_chat_rate
+		self.group_per_minute = group_per_minute or settings.tg_group_per_minute
+		self.max_retries = settings.tg_max_retries if max_retries is None else max_retries
+		self._global = TokenBucket(self.global_rate, self.global_rate)
+		self._chats: dict[int, TokenBucket] = {}
+		self._groups: dict[int, TokenBucket] = {}
+
+	def _bucket(self, buckets: dict[int, TokenBucket], chat_id: int, rate: float, capacity: float, now: float) -> TokenBucket:
+		bucket = buckets.get(chat_id)
+		if bucket is None:
+			if len(buckets) >= self._MAX_CHAT_BUCKETS:
+				for key in [k for k, b in buckets.items() if b.idle(now)]:
+					del buckets[key]
+			bucket = buckets[chat_id] = TokenBucket(rate, capacity)
+		return bucket
+
+	async def acquire(self, chat_id: int) -> None:
+		now = time.monotonic()
+		wait = self._bucket(self._chats, chat_id, self.chat_rate, 1, now).reserve(now)
+		if chat_id < 0:
+			wait = max(wait, self._bucket(self._groups, chat_id, self.group_per_minute / 60.0, self.group_per_minute, now).reserve(now))
+		if wait > 0:
+			await asyncio.sleep(wait)
+		# global tokens are taken last so a chat waiting on its own limit doesn't hold global capacity
+		now = time.monotonic()
+		wait = self._global.reserve(now)
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+	def penalize(self, chat_id: int, seconds: float) -> None:
+		now = time.monotonic()
+		self._bucket(self._chats, chat_id, self.chat_rate, 1, now).block(now, seconds)
+
+	async def call(self, chat_id: int, send: Callable[[], Awaitable[Any]], slots: asyncio.Semaphore | None = None) -> Any:
+		# slots (e.g. the fan-out concurrency limit) is held only around the request itself, never while waiting
+		attempt = 0
+		while True:
+			await self.acquire(chat_id)
+			try:
+				if slots is None:
+					return await send()
+				async with slots:
+					return await send()
+			except Exception as e:
+				TELEGRAM_ERRORS.labels(type(e).__name__).inc()
+				delay = retry_after_of(e)
+				if delay is None or attempt >= self.max_retries:
+					raise
+				attempt += 1
+				throttled.warning(("flood", chat_id), f"Flood limit for chat {chat_id}: retrying in {delay:.0f}s (attempt {attempt}/{self.max_retries})")
+				self.penalize(chat_id, delay)
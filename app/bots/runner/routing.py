@@ -0,0 +1,114 @@
+import asyncio
+from dataclasses import dataclass
+from sqlalchemy import select
+from app.bots.runner.filters import MessageFeatures, SourceFilters, has_predicates
+from app.cache.events import event_bus, ROUTING_CHANNEL
+from app.db.base import AsyncSessionFactory
+from app.db.models import Task, TaskRoutingRule
+from app.utils.logger import logger
+
+@dataclass(frozen=True, slots=True)
+class RouteRule:
+	rule_id: int
+	task_id: int
+	source_chat_id: int
+	destination_chat_id: int
+	forward_mode: str
+	filters: dict
+	skip_near_duplicates: bool = False
+
+# In-memory source_chat_id -> rules table for one runner. Built with a single query at start and
+# rebuilt when task_service publishes a change, so message handling never touches the database.
+class RoutingIndex:
+	def __init__(self, owner_kind: str, owner_id: int) -> None:
+		# owner_kind: "bot" (tasks by bot_id) | "session" (tasks by user_session_id)
+		self.owner_kind = owner_kind
+		self.owner_id = owner_id
+		self._by_source: dict[int, tuple[RouteRule, ...]] = {}
+		self._filters: dict[int, SourceFilters] = {}
+		self._reload_task: asyncio.Task | None = None
+		self._dirty = False
+
+	def __contains__(self, source_chat_id: int) -> bool:
+		return source_chat_id in self._by_source
+
+	def lookup(self, source_chat_id: int) -> tuple[RouteRule, ...]:
+		return self._by_source.get(source_chat_id, ())
+
+	def has_filters(self, source_chat_id: int) -> bool:
+		return source_chat_id in self._filters
+
+	def match(self, source_chat_id: int, features: MessageFeatures | None) -> list[RouteRule] | tuple[RouteRule, ...]:
+		rules = self._by_source.get(source_chat_id, ())
+		compiled = self._filters.get(source_chat_id)
+		if compiled is None:
+			return rules
+		return [rule for rule, ok in zip(rules, compiled.evaluate(features)) if ok]
+
+	def _query(self):
+		# only what RouteRule needs: no ORM entities, no timestamps to decode
+		stmt = select(
+			TaskRoutingRule.id, TaskRoutingRule.task_id, TaskRoutingRule.source_chat_id, TaskRoutingRule.destination_chat_id,
+			TaskRoutingRule.forward_mode, TaskRoutingRule.filters, TaskRoutingRule.skip_near_duplicates,
+		).join(Task, Task.id == TaskRoutingRule.task_id).where(Task.is_active == True)
+		if self.owner_kind == "bot":
+			return stmt.where(Task.bot_id == self.owner_id)
+		return stmt.where(Task.user_session_id == self.owner_id)
+
+	async def load(self) -> None:
+		async with AsyncSessionFactory() as session:
+			res = await session.execute(self._query())
+			rows = res.all()
+		self.replace([
+			RouteRule(
+				rule_id=r.id,
+				task_id=r.task_id,
+				source_chat_id=r.source_chat_id,
+				destination_chat_id=r.destination_chat_id,
+				forward_mode=r.forward_mode,
+				filters=r.filters or {},
+				skip_near_duplicates=r.skip_near_duplicates,
+			)
+			for r in rows
+		])
+		logger.info(f"Routing index loaded {self.owner_kind}={self.owner_id} sources={len(self._by_source)} rules={len(rows)}")
+
+	def replace(self, rules: list[RouteRule]) -> None:
+		by_source: dict[int, list[RouteRule]] = {}
+		for rule in rules:
+			by_source.setdefault(rule.source_chat_id, []).append(rule)
+		# filters are compiled here, once per load, never per message
+		compiled = {
+			source: SourceFilters([r.filters for r in source_rules])
+			for source, source_rules in by_source.items()
+			if any(has_predicates(r.filters) for r in source_rules)
+		}
+		# swap atomically: readers always see either the old or the new table
+		self._by_source, self._filters = {k: tuple(v) for k, v in by_source.items()}, compiled
+
+	async def start(self) -> None:
+		event_bus.subscribe(ROUTING_CHANNEL, self._on_event)
+		await self.load()
+
+	def stop(self) -> None:
+		event_bus.unsubscribe(ROUTING_CHANNEL, self._on_event)
+		if self._reload_task and not self._reload_task.done():
+			self._reload_task.cancel()
+
+	async def _on_event(self, payload: str) -> None:
+		if payload != "*" and payload != f"{self.owner_kind}:{self.owner_id}":
+			return
+		self._dirty = True
+		if self._reload_task is None or self._reload_task.done():
+			self._reload_task = asyncio.create_task(self._reload())
+
+	async def _reload(self) -> None:
+		# coalesce bursts of changes into as few reloads as possible
+		while self._dirty:
+			self._dirty = False
+			try:
+				await self.load()
+			except Exception:
+				logger.exception(f"Routing index reload failed {self.owner_kind}={self.owner_id}")
+				await asyncio.sleep(1.0)
+				self._dirty = True
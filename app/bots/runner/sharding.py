@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable
+from app.cache.events import event_bus, publish_runners_changed, RUNNERS_CHANNEL
+from app.cache.redis import get_redis
+from app.config import settings
+from app.utils.logger import logger
+
+WORKERS_KEY = "runners:workers"
+
+# Owners are "bot:<id>" / "session:<id>"
+Desired = Callable[[], Awaitable[set[str]]]
+Start = Callable[[str], Awaitable[None]]
+# (owner, deactivated): deactivated is False when the runner only moves to another worker
+Stop = Callable[[str, bool], Awaitable[None]]
+
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def _lease_key(owner: str) -> str:
+	return f"runners:lease:{owner}"
+
+def _score(worker_id: str, owner: str) -> int:
+	return int.from_bytes(hashlib.blake2b(f"{worker_id}|{owner}".encode(), digest_size=8).digest(), "big")
+
+def assign(owner: str, workers: list[str]) -> str:
+	# rendezvous hashing: every worker computes the same winner, and a join/leave only moves the owners
+	# whose winner changed
+	return max(workers, key=lambda w: _score(w, owner))
+
+# Splits runners between worker processes/nodes. Workers heartbeat into a sorted set; each owner is
+# assigned to a live worker by rendezvous hashing and only runs under a Redis lease held by that worker.
+# Leases are renewed well within SHARD_LEASE_TTL; a crashed worker's leases expire and its owners are
+# claimed by their new winners. When a worker joins, owners that now hash to it are handed off: the old
+# holder stops the runner and releases the lease, the new one claims it on its next rebalance.
+class ShardCoordinator:
+	def __init__(self, desired: Desired, start: Start, stop: Stop) -> None:
+		self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+		self._desired = desired
+		self._start = start
+		self._stop = stop
+		self.owned: set[str] = set()
+		self._tasks: list[asyncio.Task] = []
+		self._poke = asyncio.Event()
+		self._renew = None
+		self._release = None
+
+	async def start(self) -> None:
+		r = await get_redis()
+		self._renew = r.register_script(_RENEW)
+		self._release = r.register_script(_RELEASE)
+		await self._heartbeat()
+		event_bus.subscribe(RUNNERS_CHANNEL, self._on_event)
+		self._tasks = [
+			asyncio.create_task(self._rebalance_loop(), name="shards:rebalance"),
+			asyncio.create_task(self._renew_loop(), name="shards:renew"),
+		]
+		await publish_runners_changed(f"worker:{self.worker_id}")
+		logger.info(f"Shard worker {self.worker_id} joined")
+
+	async def stop(self) -> None:
+		event_bus.unsubscribe(RUNNERS_CHANNEL, self._on_event)
+		for t in self._tasks:
+			t.cancel()
+		await asyncio.gather(*self._tasks, return_exceptions=True)
+		# hand everything back right away instead of making the others wait for expiry
+		await asyncio.gather(*(self._give_up(owner, False) for owner in list(self.owned)), return_exceptions=True)
+		try:
+			r = await get_redis()
+			await r.zrem(WORKERS_KEY, self.worker_id)
+			await publish_runners_changed(f"worker:{self.worker_id}")
+		except Exception:
+			logger.exception("Failed to leave shard group")
+		logger.info(f"Shard worker {self.worker_id} left")
+
+	async def _on_event(self, payload: str) -> None:
+		if payload != f"worker:{self.worker_id}":
+			self._poke.set()
+
+	async def _heartbeat(self) -> list[str]:
+		r = await get_redis()
+		now = time.time()
+		async with r.pipeline(transaction=False) as pipe:
+			pipe.zadd(WORKERS_KEY, {self.worker_id: now})
+			pipe.zremrangebyscore(WORKERS_KEY, 0, now - settings.shard_lease_ttl)
+			pipe.zrange(WORKERS_KEY, 0, -1)
+			res = await pipe.execute()
+		return list(res[2])
+
+	async def _rebalance_loop(self) -> None:
+		while True:
+			try:
+				await self.rebalance()
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception("Shard rebalance failed")
+			try:
+				await asyncio.wait_for(self._poke.wait(), timeout=settings.shard_rebalance_interval)
+				# let a burst of changes settle into one rebalance
+				await asyncio.sleep(0.5)
+			except asyncio.TimeoutError:
+				pass
+			self._poke.clear()
+
+	async def rebalance(self) -> None:
+		workers = await self._heartbeat()
+		desired = await self._desired()
+		mine = {owner for owner in desired if assign(owner, workers) == self.worker_id}
+		# concurrently: each stop may wait up to RUNNER_STOP_TIMEOUT, and the leases are released only after
+		await asyncio.gather(*(self._give_up(owner, owner not in desired) for owner in self.owned - mine))
+		r = await get_redis()
+		claimable = sorted(mine - self.owned)
+		if not claimable:
+			return
+		ttl_ms = int(settings.shard_lease_ttl * 1000)
+		async with r.pipeline(transaction=False) as pipe:
+			for owner in claimable:
+				pipe.set(_lease_key(owner), self.worker_id, nx=True, px=ttl_ms)
+			claimed = await pipe.execute()
+		for owner, ok in zip(claimable, claimed):
+			if ok:
+				# a lease still held elsewhere (handoff in progress, holder not expired yet) is retried next round
+				self.owned.add(owner)
+				await self._start(owner)
+		logger.info(f"Shard rebalance workers={len(workers)} desired={len(desired)} owned={len(self.owned)}")
+
+	async def _give_up(self, owner: str, deactivated: bool) -> None:
+		self.owned.discard(owner)
+		try:
+			await self._stop(owner, deactivated)
+		finally:
+			await self._release(keys=[_lease_key(owner)], args=[self.worker_id])
+
+	async def _renew_loop(self) -> None:
+		while True:
+			await asyncio.sleep(settings.shard_lease_ttl / 3)
+			try:
+				await self._heartbeat()
+				owners = list(self.owned)
+				ttl_ms = int(settings.shard_lease_ttl * 1000)
+				r = await get_redis()
+				async with r.pipeline(transaction=False) as pipe:
+					for owner in owners:
+						await self._renew(keys=[_lease_key(owner)], args=[self.worker_id, ttl_ms], client=pipe)
+					renewed = await pipe.execute()
+				lost = [owner for owner, ok in zip(owners, renewed) if not ok and owner in self.owned]
+				for owner in lost:
+					# the lease expired (e.g. we were partitioned from Redis) and may already run elsewhere
+					logger.warning(f"Lease lost for {owner}, stopping its runner")
+					self.owned.discard(owner)
+				await asyncio.gather(*(self._stop(owner, False) for owner in lost))
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception("Lease renewal failed")
@@ -2,16 +2,23 @@ import asyncio
 from telethon import TelegramClient, events
 from sqlalchemy import select
 from app.db.base import AsyncSessionFactory
-from app.db.models import Task, TaskRoutingRule, UserSession
+from app.db.models import UserSession
+from app.bots.runner import filters
+from app.bots.runner.delivery import DeliveryJob
+from app.bots.runner.pipeline import ForwardingPipeline
+from app.bots.runner.media_hash import PHOTO, FILE
 from app.utils.crypto import decrypt_text
 from app.utils.logger import logger
 from app.config import settings
 from telethon.sessions import StringSession
+from telethon.tl.types import Message, MessageEntityTextUrl, MessageEntityUrl
 
 class UserbotRunner:
-	def __init__(self, user_session_id: int) -> None:
+	def __init__(self, user_session_id: int, ready: asyncio.Event | None = None) -> None:
 		self.user_session_id = user_session_id
+		self.ready = ready or asyncio.Event()
 		self.client: TelegramClient | None = None
+		self.pipeline = ForwardingPipeline("session", user_session_id, self._deliver, self._fetch_media, _features)
 
 	async def start(self) -> None:
 		async with AsyncSessionFactory() as session:
@@ -23,20 +30,67 @@ class UserbotRunner:
 		if not api_id or not api_hash:
 			raise RuntimeError("TELETHON_API_ID/TELETHON_API_HASH are required")
 		self.client = TelegramClient(StringSession(session_string), api_id, api_hash)
-		self.client.add_event_handler(self._on_message, events.NewMessage())
+		# the predicate reads the live index, so chats added/removed by task_service apply immediately
+		# and messages from unrouted dialogs are dropped before reaching _on_message
+		self.client.add_event_handler(self._on_message, events.NewMessage(func=self._is_routed))
 		logger.info(f"Starting userbot session {self.user_session_id}")
-		await self.client.start()
-		await self.client.run_until_disconnected()
+		try:
+			await self.pipeline.start()
+			await self.client.start()
+			self.ready.set()
+			await self.client.run_until_disconnected()
+		finally:
+			await self.pipeline.stop()
+
+	def _is_routed(self, event: events.NewMessage.Event) -> bool:
+		if event.chat_id in self.pipeline.routing:
+			return True
+		# dropped before route(), which counts the rest
+		self.pipeline.received.inc()
+		return False
 
 	async def _on_message(self, event: events.NewMessage.Event):
-		source_chat_id = event.chat_id
-		async with AsyncSessionFactory() as session:
-			res = await session.execute(select(Task).where(Task.user_session_id == self.user_session_id, Task.is_active == True))
-			tasks = list(res.scalars().all())
-			for task in tasks:
-				res2 = await session.execute(select(TaskRoutingRule).where(TaskRoutingRule.task_id == task.id, TaskRoutingRule.source_chat_id == source_chat_id))
-				for rule in res2.scalars().all():
-					try:
-						await self.client.forward_messages(rule.destination_chat_id, event.message)
-					except Exception:
-						logger.exception("userbot forward error")
\ No newline at end of file
+		msg = event.message
+		media_ref = f"{PHOTO}:" if msg.photo else f"{FILE}:" if msg.document else ""
+		self.pipeline.route(event.chat_id, msg.id, str(msg.grouped_id) if msg.grouped_id else None, media_ref, msg)
+
+	async def _deliver(self, job: DeliveryJob) -> None:
+		# album items and batched bursts are forwarded together in one request
+		await self.client.forward_messages(job.destination_chat_id, list(job.message_ids), from_peer=job.source_chat_id)
+
+	async def _fetch_media(self, source_chat_id: int, message_id: int, ref: str) -> bytes | None:
+		msg = await self.client.get_messages(source_chat_id, ids=message_id)
+		if msg is None or msg.file is None or (msg.file.size or 0) > settings.near_dup_max_bytes:
+			return None
+		return await self.client.download_media(msg, file=bytes)
+
+def _media_type(msg: Message) -> int:
+	if msg.photo:
+		return filters.PHOTO
+	if msg.gif:
+		return filters.ANIMATION
+	if msg.video_note:
+		return filters.VIDEO_NOTE
+	if msg.video:
+		return filters.VIDEO
+	if msg.voice:
+		return filters.VOICE
+	if msg.audio:
+		return filters.AUDIO
+	if msg.sticker:
+		return filters.STICKER
+	if msg.document:
+		return filters.DOCUMENT
+	if msg.poll:
+		return filters.POLL
+	return filters.TEXT if msg.message else filters.OTHER
+
+def _features(msg: Message) -> filters.MessageFeatures:
+	text = msg.message or ""
+	return filters.MessageFeatures(
+		text=text,
+		sender_id=msg.sender_id,
+		media_type=_media_type(msg),
+		has_link=any(isinstance(e, (MessageEntityUrl, MessageEntityTextUrl)) for e in msg.entities or ()) or filters.has_link(text),
+		is_forward=msg.fwd_from is not None,
+	)
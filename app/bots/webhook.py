@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import hmac
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from sqlalchemy import select
+from app.bots.http import get_bot_session
+from app.config import settings
+from app.db.base import AsyncSessionFactory
+from app.db.models import Bot as BotModel
+from app.utils.crypto import decrypt_text
+from app.utils.logger import logger, throttled
+
+# One aiohttp server receives the updates of every made bot in the process: Telegram posts to
+# <WEBHOOK_PATH>/<bot_id>/<signature> and the update is fed to that bot's dispatcher. Path signatures
+# and the X-Telegram-Bot-Api-Secret-Token value are derived from WEBHOOK_SECRET per bot, so nothing
+# has to be stored and one bot's URL can't be used to inject updates into another.
+class WebhookServer:
+	def __init__(self) -> None:
+		self.prefix = "/" + settings.webhook_path.strip("/")
+		self.app = web.Application(client_max_size=settings.webhook_max_body)
+		self.app.router.add_post(self.prefix + "/{bot_id:\\d+}/{signature}", self._handle)
+		self._bots: dict[int, tuple[Bot, Dispatcher]] = {}
+		self._feeding: set[asyncio.Task] = set()
+		self._runner: web.AppRunner | None = None
+		self._key = (settings.webhook_secret or settings.app_encryption_key).encode()
+
+	def _sign(self, purpose: str, bot_id: int) -> str:
+		return hmac.new(self._key, f"{purpose}:{bot_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+	def url_for(self, bot_id: int) -> str:
+		return f"{settings.webhook_base_url.rstrip('/')}{self.prefix}/{bot_id}/{self._sign('path', bot_id)}"
+
+	def secret_token(self, bot_id: int) -> str:
+		return self._sign("token", bot_id)
+
+	@property
+	def bots(self) -> int:
+		return len(self._bots)
+
+	async def start(self) -> None:
+		if self._runner is not None:
+			return
+		if not settings.webhook_base_url:
+			raise RuntimeError("WEBHOOK_BASE_URL is required when WEBHOOK_ENABLED is on")
+		runner = web.AppRunner(self.app, access_log=None)
+		await runner.setup()
+		await web.TCPSite(runner, settings.webhook_host, settings.webhook_port).start()
+		self._runner = runner
+		logger.info(f"Webhook server listening on {settings.webhook_host}:{settings.webhook_port}{self.prefix}")
+
+	async def stop(self) -> None:
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+		for t in list(self._feeding):
+			t.cancel()
+
+	async def attach(self, bot_id: int, bot: Bot, dp: Dispatcher) -> None:
+		# route first, then tell Telegram: updates may arrive as soon as setWebhook returns
+		self._bots[bot_id] = (bot, dp)
+		await bot.set_webhook(
+			self.url_for(bot_id),
+			secret_token=self.secret_token(bot_id),
+			allowed_updates=dp.resolve_used_update_types(),
+			max_connections=settings.webhook_max_connections,
+		)
+
+	def detach(self, bot_id: int) -> None:
+		# local only: on restarts/shutdown the webhook stays set and Telegram keeps the updates until we're back
+		self._bots.pop(bot_id, None)
+
+	async def remove(self, bot_id: int) -> None:
+		# the bot is deactivated or deleted: stop Telegram from pushing to us, also when its runner isn't
+		# attached here (crashed, in backoff, owned by another shard)
+		entry = self._bots.pop(bot_id, None)
+		if entry is not None:
+			await entry[0].delete_webhook()
+			return
+		async with AsyncSessionFactory() as session:
+			res = await session.execute(select(BotModel.token_encrypted).where(BotModel.id == bot_id))
+			encrypted = res.scalar_one_or_none()
+		# a deleted bot's row is gone; bot_service.delete_bot removes its webhook itself
+		if encrypted:
+			await delete_webhook(decrypt_text(encrypted))
+
+	async def _handle(self, request: web.Request) -> web.Response:
+		bot_id = int(request.match_info["bot_id"])
+		if not hmac.compare_digest(request.match_info["signature"], self._sign("path", bot_id)):
+			return web.Response(status=403)
+		if not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.secret_token(bot_id)):
+			return web.Response(status=403)
+		entry = self._bots.get(bot_id)
+		if entry is None:
+			# runner (re)starting on this process: an error makes Telegram redeliver later
+			return web.Response(status=503)
+		try:
+			update = await request.json()
+		except ValueError:
+			# malformed body: a 5xx would only make Telegram retry it
+			return web.Response(status=400)
+		# answer right away, handlers run in the background like polling's handle_as_tasks
+		t = asyncio.create_task(self._feed(entry[0], entry[1], update))
+		self._feeding.add(t)
+		t.add_done_callback(self._feeding.discard)
+		return web.Response()
+
+	async def _feed(self, bot: Bot, dp: Dispatcher, update: dict) -> None:
+		try:
+			result = await dp.feed_raw_update(bot, update)
+			if isinstance(result, TelegramMethod):
+				await dp.silent_call_request(bot, result)
+		except Exception as e:
+			throttled.error(("webhook", bot.id, type(e).__name__), f"Webhook update failed bot_id={bot.id}: {type(e).__name__}: {e}", e)
+
+async def delete_webhook(token: str) -> None:
+	# for bots without a running Bot instance in this process; goes over the shared pool
+	await Bot(token=token, session=get_bot_session()).delete_webhook()
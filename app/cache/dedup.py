@@ -0,0 +1,65 @@
+import asyncio
+from collections import OrderedDict
+from app.cache.redis import get_redis
+from app.config import settings
+from app.utils.logger import throttled
+
+# Idempotency guard for sends, keyed on (destination_chat_id, source_chat_id, message_id) and shared by
+# every runner (bot and userbot) through Redis. A key is first claimed with a short TTL while the send is
+# in flight, then confirmed with the full TTL; a failed send releases it and a crashed sender's claim
+# simply expires, so the redelivered job can go out again. A sender keeps its claim alive with
+# keep_claimed() for as long as the send is held up by rate limits or flood waits. Confirmed keys are also remembered in a
+# per-process LRU to skip the Redis round trip for repeats seen by this process.
+class DeliveryDeduplicator:
+	def __init__(self, ttl: int | None = None, claim_ttl: int | None = None, lru_size: int | None = None) -> None:
+		self.ttl = ttl or settings.dedup_ttl
+		self.claim_ttl = claim_ttl or settings.dedup_claim_ttl
+		self.lru_size = lru_size or settings.dedup_lru_size
+		self._seen: OrderedDict[tuple[int, int, int], None] = OrderedDict()
+
+	@staticmethod
+	def _key(destination_chat_id: int, source_chat_id: int, message_id: int) -> str:
+		return f"dedup:{destination_chat_id}:{source_chat_id}:{message_id}"
+
+	async def claim(self, destination_chat_id: int, source_chat_id: int, message_ids: tuple[int, ...]) -> tuple[int, ...]:
+		# returns the ids that were not delivered (or being delivered) yet and now belong to the caller
+		fresh = [m for m in message_ids if (destination_chat_id, source_chat_id, m) not in self._seen]
+		if not fresh:
+			return ()
+		r = await get_redis()
+		async with r.pipeline(transaction=False) as pipe:
+			for m in fresh:
+				pipe.set(self._key(destination_chat_id, source_chat_id, m), "1", nx=True, ex=self.claim_ttl)
+			results = await pipe.execute()
+		return tuple(m for m, ok in zip(fresh, results) if ok)
+
+	async def confirm(self, destination_chat_id: int, source_chat_id: int, message_ids: tuple[int, ...]) -> None:
+		r = await get_redis()
+		async with r.pipeline(transaction=False) as pipe:
+			for m in message_ids:
+				pipe.set(self._key(destination_chat_id, source_chat_id, m), "1", ex=self.ttl)
+			await pipe.execute()
+		for m in message_ids:
+			self._seen[(destination_chat_id, source_chat_id, m)] = None
+		while len(self._seen) > self.lru_size:
+			self._seen.popitem(last=False)
+
+	async def keep_claimed(self, destination_chat_id: int, source_chat_id: int, message_ids: tuple[int, ...]) -> None:
+		# runs until cancelled, refreshing the claim well before it would expire
+		keys = [self._key(destination_chat_id, source_chat_id, m) for m in message_ids]
+		while True:
+			await asyncio.sleep(self.claim_ttl / 3)
+			try:
+				r = await get_redis()
+				async with r.pipeline(transaction=False) as pipe:
+					for key in keys:
+						pipe.expire(key, self.claim_ttl)
+					await pipe.execute()
+			except Exception as e:
+				throttled.warning(("dedup-claim", destination_chat_id, type(e).__name__), f"Dedup claim refresh failed destination={destination_chat_id}: {e}")
+
+	async def release(self, destination_chat_id: int, source_chat_id: int, message_ids: tuple[int, ...]) -> None:
+		r = await get_redis()
+		await r.delete(*(self._key(destination_chat_id, source_chat_id, m) for m in message_ids))
+
+deduplicator = DeliveryDeduplicator()
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Callable
+from app.cache.redis import get_redis
+from app.utils.logger import logger
+
+ROUTING_CHANNEL = "routing:changed"
+RUNNERS_CHANNEL = "runners:changed"
+PROFILING_CHANNEL = "profiling:changed"
+
+Listener = Callable[[str], Awaitable[None]]
+
+async def publish(channel: str, payload: str) -> None:
+	r = await get_redis()
+	await r.publish(channel, payload)
+
+async def publish_routing_changed(bot_id: int | None = None, user_session_id: int | None = None) -> None:
+	# payload format: "bot:<id>" / "session:<id>"
+	if bot_id is not None:
+		await publish(ROUTING_CHANNEL, f"bot:{bot_id}")
+	if user_session_id is not None:
+		await publish(ROUTING_CHANNEL, f"session:{user_session_id}")
+
+async def publish_runners_changed(owner: str) -> None:
+	# payload: "bot:<id>" / "session:<id>" when a runner should start or stop, "worker:<id>" on join/leave
+	await publish(RUNNERS_CHANNEL, owner)
+
+class EventBus:
+	# one pub/sub connection per process, fanned out to in-process listeners
+	def __init__(self) -> None:
+		self._listeners: dict[str, set[Listener]] = {}
+		self._task: asyncio.Task | None = None
+
+	def subscribe(self, channel: str, listener: Listener) -> None:
+		self._listeners.setdefault(channel, set()).add(listener)
+		if self._task is None or self._task.done():
+			self._task = asyncio.create_task(self._listen(), name="eventbus")
+
+	def unsubscribe(self, channel: str, listener: Listener) -> None:
+		listeners = self._listeners.get(channel)
+		if listeners:
+			listeners.discard(listener)
+
+	async def _dispatch(self, channel: str, payload: str) -> None:
+		for listener in list(self._listeners.get(channel, ())):
+			try:
+				await listener(payload)
+			except Exception:
+				logger.exception(f"event listener failed channel={channel}")
+
+	async def _listen(self) -> None:
+		reconnect = False
+		while True:
+			pubsub = None
+			try:
+				r = await get_redis()
+				pubsub = r.pubsub()
+				subscribed = set(self._listeners.keys())
+				await pubsub.subscribe(*subscribed)
+				if reconnect:
+					# messages may have been missed while disconnected: tell everyone to resync
+					for channel in subscribed:
+						await self._dispatch(channel, "*")
+				while True:
+					pending = set(self._listeners.keys()) - subscribed
+					if pending:
+						await pubsub.subscribe(*pending)
+						subscribed |= pending
+					msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+					if msg is not None:
+						await self._dispatch(msg["channel"], msg["data"])
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception("event bus connection lost, reconnecting")
+				reconnect = True
+				await asyncio.sleep(1.0)
+			finally:
+				if pubsub is not None:
+					try:
+						await pubsub.aclose()
+					except Exception:
+						pass
+
+event_bus = EventBus()
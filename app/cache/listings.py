@@ -0,0 +1,91 @@
+import json
+from dataclasses import astuple, dataclass, fields
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache.redis import get_redis
+from app.config import settings
+from app.db.hooks import on_commit
+from app.utils.logger import logger
+from app.utils.metrics import LISTING_CACHE
+
+# Read-through cache for the menu listings (list_bots, list_tasks, list_routing_rules, list_user_sessions).
+# Every scope (an owner's bots or sessions, a bot's tasks and their rules) has a version counter in Redis;
+# listings are stored under the version they were read at, as JSON arrays of the snapshot's fields, and
+# expire after LISTING_CACHE_TTL. The service functions that change a scope bump() its version once
+# their transaction commits, so the next read misses and reloads, and the old entries just expire.
+# Version keys never expire: one small counter per owner/bot, and an expired counter restarting at 0
+# could land on an entry still cached under that number.
+
+@dataclass(frozen=True, slots=True)
+class BotRow:
+	id: int
+	name: str
+	username: str | None
+	is_active: bool
+
+@dataclass(frozen=True, slots=True)
+class TaskRow:
+	id: int
+	bot_id: int
+	name: str
+	task_type: str
+	is_active: bool
+
+@dataclass(frozen=True, slots=True)
+class RuleRow:
+	id: int
+	task_id: int
+	source_chat_id: int
+	destination_chat_id: int
+	forward_mode: str
+
+@dataclass(frozen=True, slots=True)
+class SessionRow:
+	# `id` and `label` are what the menus show; no secrets are cached
+	id: int
+	session_type: str
+	label: str | None
+
+Row = TypeVar("Row")
+
+def snapshot(row_type: type[Row], obj) -> Row:
+	return row_type(*(getattr(obj, f.name) for f in fields(row_type)))
+
+def _version_key(scope: str) -> str:
+	return f"listing_ver:{scope}"
+
+async def cached(listing: str, scope: str, sub: str, row_type: type[Row], load: Callable[[], Awaitable[list]]) -> list[Row]:
+	# `scope` is the versioned owner of the data ("bots:<user id>", "tasks:<bot id>", ...),
+	# `sub` tells listings apart within it (the rules of one task)
+	if not settings.listing_cache_enabled:
+		return [snapshot(row_type, obj) for obj in await load()]
+	r = await get_redis()
+	try:
+		version = await r.get(_version_key(scope)) or "0"
+		key = f"listing:{scope}:{version}:{sub}"
+		raw = await r.get(key)
+	except Exception:
+		logger.exception(f"Listing cache read failed {scope}")
+		key = raw = None
+	if raw is not None:
+		LISTING_CACHE.labels(listing, "hit").inc()
+		return [row_type(*values) for values in json.loads(raw)]
+	LISTING_CACHE.labels(listing, "miss").inc()
+	rows = [snapshot(row_type, obj) for obj in await load()]
+	if key is not None:
+		try:
+			await r.set(key, json.dumps([astuple(row) for row in rows], separators=(",", ":")), ex=settings.listing_cache_ttl)
+		except Exception:
+			logger.exception(f"Listing cache write failed {scope}")
+	return rows
+
+def bump(session: AsyncSession, *scopes: str) -> None:
+	# INCR is atomic, so concurrent writers each move the version on and no reader keeps a stale entry
+	async def _bump():
+		r = await get_redis()
+		async with r.pipeline(transaction=False) as pipe:
+			for scope in scopes:
+				pipe.incr(_version_key(scope))
+			await pipe.execute()
+	if settings.listing_cache_enabled:
+		on_commit(session, _bump)
@@ -0,0 +1,73 @@
+import time
+from sqlalchemy import select
+from app.cache.events import event_bus, publish
+from app.cache.redis import get_redis
+from app.config import settings
+from app.db.base import AsyncSessionFactory
+from app.db.models import Bot, User
+from app.services.user_service import UserRef
+from app.utils.logger import logger
+
+OWNERS_CHANNEL = "owners:changed"
+
+# bot_id -> owner, cached in process and in Redis with OWNER_CACHE_TTL so the made-bot panel authorizes
+# without touching the database. Deleting or transferring a bot must call invalidate(): it drops the
+# Redis entry and tells every process to forget its local copy.
+class OwnerCache:
+	def __init__(self, ttl: int | None = None) -> None:
+		self.ttl = ttl or settings.owner_cache_ttl
+		self._local: dict[int, tuple[float, UserRef]] = {}
+		self._subscribed = False
+
+	@staticmethod
+	def _key(bot_id: int) -> str:
+		return f"bot_owner:{bot_id}"
+
+	async def get(self, bot_id: int) -> UserRef | None:
+		if not self._subscribed:
+			event_bus.subscribe(OWNERS_CHANNEL, self._on_event)
+			self._subscribed = True
+		now = time.monotonic()
+		entry = self._local.get(bot_id)
+		if entry is not None and entry[0] > now:
+			return entry[1]
+		owner = None
+		r = await get_redis()
+		try:
+			cached = await r.get(self._key(bot_id))
+		except Exception:
+			logger.exception(f"Owner cache read failed bot_id={bot_id}")
+			cached = None
+		if cached:
+			user_id, telegram_user_id = cached.split(":", 1)
+			owner = UserRef(int(user_id), int(telegram_user_id))
+		else:
+			async with AsyncSessionFactory() as session:
+				res = await session.execute(
+					select(User.id, User.telegram_user_id).join(Bot, Bot.owner_id == User.id).where(Bot.id == bot_id)
+				)
+				row = res.first()
+			if row is None:
+				return None
+			owner = UserRef(row.id, row.telegram_user_id)
+			try:
+				await r.set(self._key(bot_id), f"{owner.id}:{owner.telegram_user_id}", ex=self.ttl)
+			except Exception:
+				logger.exception(f"Owner cache write failed bot_id={bot_id}")
+		self._local[bot_id] = (now + self.ttl, owner)
+		return owner
+
+	async def invalidate(self, bot_id: int) -> None:
+		self._local.pop(bot_id, None)
+		r = await get_redis()
+		await r.delete(self._key(bot_id))
+		await publish(OWNERS_CHANNEL, str(bot_id))
+
+	async def _on_event(self, payload: str) -> None:
+		if payload == "*":
+			# missed messages while reconnecting
+			self._local.clear()
+		else:
+			self._local.pop(int(payload), None)
+
+owner_cache = OwnerCache()
@@ -1,10 +1,35 @@
+import time
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 from app.config import settings
+from app.utils.metrics import observe_redis
+
+class TimedPipeline(Pipeline):
+	# one round trip for the whole batch, observed as command "PIPELINE" (or "MULTI" for transactions)
+	async def execute(self, raise_on_error: bool = True):
+		started = time.perf_counter()
+		try:
+			return await super().execute(raise_on_error)
+		finally:
+			observe_redis("MULTI" if self.is_transaction else "PIPELINE", started)
+
+class TimedRedis(redis.Redis):
+	async def execute_command(self, *args, **options):
+		started = time.perf_counter()
+		try:
+			return await super().execute_command(*args, **options)
+		finally:
+			observe_redis(str(args[0]), started)
+
+	def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> TimedPipeline:
+		# pipelined commands bypass execute_command above
+		return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 redis_client: redis.Redis | None = None
 
 async def get_redis() -> redis.Redis:
 	global redis_client
 	if redis_client is None:
-		redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-	return redis_client
\ No newline at end of file
+		cls = TimedRedis if settings.metrics_enabled else redis.Redis
+		redis_client = cls.from_url(settings.redis_url, decode_responses=True)
+	return redis_client
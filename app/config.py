@@ -5,7 +5,13 @@ class Settings(BaseSettings):
 	app_env: str = Field(default="development", alias="APP_ENV")
 	app_locale: str = Field(default="ar", alias="APP_LOCALE")
 	app_tz: str = Field(default="Asia/Riyadh", alias="APP_TZ")
-	app_encryption_key: str = Field(default="", alias="APP_ENCRYPTION_KEY")
+	app_encryption_key: str = Field(default="", alias="APP_ENCRYPTION_KEY")  # comma-separated when rotating, newest first
+
+	# Logging
+	log_level: str = Field(default="INFO", alias="LOG_LEVEL")
+	log_json: bool = Field(default=False, alias="LOG_JSON")  # one JSON object per line instead of text
+	log_error_window: float = Field(default=60.0, alias="LOG_ERROR_WINDOW")  # seconds per repeated-error summary
+	log_error_samples: int = Field(default=1, alias="LOG_ERROR_SAMPLES")  # full entries per key and window before collapsing
 
 	builder_bot_token: str = Field(default="", alias="BUILDER_BOT_TOKEN")
 
@@ -23,6 +29,81 @@ class Settings(BaseSettings):
 	telethon_api_id: int | None = Field(default=None, alias="TELETHON_API_ID")
 	telethon_api_hash: str | None = Field(default=None, alias="TELETHON_API_HASH")
 
+	# Forwarding pipeline
+	forward_concurrency: int = Field(default=20, alias="FORWARD_CONCURRENCY")  # max in-flight sends per runner
+	tg_global_rate: float = Field(default=30.0, alias="TG_GLOBAL_RATE")  # messages/sec per bot or account
+	tg_chat_rate: float = Field(default=1.0, alias="TG_CHAT_RATE")  # messages/sec per destination chat
+	tg_group_per_minute: float = Field(default=20.0, alias="TG_GROUP_PER_MINUTE")  # messages/min per group or channel
+	tg_max_retries: int = Field(default=5, alias="TG_MAX_RETRIES")  # RetryAfter/FloodWait retries before giving up
+	album_window_ms: int = Field(default=700, alias="ALBUM_WINDOW_MS")  # wait for the rest of a media group
+	forward_batch_window_ms: int = Field(default=500, alias="FORWARD_BATCH_WINDOW_MS")  # merge bursts per destination, 0 = off
+	dedup_enabled: bool = Field(default=True, alias="DEDUP_ENABLED")  # suppress repeated (destination, source, message) sends
+	dedup_ttl: int = Field(default=86400, alias="DEDUP_TTL")  # seconds a delivered message stays remembered
+	dedup_claim_ttl: int = Field(default=60, alias="DEDUP_CLAIM_TTL")  # seconds an in-flight claim survives a crashed sender
+	dedup_lru_size: int = Field(default=100000, alias="DEDUP_LRU_SIZE")
+	near_dup_window: int = Field(default=200, alias="NEAR_DUP_WINDOW")  # recent media hashes kept per destination
+	near_dup_max_distance: int = Field(default=6, alias="NEAR_DUP_MAX_DISTANCE")  # dHash bits that may differ
+	near_dup_max_bytes: int = Field(default=20 * 1024 * 1024, alias="NEAR_DUP_MAX_BYTES")  # larger media is not hashed
+	media_hash_workers: int = Field(default=0, alias="MEDIA_HASH_WORKERS")  # hashing processes, 0 = CPU count
+	delivery_queue: str = Field(default="stream", alias="DELIVERY_QUEUE")  # stream (Redis Streams) / inline
+	delivery_max_attempts: int = Field(default=5, alias="DELIVERY_MAX_ATTEMPTS")  # then moved to the dead-letter stream
+	delivery_retry_delay: float = Field(default=1.0, alias="DELIVERY_RETRY_DELAY")  # seconds before the first retry, doubling after
+	delivery_max_inflight: int = Field(default=1000, alias="DELIVERY_MAX_INFLIGHT")  # unacked jobs per runner
+	delivery_stream_maxlen: int = Field(default=100000, alias="DELIVERY_STREAM_MAXLEN")
+	delivery_claim_idle_ms: int = Field(default=60000, alias="DELIVERY_CLAIM_IDLE_MS")  # reclaim jobs of dead consumers after
+
+	# Bot API HTTP pool shared by all aiogram bots in a process
+	# max open connections; a polling bot holds one through each getUpdates, so keep it above the bot count
+	tg_http_pool_limit: int = Field(default=1000, alias="TG_HTTP_POOL_LIMIT")
+	tg_http_keepalive: float = Field(default=30.0, alias="TG_HTTP_KEEPALIVE")  # seconds an idle connection is kept
+	tg_http_dns_ttl: int = Field(default=300, alias="TG_HTTP_DNS_TTL")
+	# Bot API server base URL, e.g. a local telegram-bot-api or app.bench.fake_bot_api; empty = api.telegram.org
+	tg_api_base: str = Field(default="", alias="TG_API_BASE")
+
+	owner_cache_ttl: int = Field(default=600, alias="OWNER_CACHE_TTL")  # seconds a bot's owner stays cached
+	listing_cache_enabled: bool = Field(default=True, alias="LISTING_CACHE_ENABLED")  # menu listings (bots, tasks, rules, sessions) in Redis
+	listing_cache_ttl: int = Field(default=600, alias="LISTING_CACHE_TTL")
+	# made-bot conversation states in Redis (seconds since the last change, 0 = no expiry)
+	fsm_state_ttl: int = Field(default=86400, alias="FSM_STATE_TTL")
+	fsm_data_ttl: int = Field(default=86400, alias="FSM_DATA_TTL")
+	decrypt_cache_size: int = Field(default=10000, alias="DECRYPT_CACHE_SIZE")  # decrypted tokens/sessions kept in memory, 0 disables
+	key_rotation_batch: int = Field(default=500, alias="KEY_ROTATION_BATCH")  # rows per write in python -m app.rotate_keys
+
+	# Runner supervision
+	runner_start_concurrency: int = Field(default=20, alias="RUNNER_START_CONCURRENCY")  # runners connecting at once on boot
+	runner_start_jitter_ms: int = Field(default=2000, alias="RUNNER_START_JITTER_MS")  # random delay before each boot start
+	runner_start_timeout: float = Field(default=30.0, alias="RUNNER_START_TIMEOUT")  # seconds a boot start may hold its slot
+	runner_stop_timeout: float = Field(default=30.0, alias="RUNNER_STOP_TIMEOUT")  # seconds to wait for a stopped runner to shut down
+	runner_restart_min_delay: float = Field(default=1.0, alias="RUNNER_RESTART_MIN_DELAY")  # backoff after a crash, doubled
+	runner_restart_max_delay: float = Field(default=300.0, alias="RUNNER_RESTART_MAX_DELAY")
+
+	# Webhook ingress for made bots (polling per bot when off)
+	webhook_enabled: bool = Field(default=False, alias="WEBHOOK_ENABLED")
+	webhook_base_url: str = Field(default="", alias="WEBHOOK_BASE_URL")  # public https URL Telegram posts to, per worker when sharded
+	webhook_path: str = Field(default="/tg", alias="WEBHOOK_PATH")
+	webhook_host: str = Field(default="0.0.0.0", alias="WEBHOOK_HOST")
+	webhook_port: int = Field(default=8080, alias="WEBHOOK_PORT")
+	webhook_secret: str = Field(default="", alias="WEBHOOK_SECRET")  # per-bot paths/tokens are derived from it, APP_ENCRYPTION_KEY if empty
+	webhook_max_connections: int = Field(default=40, alias="WEBHOOK_MAX_CONNECTIONS")  # Telegram's concurrent pushes per bot
+	webhook_max_body: int = Field(default=1024 * 1024, alias="WEBHOOK_MAX_BODY")
+
+	# Sharding runners across worker processes (python -m app.worker)
+	sharding_enabled: bool = Field(default=False, alias="SHARDING_ENABLED")
+	shard_lease_ttl: float = Field(default=30.0, alias="SHARD_LEASE_TTL")  # seconds before a dead worker's runners move
+	shard_rebalance_interval: float = Field(default=15.0, alias="SHARD_REBALANCE_INTERVAL")  # full resync period
+
+	# Per-update stage profiling, switched on per bot with /profile in the builder bot
+	profile_sample_rate: float = Field(default=0.1, alias="PROFILE_SAMPLE_RATE")  # fraction of updates traced when on
+	profile_slow_ms: float = Field(default=1000.0, alias="PROFILE_SLOW_MS")  # traced updates slower than this are logged in full
+	profile_cprofile: bool = Field(default=False, alias="PROFILE_CPROFILE")  # also dump a cProfile of slow updates
+	profile_dir: str = Field(default="profiles", alias="PROFILE_DIR")
+	profile_max_seconds: int = Field(default=3600, alias="PROFILE_MAX_SECONDS")  # profiling switches itself off after this
+
+	# Prometheus /metrics (one port per process: give sharded workers on one host their own METRICS_PORT)
+	metrics_enabled: bool = Field(default=False, alias="METRICS_ENABLED")
+	metrics_host: str = Field(default="127.0.0.1", alias="METRICS_HOST")
+	metrics_port: int = Field(default=9100, alias="METRICS_PORT")
+
 	class Config:
 		env_file = ".env"
 		env_file_encoding = "utf-8"
@@ -0,0 +1,67 @@
+# Checks that the hot-path queries are served by the indexes added in the migrations:
+#   python -m app.db.explain      (against DATABASE_URL, read-only, exits 1 on a mismatch)
+#   python -m pytest tests         (the same checks as a test, skipped when Postgres isn't reachable)
+# Planner toggles are set for the check only, so the result doesn't depend on how many rows the
+# tables hold: an expected index that is missing or unusable for the query makes the check fail.
+import asyncio
+import json
+import sys
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from app.bots.runner.routing import RoutingIndex
+from app.db.base import engine
+from app.services.task_service import rules_by_keyword_query, rules_by_media_type_query, tasks_by_config_query
+
+CHECKS = [
+	("bot routing rules", RoutingIndex("bot", 1)._query(), {"ix_tasks_bot_active", "ix_rules_task_source"}),
+	("userbot routing rules", RoutingIndex("session", 1)._query(), {"ix_tasks_session_active", "ix_rules_task_source"}),
+	("rules by keyword", rules_by_keyword_query("example"), {"ix_rules_filters"}),
+	("rules by media type", rules_by_media_type_query("photo"), {"ix_rules_media_mask"}),
+	("tasks by config", tasks_by_config_query({"mode": "copy"}), {"ix_tasks_config"}),
+]
+
+class _Explain(Executable, ClauseElement):
+	# EXPLAIN around a select, keeping its typed bind parameters (JSONB has no literal rendering)
+	inherit_cache = False
+
+	def __init__(self, stmt) -> None:
+		self.stmt = stmt
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+	return "EXPLAIN (FORMAT JSON) " + compiler.process(element.stmt, **kw)
+
+def _indexes(plan: dict) -> set[str]:
+	found = {plan["Index Name"]} if "Index Name" in plan else set()
+	for child in plan.get("Plans", ()):
+		found |= _indexes(child)
+	return found
+
+async def check(conn) -> list[tuple[str, set[str], set[str]]]:
+	# (check, expected indexes, indexes the plan uses) for every CHECK; shared with tests/test_explain.py
+	results = []
+	async with conn.begin() as tx:
+		for setting in ("enable_seqscan", "enable_hashjoin", "enable_mergejoin"):
+			await conn.execute(text(f"SET LOCAL {setting} = off"))
+		for name, stmt, expected in CHECKS:
+			res = await conn.execute(_Explain(stmt))
+			raw = res.scalar_one()
+			plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+			results.append((name, expected, _indexes(plan)))
+		await tx.rollback()
+	return results
+
+async def main() -> int:
+	failed = 0
+	async with engine.connect() as conn:
+		for name, expected, used in await check(conn):
+			missing = expected - used
+			status = "ok" if not missing else f"MISSING {', '.join(sorted(missing))}"
+			print(f"{name:<24} {status:<40} uses: {', '.join(sorted(used)) or '-'}")
+			failed += bool(missing)
+	await engine.dispose()
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(asyncio.run(main()))
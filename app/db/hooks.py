@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.utils.logger import logger
+
+_KEY = "after_commit_callbacks"
+# the loop only keeps weak references to tasks; without these a running batch could be collected
+_tasks: set[asyncio.Task] = set()
+
+def on_commit(session: AsyncSession | Session, callback: Callable[[], Awaitable[None]]) -> None:
+	# callbacks run only once the surrounding transaction is committed, so listeners never see uncommitted state
+	sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+	sync_session.info.setdefault(_KEY, []).append(callback)
+
+async def _run_callbacks(callbacks: list[Callable[[], Awaitable[None]]]) -> None:
+	for callback in callbacks:
+		try:
+			await callback()
+		except Exception:
+			logger.exception("after-commit callback failed")
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+	callbacks = session.info.pop(_KEY, None)
+	if not callbacks:
+		return
+	try:
+		loop = asyncio.get_running_loop()
+	except RuntimeError:
+		return
+	task = loop.create_task(_run_callbacks(callbacks))
+	_tasks.add(task)
+	task.add_done_callback(_tasks.discard)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session: Session, previous_transaction) -> None:
+	session.info.pop(_KEY, None)
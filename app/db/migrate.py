@@ -1,12 +1,58 @@
 import asyncio
-from app.db.base import engine, Base
-from app.db import models  # noqa: F401
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from app.db.base import engine
 from app.utils.logger import logger
 
+# serializes upgrades when several app.main instances boot at once
+_LOCK_ID = 74_676_901
+
+def _config(connection=None) -> Config:
+	cfg = Config()
+	cfg.set_main_option("script_location", str(Path(__file__).parent / "migrations"))
+	cfg.attributes["connection"] = connection
+	return cfg
+
+def _current(conn) -> set[str]:
+	heads = set(MigrationContext.configure(conn).get_current_heads())
+	conn.commit()
+	return heads
+
+def _upgrade(conn, heads: set[str]) -> None:
+	conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _LOCK_ID})
+	conn.commit()
+	try:
+		current = _current(conn)
+		if current == heads:
+			return
+		cfg = _config(conn)
+		if not current:
+			legacy = inspect(conn).has_table("users")
+			conn.commit()
+			if legacy:
+				# tables built by the old create_all start from the initial revision
+				logger.info("Database has no migration history, stamping it as 0001")
+				command.stamp(cfg, "0001")
+		# revisions leave the transaction for CREATE INDEX CONCURRENTLY, so none may be open here
+		command.upgrade(cfg, "head")
+	finally:
+		conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _LOCK_ID})
+		conn.commit()
+
 async def run():
-	async with engine.begin() as conn:
-		await conn.run_sync(Base.metadata.create_all)
-	logger.info("Database tables ensured (create_all). Consider using Alembic for production migrations.")
+	heads = set(ScriptDirectory.from_config(_config()).get_heads())
+	async with engine.connect() as conn:
+		current = await conn.run_sync(_current)
+		if current == heads:
+			logger.info(f"Database schema is current ({', '.join(sorted(heads))}), no migrations to run")
+			return
+		logger.info(f"Migrating database {', '.join(sorted(current)) or 'empty'} -> {', '.join(sorted(heads))}")
+		await conn.run_sync(_upgrade, heads)
+	logger.info("Database migrations applied")
 
 if __name__ == "__main__":
-	asyncio.run(run())
\ No newline at end of file
+	asyncio.run(run())
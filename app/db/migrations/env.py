@@ -0,0 +1,31 @@
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from app.db.base import Base, engine
+from app.db import models  # noqa: F401
+
+config = context.config
+if config.config_file_name is not None:
+	fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+def _run(connection) -> None:
+	# one transaction per revision, so a revision can leave it for CREATE INDEX CONCURRENTLY
+	context.configure(connection=connection, target_metadata=Base.metadata, transaction_per_migration=True)
+	with context.begin_transaction():
+		context.run_migrations()
+
+async def _run_async() -> None:
+	async with engine.connect() as conn:
+		await conn.run_sync(_run)
+
+# app.db.migrate hands over its own connection; the alembic CLI gets one here
+connection = config.attributes.get("connection")
+if context.is_offline_mode():
+	# alembic upgrade head --sql
+	context.configure(url=engine.url, target_metadata=Base.metadata, literal_binds=True, transaction_per_migration=True)
+	with context.begin_transaction():
+		context.run_migrations()
+elif connection is not None:
+	_run(connection)
+else:
+	asyncio.run(_run_async())
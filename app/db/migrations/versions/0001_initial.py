@@ -0,0 +1,87 @@
+"""initial schema (what create_all used to build)"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _timestamps() -> list[sa.Column]:
+	return [
+		sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+		sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+	]
+
+def upgrade() -> None:
+	op.create_table(
+		"users",
+		sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+		sa.Column("telegram_user_id", sa.BigInteger(), nullable=False),
+		sa.Column("language_code", sa.String(8)),
+		sa.Column("timezone", sa.String(64)),
+		sa.Column("is_active", sa.Boolean(), nullable=False),
+		*_timestamps(),
+	)
+	op.create_index("ix_users_telegram_user_id", "users", ["telegram_user_id"], unique=True)
+
+	op.create_table(
+		"bots",
+		sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+		sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+		sa.Column("name", sa.String(128), nullable=False),
+		sa.Column("username", sa.String(64)),
+		sa.Column("description", sa.String(512)),
+		sa.Column("token_encrypted", sa.Text()),
+		sa.Column("is_active", sa.Boolean(), nullable=False),
+		*_timestamps(),
+	)
+	op.create_index("ix_bots_owner_id", "bots", ["owner_id"])
+	op.create_index("ix_bots_username", "bots", ["username"])
+	op.create_index("ix_bots_owner_active", "bots", ["owner_id", "is_active"])
+
+	op.create_table(
+		"user_sessions",
+		sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+		sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+		sa.Column("session_type", sa.String(32), nullable=False),
+		sa.Column("session_encrypted", sa.Text(), nullable=False),
+		sa.Column("label", sa.String(128)),
+		*_timestamps(),
+	)
+	op.create_index("ix_user_sessions_owner_id", "user_sessions", ["owner_id"])
+	op.create_index("ix_user_sessions_owner", "user_sessions", ["owner_id"])
+
+	op.create_table(
+		"tasks",
+		sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+		sa.Column("bot_id", sa.Integer(), sa.ForeignKey("bots.id", ondelete="CASCADE"), nullable=False),
+		sa.Column("name", sa.String(128), nullable=False),
+		sa.Column("task_type", sa.String(16), nullable=False),
+		sa.Column("user_session_id", sa.Integer(), sa.ForeignKey("user_sessions.id", ondelete="SET NULL")),
+		sa.Column("is_active", sa.Boolean(), nullable=False),
+		sa.Column("config", sa.JSON(), nullable=False),
+		*_timestamps(),
+	)
+	op.create_index("ix_tasks_bot_id", "tasks", ["bot_id"])
+	op.create_index("ix_tasks_bot_active", "tasks", ["bot_id", "is_active"])
+	op.create_index("ix_tasks_user_session_id", "tasks", ["user_session_id"])
+
+	op.create_table(
+		"task_routing_rules",
+		sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+		sa.Column("task_id", sa.Integer(), sa.ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False),
+		sa.Column("source_chat_id", sa.BigInteger(), nullable=False),
+		sa.Column("destination_chat_id", sa.BigInteger(), nullable=False),
+		sa.Column("forward_mode", sa.String(32), nullable=False),
+		sa.Column("filters", sa.JSON(), nullable=False),
+		*_timestamps(),
+	)
+	op.create_index("ix_task_routing_rules_source_chat_id", "task_routing_rules", ["source_chat_id"])
+	op.create_index("ix_rules_task", "task_routing_rules", ["task_id"])
+	op.create_index("ix_task_routing_rules_task_id", "task_routing_rules", ["task_id"])
+	op.create_index("ix_task_routing_rules_destination_chat_id", "task_routing_rules", ["destination_chat_id"])
+
+def downgrade() -> None:
+	for table in ("task_routing_rules", "tasks", "user_sessions", "bots", "users"):
+		op.drop_table(table)
@@ -0,0 +1,46 @@
+"""routing indexes: rules by (task_id, source_chat_id), active tasks by session"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# CONCURRENTLY keeps the tables writable while the indexes build, but can't run in a transaction.
+# A build that failed half way leaves an INVALID index behind, which IF NOT EXISTS would then keep.
+
+def _drop_if_invalid(name: str) -> None:
+	if context.is_offline_mode():
+		return
+	invalid = op.get_bind().execute(
+		sa.text("SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name AND NOT i.indisvalid"),
+		{"name": name},
+	).first()
+	if invalid:
+		op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+def upgrade() -> None:
+	with op.get_context().autocommit_block():
+		_drop_if_invalid("ix_rules_task_source")
+		_drop_if_invalid("ix_tasks_session_active")
+		# RoutingIndex: rules joined to a runner's tasks, then grouped by source chat
+		op.create_index(
+			"ix_rules_task_source", "task_routing_rules", ["task_id", "source_chat_id"],
+			postgresql_concurrently=True, if_not_exists=True,
+		)
+		# userbot RoutingIndex and the runner manager's "sessions with an active task" query
+		op.create_index(
+			"ix_tasks_session_active", "tasks", ["user_session_id"],
+			postgresql_where=sa.text("is_active"), postgresql_concurrently=True, if_not_exists=True,
+		)
+		# both covered by ix_rules_task_source
+		op.drop_index("ix_rules_task", "task_routing_rules", postgresql_concurrently=True, if_exists=True)
+		op.drop_index("ix_task_routing_rules_task_id", "task_routing_rules", postgresql_concurrently=True, if_exists=True)
+
+def downgrade() -> None:
+	with op.get_context().autocommit_block():
+		op.create_index("ix_task_routing_rules_task_id", "task_routing_rules", ["task_id"], postgresql_concurrently=True, if_not_exists=True)
+		op.create_index("ix_rules_task", "task_routing_rules", ["task_id"], postgresql_concurrently=True, if_not_exists=True)
+		op.drop_index("ix_tasks_session_active", "tasks", postgresql_concurrently=True, if_exists=True)
+		op.drop_index("ix_rules_task_source", "task_routing_rules", postgresql_concurrently=True, if_exists=True)
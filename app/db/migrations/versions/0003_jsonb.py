@@ -0,0 +1,74 @@
+"""JSONB for task config and rule filters, GIN indexes, promoted rule columns"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# app/bots/runner/filters.py MEDIA_TYPES as of this revision
+_MEDIA_BITS = {
+	"text": 1 << 0, "photo": 1 << 1, "video": 1 << 2, "document": 1 << 3, "audio": 1 << 4, "voice": 1 << 5,
+	"animation": 1 << 6, "sticker": 1 << 7, "video_note": 1 << 8, "poll": 1 << 9, "other": 1 << 10,
+}
+
+def _drop_if_invalid(name: str) -> None:
+	if context.is_offline_mode():
+		return
+	invalid = op.get_bind().execute(
+		sa.text("SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name AND NOT i.indisvalid"),
+		{"name": name},
+	).first()
+	if invalid:
+		op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+def upgrade() -> None:
+	# the type change rewrites both tables under an exclusive lock; they hold one row per task/rule,
+	# so this is seconds even for large installs
+	op.alter_column("tasks", "config", type_=postgresql.JSONB(), postgresql_using="config::jsonb")
+	op.alter_column("task_routing_rules", "filters", type_=postgresql.JSONB(), postgresql_using="filters::jsonb")
+	op.add_column("task_routing_rules", sa.Column("media_mask", sa.Integer(), server_default="0", nullable=False))
+	op.add_column("task_routing_rules", sa.Column("skip_near_duplicates", sa.Boolean(), server_default="false", nullable=False))
+	bits = " ".join(f"WHEN '{name}' THEN {bit}" for name, bit in _MEDIA_BITS.items())
+	# media_types is a list, or a single name (see filters._as_list)
+	op.execute(f"""
+		UPDATE task_routing_rules SET
+			media_mask = CASE jsonb_typeof(filters->'media_types')
+				WHEN 'array' THEN (
+					SELECT coalesce(bit_or(CASE lower(t) {bits} ELSE 0 END), 0)
+					FROM jsonb_array_elements_text(filters->'media_types') AS t
+				)
+				WHEN 'string' THEN CASE lower(filters->>'media_types') {bits} ELSE 0 END
+				ELSE 0 END,
+			skip_near_duplicates = coalesce(filters->>'skip_near_duplicates' IN ('true', '1'), false)
+		WHERE filters ? 'media_types' OR filters ? 'skip_near_duplicates'
+	""")
+	with op.get_context().autocommit_block():
+		for name in ("ix_rules_filters", "ix_tasks_config", "ix_rules_media_mask"):
+			_drop_if_invalid(name)
+		# jsonb_path_ops: smaller and faster than the default opclass, serves @> containment
+		op.create_index(
+			"ix_rules_filters", "task_routing_rules", ["filters"],
+			postgresql_using="gin", postgresql_ops={"filters": "jsonb_path_ops"}, postgresql_concurrently=True, if_not_exists=True,
+		)
+		op.create_index(
+			"ix_tasks_config", "tasks", ["config"],
+			postgresql_using="gin", postgresql_ops={"config": "jsonb_path_ops"}, postgresql_concurrently=True, if_not_exists=True,
+		)
+		# only media-restricted rules, which is what rules_by_media_type_query scans
+		op.create_index(
+			"ix_rules_media_mask", "task_routing_rules", ["media_mask"],
+			postgresql_where=sa.text("media_mask <> 0"), postgresql_concurrently=True, if_not_exists=True,
+		)
+
+def downgrade() -> None:
+	with op.get_context().autocommit_block():
+		op.drop_index("ix_rules_media_mask", "task_routing_rules", postgresql_concurrently=True, if_exists=True)
+		op.drop_index("ix_tasks_config", "tasks", postgresql_concurrently=True, if_exists=True)
+		op.drop_index("ix_rules_filters", "task_routing_rules", postgresql_concurrently=True, if_exists=True)
+	op.drop_column("task_routing_rules", "skip_near_duplicates")
+	op.drop_column("task_routing_rules", "media_mask")
+	op.alter_column("task_routing_rules", "filters", type_=sa.JSON(), postgresql_using="filters::json")
+	op.alter_column("tasks", "config", type_=sa.JSON(), postgresql_using="config::json")
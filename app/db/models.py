@@ -1,7 +1,8 @@
 from __future__ import annotations
-from sqlalchemy import String, Integer, BigInteger, Boolean, ForeignKey, Text, UniqueConstraint, Index, JSON
+from sqlalchemy import String, Integer, BigInteger, Boolean, ForeignKey, Text, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.types import DateTime
 from app.db.base import Base
 
@@ -54,24 +55,31 @@ class Task(Base):
 	task_type: Mapped[str] = mapped_column(String(16))  # "bot" | "userbot"
 	user_session_id: Mapped[int | None] = mapped_column(ForeignKey("user_sessions.id", ondelete="SET NULL"), index=True)
 	is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-	config: Mapped[dict] = mapped_column(JSON, default=dict)
+	config: Mapped[dict] = mapped_column(JSONB, default=dict)
 	created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
 	updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 	bot: Mapped[Bot] = relationship(back_populates="tasks")
 	__table_args__ = (
 		Index("ix_tasks_bot_active", "bot_id", "is_active"),
+		Index("ix_tasks_session_active", "user_session_id", postgresql_where=text("is_active")),
+		Index("ix_tasks_config", "config", postgresql_using="gin", postgresql_ops={"config": "jsonb_path_ops"}),
 	)
 
 class TaskRoutingRule(Base):
 	__tablename__ = "task_routing_rules"
 	id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-	task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), index=True)
+	task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"))
 	source_chat_id: Mapped[int] = mapped_column(BigInteger, index=True)
 	destination_chat_id: Mapped[int] = mapped_column(BigInteger, index=True)
 	forward_mode: Mapped[str] = mapped_column(String(32), default="copy")  # copy/forward/quote
-	filters: Mapped[dict] = mapped_column(JSON, default=dict)  # future: keywords, media types, users
+	filters: Mapped[dict] = mapped_column(JSONB, default=dict)  # see app/bots/runner/filters.py
+	# promoted from filters by task_service so hot paths and operator queries don't dig into the JSON
+	media_mask: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)  # filters.media_types as filters.MEDIA_TYPES bits
+	skip_near_duplicates: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
 	created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
 	updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 	__table_args__ = (
-		Index("ix_rules_task", "task_id"),
+		Index("ix_rules_task_source", "task_id", "source_chat_id"),
+		Index("ix_rules_filters", "filters", postgresql_using="gin", postgresql_ops={"filters": "jsonb_path_ops"}),
+		Index("ix_rules_media_mask", "media_mask", postgresql_where=text("media_mask <> 0")),
 	)
\ No newline at end of file
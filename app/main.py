@@ -1,11 +1,25 @@
 import asyncio
 from app.db.migrate import run as migrate_run
 from app.bots.builder.bot import run_builder_bot
-from app.utils.logger import logger
+from app.bots.http import close_bot_session
+from app.bots.runner.manager import runner_manager
+from app.utils.logger import logger, throttled
+from app.utils.metrics import start_metrics_server, stop_metrics_server
 
 async def main():
 	await migrate_run()
-	await run_builder_bot()
+	await start_metrics_server()
+	# customer bots come back in the background; the builder bot doesn't wait for them
+	resume = asyncio.create_task(runner_manager.resume_all(), name="resume-runners")
+	try:
+		await run_builder_bot()
+	finally:
+		resume.cancel()
+		await runner_manager.close()
+		await close_bot_session()
+		await stop_metrics_server()
+		# summaries of errors collapsed in the last window
+		throttled.flush(force=True)
 
 if __name__ == "__main__":
 	try:
@@ -0,0 +1,74 @@
+import asyncio
+import sys
+import time
+from cryptography.fernet import InvalidToken
+from sqlalchemy import and_, bindparam, select, update
+from app.db.base import AsyncSessionFactory
+from app.db.models import Bot, UserSession
+from app.config import settings
+from app.utils.crypto import rotate_text
+from app.utils.logger import logger
+
+# Re-encrypts every stored secret under the first APP_ENCRYPTION_KEY. Rotation:
+#   1. put the new key in front (APP_ENCRYPTION_KEY=new,old) and restart app.main / app.worker
+#   2. python -m app.rotate_keys   (safe while bots run, and to re-run)
+#   3. drop the old key from APP_ENCRYPTION_KEY and restart again
+# Rows are streamed through a server-side cursor on one connection and written back in batches on
+# another, so memory stays flat however many rows there are. A row whose ciphertext changed since it
+# was read (token replaced meanwhile) is left alone; its new value is already under the new key.
+# A row none of the keys decrypts is logged and skipped, and the run exits non-zero: those rows are
+# unreadable already, but don't drop the old key before they are looked at.
+# This stays a manual CLI run once per rotation, not something the app does on its own.
+
+def _rotate_batch(name: str, rows: list) -> tuple[list[dict], int]:
+	out = []
+	failed = 0
+	for row_id, old in rows:
+		try:
+			new = rotate_text(old)
+		except InvalidToken:
+			logger.error(f"Key rotation {name}: row id={row_id} can't be decrypted with any key, skipped")
+			failed += 1
+			continue
+		if new is not None:
+			out.append({"b_id": row_id, "b_old": old, "b_new": new})
+	return out, failed
+
+async def rotate_column(model, column) -> tuple[int, int, int]:
+	batch = settings.key_rotation_batch
+	table = model.__table__
+	stmt = (
+		update(table)
+		.where(and_(table.c.id == bindparam("b_id"), table.c[column.key] == bindparam("b_old")))
+		.values({column.key: bindparam("b_new")})
+	)
+	name = f"{table.name}.{column.key}"
+	seen = rotated = failed = 0
+	async with AsyncSessionFactory() as reader, AsyncSessionFactory() as writer:
+		result = await reader.stream(
+			select(model.id, column).where(column.is_not(None)).order_by(model.id).execution_options(yield_per=batch)
+		)
+		async for rows in result.partitions():
+			seen += len(rows)
+			# Fernet is CPU-bound; keep the loop free for the reader
+			params, undecryptable = await asyncio.to_thread(_rotate_batch, name, [tuple(r) for r in rows])
+			failed += undecryptable
+			if params:
+				res = await writer.execute(stmt, params)
+				await writer.commit()
+				rotated += res.rowcount if res.rowcount is not None and res.rowcount >= 0 else len(params)
+			logger.info(f"Key rotation {name}: {seen} read, {rotated} re-encrypted, {failed} failed")
+	return seen, rotated, failed
+
+async def main() -> int:
+	started = time.perf_counter()
+	total_failed = 0
+	for model, column in ((Bot, Bot.token_encrypted), (UserSession, UserSession.session_encrypted)):
+		seen, rotated, failed = await rotate_column(model, column)
+		total_failed += failed
+		logger.info(f"Key rotation done for {model.__tablename__}: {rotated}/{seen} rows re-encrypted, {failed} failed")
+	logger.info(f"Key rotation finished in {time.perf_counter() - started:.1f}s")
+	return 1 if total_failed else 0
+
+if __name__ == "__main__":
+	sys.exit(asyncio.run(main()))
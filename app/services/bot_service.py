@@ -1,34 +1,40 @@
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.models import Bot, User
-from app.utils.crypto import encrypt_text
+from app.db.models import Bot, Task, User
+from app.utils.crypto import decrypt_text, encrypt_text
 from aiogram import Bot as AioBot
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from app.bots.http import get_bot_session
 from app.bots.runner.manager import runner_manager
+from app.bots.webhook import delete_webhook
+from app.cache import listings
+from app.cache.events import publish_routing_changed
+from app.cache.listings import BotRow
+from app.cache.owners import owner_cache
+from app.config import settings
+from app.db.hooks import on_commit
 
 async def create_bot(session: AsyncSession, owner: User, name: str, token: str, description: str | None = None) -> Bot:
 	encrypted = encrypt_text(token)
 	bot = Bot(owner_id=owner.id, name=name, token_encrypted=encrypted, description=description)
-	# get username via getMe
-	try:
-		aio = AioBot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-		me = await aio.get_me()
-		bot.username = me.username
-	finally:
-		try:
-			await aio.session.close()
-		except Exception:
-			pass
+	# get username via getMe, over the shared pool so there is nothing to tear down
+	aio = AioBot(token=token, session=get_bot_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+	me = await aio.get_me()
+	bot.username = me.username
 	session.add(bot)
 	await session.flush()
-	# start runner
-	await runner_manager.ensure_bot_running(bot.id)
+	# start runner once the row is committed, the runner loads it in its own session
+	bot_id = bot.id
+	on_commit(session, lambda: runner_manager.ensure_bot_running(bot_id))
+	listings.bump(session, f"bots:{owner.id}")
 	return bot
 
-async def list_bots(session: AsyncSession, owner: User) -> list[Bot]:
-	res = await session.execute(select(Bot).where(Bot.owner_id == owner.id).order_by(Bot.id.desc()))
-	return list(res.scalars().all())
+async def list_bots(session: AsyncSession, owner: User) -> list[BotRow]:
+	async def load():
+		res = await session.execute(select(Bot).where(Bot.owner_id == owner.id).order_by(Bot.id.desc()))
+		return res.scalars().all()
+	return await listings.cached("bots", f"bots:{owner.id}", "", BotRow, load)
 
 async def toggle_bot_active(session: AsyncSession, owner: User, bot_id: int, active: bool) -> Bot | None:
 	res = await session.execute(select(Bot).where(Bot.id == bot_id, Bot.owner_id == owner.id))
@@ -37,10 +43,12 @@ async def toggle_bot_active(session: AsyncSession, owner: User, bot_id: int, act
 		return None
 	bot.is_active = active
 	await session.flush()
+	bot_id = bot.id
 	if active:
-		await runner_manager.ensure_bot_running(bot.id)
+		on_commit(session, lambda: runner_manager.ensure_bot_running(bot_id))
 	else:
-		await runner_manager.stop_bot(bot.id)
+		on_commit(session, lambda: runner_manager.stop_bot(bot_id))
+	listings.bump(session, f"bots:{owner.id}")
 	return bot
 
 async def delete_bot(session: AsyncSession, owner: User, bot_id: int) -> bool:
@@ -48,7 +56,23 @@ async def delete_bot(session: AsyncSession, owner: User, bot_id: int) -> bool:
 	bot = res.scalar_one_or_none()
 	if bot is None:
 		return False
+	# the bot's userbot tasks go with it (cascade); the sessions running them must drop their routes
+	res = await session.execute(
+		select(Task.user_session_id).where(Task.bot_id == bot_id, Task.user_session_id.is_not(None)).distinct()
+	)
+	session_ids = res.scalars().all()
+	# the row (and token) is gone once the runner stops, so the webhook is removed from here
+	token = decrypt_text(bot.token_encrypted) if settings.webhook_enabled and bot.token_encrypted else None
 	await session.delete(bot)
 	await session.flush()
-	await runner_manager.stop_bot(bot_id)
+	on_commit(session, lambda: runner_manager.stop_bot(bot_id))
+	if token:
+		on_commit(session, lambda: delete_webhook(token))
+	async def _publish():
+		for session_id in session_ids:
+			await publish_routing_changed(user_session_id=session_id)
+	if session_ids:
+		on_commit(session, _publish)
+	on_commit(session, lambda: owner_cache.invalidate(bot_id))
+	listings.bump(session, f"bots:{owner.id}")
 	return True
\ No newline at end of file
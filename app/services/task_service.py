@@ -1,16 +1,36 @@
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, literal_column
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.bots.runner.filters import MEDIA_TYPES, media_mask
 from app.db.models import Task, TaskRoutingRule, Bot
+from app.db.hooks import on_commit
+from app.cache import listings
+from app.cache.events import publish_routing_changed
+from app.cache.listings import RuleRow, TaskRow
+
+def _notify_routing(session: AsyncSession, bot_id: int | None, *user_session_ids: int | None) -> None:
+	# runners rebuild their in-memory routing index once the change is committed
+	async def _publish():
+		await publish_routing_changed(bot_id=bot_id)
+		for sid in {s for s in user_session_ids if s is not None}:
+			await publish_routing_changed(user_session_id=sid)
+	on_commit(session, _publish)
 
 async def create_task(session: AsyncSession, bot: Bot, name: str, task_type: str, config: dict | None = None, user_session_id: int | None = None) -> Task:
 	task = Task(bot_id=bot.id, name=name, task_type=task_type, config=config or {}, user_session_id=user_session_id)
 	session.add(task)
 	await session.flush()
+	_notify_routing(session, task.bot_id, task.user_session_id)
+	listings.bump(session, f"tasks:{task.bot_id}")
 	return task
 
-async def list_tasks(session: AsyncSession, bot: Bot) -> list[Task]:
-	res = await session.execute(select(Task).where(Task.bot_id == bot.id).order_by(Task.id.desc()))
-	return list(res.scalars().all())
+async def list_tasks(session: AsyncSession, bot: Bot) -> list[TaskRow]:
+	return await list_bot_tasks(session, bot.id)
+
+async def list_bot_tasks(session: AsyncSession, bot_id: int) -> list[TaskRow]:
+	async def load():
+		res = await session.execute(select(Task).where(Task.bot_id == bot_id).order_by(Task.id.desc()))
+		return res.scalars().all()
+	return await listings.cached("tasks", f"tasks:{bot_id}", "", TaskRow, load)
 
 async def toggle_task(session: AsyncSession, task_id: int, active: bool) -> Task | None:
 	res = await session.execute(select(Task).where(Task.id == task_id))
@@ -19,6 +39,8 @@ async def toggle_task(session: AsyncSession, task_id: int, active: bool) -> Task
 		return None
 	task.is_active = active
 	await session.flush()
+	_notify_routing(session, task.bot_id, task.user_session_id)
+	listings.bump(session, f"tasks:{task.bot_id}")
 	return task
 
 async def update_task(session: AsyncSession, task_id: int, name: str | None = None, task_type: str | None = None, config: dict | None = None, user_session_id: int | None = None) -> Task | None:
@@ -26,6 +48,7 @@ async def update_task(session: AsyncSession, task_id: int, name: str | None = No
 	task = res.scalar_one_or_none()
 	if task is None:
 		return None
+	previous_session_id = task.user_session_id
 	if name is not None:
 		task.name = name
 	if task_type is not None:
@@ -35,6 +58,9 @@ async def update_task(session: AsyncSession, task_id: int, name: str | None = No
 	if user_session_id is not None:
 		task.user_session_id = user_session_id
 	await session.flush()
+	if task_type is not None or config is not None or user_session_id is not None:
+		_notify_routing(session, task.bot_id, previous_session_id, task.user_session_id)
+	listings.bump(session, f"tasks:{task.bot_id}")
 	return task
 
 async def delete_task(session: AsyncSession, task_id: int) -> bool:
@@ -44,23 +70,68 @@ async def delete_task(session: AsyncSession, task_id: int) -> bool:
 		return False
 	await session.delete(task)
 	await session.flush()
+	_notify_routing(session, task.bot_id, task.user_session_id)
+	listings.bump(session, f"tasks:{task.bot_id}")
 	return True
 
 async def add_routing_rule(session: AsyncSession, task: Task, source_chat_id: int, destination_chat_id: int, forward_mode: str = "copy", filters: dict | None = None) -> TaskRoutingRule:
-	rule = TaskRoutingRule(task_id=task.id, source_chat_id=source_chat_id, destination_chat_id=destination_chat_id, forward_mode=forward_mode, filters=filters or {})
+	filters = filters or {}
+	rule = TaskRoutingRule(
+		task_id=task.id, source_chat_id=source_chat_id, destination_chat_id=destination_chat_id, forward_mode=forward_mode,
+		filters=filters, media_mask=media_mask(filters.get("media_types")), skip_near_duplicates=bool(filters.get("skip_near_duplicates")),
+	)
 	session.add(rule)
 	await session.flush()
+	_notify_routing(session, task.bot_id, task.user_session_id)
+	listings.bump(session, f"tasks:{task.bot_id}")
 	return rule
 
-async def list_routing_rules(session: AsyncSession, task: Task) -> list[TaskRoutingRule]:
-	res = await session.execute(select(TaskRoutingRule).where(TaskRoutingRule.task_id == task.id).order_by(TaskRoutingRule.id.desc()))
-	return list(res.scalars().all())
+async def list_routing_rules(session: AsyncSession, task: Task) -> list[RuleRow]:
+	# versioned with the bot's tasks: any task or rule change of the bot reloads both
+	async def load():
+		res = await session.execute(select(TaskRoutingRule).where(TaskRoutingRule.task_id == task.id).order_by(TaskRoutingRule.id.desc()))
+		return res.scalars().all()
+	return await listings.cached("rules", f"tasks:{task.bot_id}", f"rules:{task.id}", RuleRow, load)
 
 async def delete_routing_rule(session: AsyncSession, rule_id: int) -> bool:
 	res = await session.execute(select(TaskRoutingRule).where(TaskRoutingRule.id == rule_id))
 	rule = res.scalar_one_or_none()
 	if rule is None:
 		return False
+	task = await session.get(Task, rule.task_id)
 	await session.delete(rule)
 	await session.flush()
-	return True
\ No newline at end of file
+	if task is not None:
+		_notify_routing(session, task.bot_id, task.user_session_id)
+		listings.bump(session, f"tasks:{task.bot_id}")
+	return True
+
+# Operator queries across every bot (app.db.explain checks they stay on their indexes)
+def rules_by_keyword_query(keyword: str, exclude: bool = False):
+	# exact element of filters.keywords / exclude_keywords, via the ix_rules_filters GIN index
+	key = "exclude_keywords" if exclude else "keywords"
+	return select(TaskRoutingRule).where(TaskRoutingRule.filters.contains({key: [keyword]}))
+
+def rules_by_media_type_query(media_type: str):
+	# rules restricted to media_type; unrestricted rules (media_mask 0) accept everything and aren't listed
+	bit = MEDIA_TYPES.get(media_type.lower())
+	if bit is None:
+		raise ValueError(f"Unknown media type {media_type!r}, expected one of: {', '.join(MEDIA_TYPES)}")
+	# a literal 0, not a parameter, so the planner can match the partial index's predicate
+	return select(TaskRoutingRule).where(TaskRoutingRule.media_mask != literal_column("0"), TaskRoutingRule.media_mask.op("&")(bit) != 0)
+
+def tasks_by_config_query(config: dict):
+	# config is a sub-document, e.g. {"mode": "copy"}; via the ix_tasks_config GIN index
+	return select(Task).where(Task.config.contains(config))
+
+async def find_rules_by_keyword(session: AsyncSession, keyword: str, exclude: bool = False, limit: int = 1000) -> list[TaskRoutingRule]:
+	res = await session.execute(rules_by_keyword_query(keyword, exclude).order_by(TaskRoutingRule.id).limit(limit))
+	return list(res.scalars().all())
+
+async def find_rules_by_media_type(session: AsyncSession, media_type: str, limit: int = 1000) -> list[TaskRoutingRule]:
+	res = await session.execute(rules_by_media_type_query(media_type).order_by(TaskRoutingRule.id).limit(limit))
+	return list(res.scalars().all())
+
+async def find_tasks_by_config(session: AsyncSession, config: dict, limit: int = 1000) -> list[Task]:
+	res = await session.execute(tasks_by_config_query(config).order_by(Task.id).limit(limit))
+	return list(res.scalars().all())
@@ -1,7 +1,15 @@
+from dataclasses import dataclass
 from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import User
 
+@dataclass(frozen=True, slots=True)
+class UserRef:
+	# what handlers, services and the owner cache need from a User without loading it
+	id: int
+	telegram_user_id: int
+
 async def get_or_create_user(session: AsyncSession, telegram_user_id: int, language_code: str | None = None, timezone: str | None = None) -> User:
 	result = await session.execute(select(User).where(User.telegram_user_id == telegram_user_id))
 	user = result.scalar_one_or_none()
@@ -17,4 +25,18 @@ async def update_user_prefs(session: AsyncSession, user: User, language_code: st
 	if timezone is not None:
 		user.timezone = timezone
 	await session.flush()
-	return user
\ No newline at end of file
+	return user
+
+async def upsert_user(session: AsyncSession, telegram_user_id: int, language_code: str | None = None) -> tuple[UserRef, bool]:
+	# one round trip for new users and no check-then-insert race; returns (user, created)
+	stmt = (
+		insert(User)
+		.values(telegram_user_id=telegram_user_id, language_code=language_code, is_active=True)
+		.on_conflict_do_nothing(index_elements=[User.telegram_user_id])
+		.returning(User.id)
+	)
+	user_id = (await session.execute(stmt)).scalar_one_or_none()
+	if user_id is not None:
+		return UserRef(user_id, telegram_user_id), True
+	res = await session.execute(select(User.id).where(User.telegram_user_id == telegram_user_id))
+	return UserRef(res.scalar_one(), telegram_user_id), False
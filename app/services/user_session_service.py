@@ -1,6 +1,10 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import UserSession, User
+from app.cache import listings
+from app.cache.events import publish_routing_changed
+from app.cache.listings import SessionRow
+from app.db.hooks import on_commit
 from app.utils.crypto import encrypt_text, decrypt_text
 
 async def create_user_session_from_string(session: AsyncSession, owner: User, session_string: str, label: str | None = None) -> UserSession:
@@ -8,19 +12,28 @@ async def create_user_session_from_string(session: AsyncSession, owner: User, se
 	us = UserSession(owner_id=owner.id, session_type="telethon", session_encrypted=encrypted, label=label)
 	session.add(us)
 	await session.flush()
+	listings.bump(session, f"sessions:{owner.id}")
 	return us
 
-async def list_user_sessions(session: AsyncSession, owner: User) -> list[UserSession]:
-	res = await session.execute(select(UserSession).where(UserSession.owner_id == owner.id).order_by(UserSession.id.desc()))
-	return list(res.scalars().all())
+async def list_user_sessions(session: AsyncSession, owner: User) -> list[SessionRow]:
+	async def load():
+		res = await session.execute(select(UserSession).where(UserSession.owner_id == owner.id).order_by(UserSession.id.desc()))
+		return res.scalars().all()
+	return await listings.cached("sessions", f"sessions:{owner.id}", "", SessionRow, load)
 
 async def delete_user_session(session: AsyncSession, owner: User, session_id: int) -> bool:
 	res = await session.execute(select(UserSession).where(UserSession.id == session_id, UserSession.owner_id == owner.id))
 	us = res.scalar_one_or_none()
 	if us is None:
 		return False
+	# imported here: the manager imports the runners, whose panels import this module
+	from app.bots.runner.manager import runner_manager
 	await session.delete(us)
 	await session.flush()
+	# its tasks lose the session (user_session_id goes NULL); the runner must stop routing them
+	on_commit(session, lambda: publish_routing_changed(user_session_id=session_id))
+	on_commit(session, lambda: runner_manager.stop_userbot(session_id))
+	listings.bump(session, f"sessions:{owner.id}")
 	return True
 
 async def get_user_session(session: AsyncSession, owner: User, session_id: int) -> UserSession | None:
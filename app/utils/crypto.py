@@ -1,18 +1,54 @@
-from cryptography.fernet import Fernet, InvalidToken
+import threading
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from app.config import settings
 
-_cached: Fernet | None = None
+_cached: MultiFernet | None = None
+_primary: Fernet | None = None
 
-def get_fernet() -> Fernet:
-	global _cached
+# ciphertext -> plaintext. A Fernet token is only ever produced for one plaintext, so entries never go
+# stale; rotated rows simply get new ciphertexts and the old entries age out.
+_decrypted: OrderedDict[str, str] = OrderedDict()
+_decrypted_lock = threading.Lock()
+
+def _keys() -> list[str]:
+	keys = [k.strip() for k in settings.app_encryption_key.split(",") if k.strip()]
+	if not keys:
+		raise RuntimeError("APP_ENCRYPTION_KEY is required")
+	return keys
+
+def get_fernet() -> MultiFernet:
+	# APP_ENCRYPTION_KEY="new,old,...": encrypts with the first key, decrypts with any of them
+	global _cached, _primary
 	if _cached is None:
-		if not settings.app_encryption_key:
-			raise RuntimeError("APP_ENCRYPTION_KEY is required")
-		_cached = Fernet(settings.app_encryption_key)
+		fernets = [Fernet(k) for k in _keys()]
+		_primary = fernets[0]
+		_cached = MultiFernet(fernets)
 	return _cached
 
 def encrypt_text(plain: str) -> str:
 	return get_fernet().encrypt(plain.encode()).decode()
 
 def decrypt_text(token: str) -> str:
-	return get_fernet().decrypt(token.encode()).decode()
\ No newline at end of file
+	with _decrypted_lock:
+		plain = _decrypted.get(token)
+		if plain is not None:
+			_decrypted.move_to_end(token)
+			return plain
+	plain = get_fernet().decrypt(token.encode()).decode()
+	if settings.decrypt_cache_size > 0:
+		with _decrypted_lock:
+			_decrypted[token] = plain
+			while len(_decrypted) > settings.decrypt_cache_size:
+				_decrypted.popitem(last=False)
+	return plain
+
+def rotate_text(token: str) -> str | None:
+	# re-encrypted ciphertext under the primary key, None if it already is
+	get_fernet()
+	try:
+		_primary.decrypt(token.encode())
+		return None
+	except InvalidToken:
+		pass
+	return get_fernet().rotate(token.encode()).decode()
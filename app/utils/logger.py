@@ -1,8 +1,89 @@
 from loguru import logger
+import asyncio
 import sys
+import time
+from typing import Hashable
+from app.config import settings
+
+_LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_min_level = _LEVELS.get(settings.log_level.upper(), 20)
 
 logger.remove()
-logger.add(sys.stdout, level="INFO", backtrace=False, diagnose=False, enqueue=True,
+# LOG_JSON: one JSON object per line (loguru's serializer: message, level, time, module/function/line,
+# exception and the fields bound with logger.bind) for log shippers
+logger.add(sys.stdout, level=_min_level, backtrace=False, diagnose=False, enqueue=True, serialize=settings.log_json,
 	format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
 
-__all__ = ["logger"]
\ No newline at end of file
+def log_enabled(level: str) -> bool:
+	# for hot paths: skip building the message when the level is filtered out anyway
+	return _LEVELS[level] >= _min_level
+
+class _Window:
+	__slots__ = ("started", "count", "message", "level")
+
+	def __init__(self, started: float, message: str, level: str) -> None:
+		self.started = started
+		self.count = 0
+		self.message = message
+		self.level = level
+
+# Collapses repeated errors: per key (e.g. runner, destination, error type) the first LOG_ERROR_SAMPLES
+# occurrences of every LOG_ERROR_WINDOW are logged in full, the rest only counted and reported as one
+# summary line when the window closes. A destination that banned the bot costs one traceback and a
+# line a minute instead of a traceback per message.
+class ThrottledLog:
+	def __init__(self) -> None:
+		self._windows: dict[Hashable, _Window] = {}
+		self._flusher: asyncio.Task | None = None
+
+	def log(self, level: str, key: tuple, message: str, exc: BaseException | None = None, depth: int = 1) -> None:
+		if not log_enabled(level):
+			return
+		now = time.monotonic()
+		window = self._windows.get(key)
+		if window is None or now - window.started >= settings.log_error_window:
+			if window is not None:
+				self._summary(key, window)
+			window = self._windows[key] = _Window(now, message, level)
+			self._ensure_flusher()
+		window.count += 1
+		if window.count <= settings.log_error_samples:
+			logger.opt(exception=exc, depth=depth).bind(key=list(map(str, key))).log(level, message)
+
+	def error(self, key: tuple, message: str, exc: BaseException | None = None) -> None:
+		self.log("ERROR", key, message, exc, depth=2)
+
+	def warning(self, key: tuple, message: str) -> None:
+		self.log("WARNING", key, message, depth=2)
+
+	def _summary(self, key: Hashable, window: _Window) -> None:
+		suppressed = window.count - settings.log_error_samples
+		if suppressed > 0:
+			logger.bind(key=list(map(str, key)), suppressed=suppressed).log(
+				window.level, f"{window.message} (x{suppressed} more in {settings.log_error_window:g}s)"
+			)
+
+	def flush(self, force: bool = False) -> None:
+		now = time.monotonic()
+		for key, window in list(self._windows.items()):
+			if force or now - window.started >= settings.log_error_window:
+				del self._windows[key]
+				self._summary(key, window)
+
+	def _ensure_flusher(self) -> None:
+		# summaries of keys that went quiet are written by a background sweep, not by the next error
+		if self._flusher is not None and not self._flusher.done():
+			return
+		try:
+			self._flusher = asyncio.get_running_loop().create_task(self._sweep(), name="log-summaries")
+		except RuntimeError:
+			self._flusher = None
+
+	async def _sweep(self) -> None:
+		while self._windows:
+			await asyncio.sleep(settings.log_error_window)
+			self.flush()
+
+throttled = ThrottledLog()
+
+__all__ = ["logger", "log_enabled", "throttled"]
@@ -0,0 +1,90 @@
+import time
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from app.config import settings
+from app.utils.logger import logger
+
+# Counters/histograms are updated inline on the hot path (a dict lookup and an add); gauges that
+# describe state (runners, pools) are read from their owners only when /metrics is scraped.
+
+# one series per runner (bot or session) this process runs: bounded by the runners of one worker, and
+# ForwardingPipeline.stop() removes the series of a runner that stops or moves to another shard
+UPDATES_RECEIVED = Counter("tg_updates_received_total", "Updates a runner received, routed or not", ["kind", "owner"])
+FORWARDS_ATTEMPTED = Counter("tg_forwards_attempted_total", "Deliveries handed to Telegram", ["mode"])
+FORWARDS_SUCCEEDED = Counter("tg_forwards_succeeded_total", "Deliveries Telegram accepted", ["mode"])
+FORWARDS_FAILED = Counter("tg_forwards_failed_total", "Deliveries that failed after rate-limit retries", ["mode"])
+FORWARD_LATENCY = Histogram(
+	"tg_forward_latency_seconds", "From the update being routed to the delivery being accepted", ["mode"],
+	buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+UPDATE_STAGE_SECONDS = Histogram(
+	"tg_update_stage_seconds", "Per-stage time of profiled updates (see app/bots/runner/profiler.py)", ["stage"],
+	buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+TELEGRAM_ERRORS = Counter("tg_errors_total", "Errors raised by Telegram requests, by exception type", ["type"])
+LISTING_CACHE = Counter("listing_cache_requests_total", "Menu listings served from Redis (hit) or the database (miss)", ["listing", "result"])
+REDIS_LATENCY = Histogram(
+	"redis_command_seconds", "Redis command round trip", ["command"],
+	buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+
+class _StateCollector:
+	def __init__(self, runners, engine, http_stats) -> None:
+		self._runners = runners
+		self._engine = engine
+		self._http_stats = http_stats
+
+	def collect(self):
+		live = GaugeMetricFamily("runners_live", "Runner tasks alive in this process", labels=["kind"])
+		live.add_metric(["bot"], sum(1 for t in self._runners.bot_runners.values() if not t.done()))
+		live.add_metric(["userbot"], sum(1 for t in self._runners.userbot_runners.values() if not t.done()))
+		yield live
+		boot = GaugeMetricFamily("runners_boot", "Figures of the last boot resume", labels=["stat"])
+		for name, value in self._runners.stats.items():
+			boot.add_metric([name], value)
+		yield boot
+		pool = self._engine.pool
+		db = GaugeMetricFamily("db_pool_connections", "SQLAlchemy pool connections", labels=["state"])
+		db.add_metric(["size"], pool.size())
+		db.add_metric(["checked_out"], pool.checkedout())
+		db.add_metric(["overflow"], max(0, pool.overflow()))
+		yield db
+		http = GaugeMetricFamily("tg_http_pool_connections", "Shared Bot API connection pool", labels=["state"])
+		for name, value in self._http_stats().items():
+			http.add_metric([name], value)
+		yield http
+
+_runner: web.AppRunner | None = None
+_collector: _StateCollector | None = None
+
+async def _handle(request: web.Request) -> web.Response:
+	return web.Response(body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+async def start_metrics_server() -> None:
+	global _runner, _collector
+	if not settings.metrics_enabled or _runner is not None:
+		return
+	if _collector is None:
+		# imported here: the runner modules import this one for their counters
+		from app.bots.http import get_bot_session
+		from app.bots.runner.manager import runner_manager
+		from app.db.base import engine
+		_collector = _StateCollector(runner_manager, engine, lambda: get_bot_session().pool_stats())
+		REGISTRY.register(_collector)
+	app = web.Application()
+	app.router.add_get("/metrics", _handle)
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	await web.TCPSite(runner, settings.metrics_host, settings.metrics_port).start()
+	_runner = runner
+	logger.info(f"Metrics on http://{settings.metrics_host}:{settings.metrics_port}/metrics")
+
+async def stop_metrics_server() -> None:
+	global _runner
+	if _runner is not None:
+		await _runner.cleanup()
+		_runner = None
+
+def observe_redis(command: str, started: float) -> None:
+	REDIS_LATENCY.labels(command).observe(time.perf_counter() - started)
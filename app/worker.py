@@ -0,0 +1,28 @@
+import asyncio
+from app.bots.http import close_bot_session
+from app.bots.runner.manager import runner_manager
+from app.config import settings
+from app.utils.logger import logger, throttled
+from app.utils.metrics import start_metrics_server, stop_metrics_server
+
+# Runner-only process (no builder bot, no migrations). Start one per core and/or node with
+# SHARDING_ENABLED: made bots and userbot sessions are split between all workers, app.main included.
+async def main():
+	if not settings.sharding_enabled:
+		raise RuntimeError("app.worker requires SHARDING_ENABLED, otherwise every worker would run every bot")
+	await start_metrics_server()
+	await runner_manager.resume_all()
+	try:
+		await asyncio.Event().wait()
+	finally:
+		await runner_manager.close()
+		await close_bot_session()
+		await stop_metrics_server()
+		# summaries of errors collapsed in the last window
+		throttled.flush(force=True)
+
+if __name__ == "__main__":
+	try:
+		asyncio.run(main())
+	except KeyboardInterrupt:
+		logger.info("Shutting down...")
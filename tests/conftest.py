@@ -0,0 +1,4 @@
+# Settings need REDIS_URL to load; the unit tests never connect, so any URL does
+import os
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
@@ -0,0 +1,53 @@
+# AlbumBuffer and JobBatcher, driven on a real event loop with short windows; no network needed.
+import asyncio
+from app.bots.runner.batching import AlbumBuffer, JobBatcher
+from app.bots.runner.delivery import DeliveryJob
+
+def _job(message_id: int, media: str = "") -> DeliveryJob:
+	return DeliveryJob(-100, (message_id,), -200, "copy", media=(media,) if media else ())
+
+def test_batcher_keeps_order_across_text_and_media():
+	sent: list[DeliveryJob] = []
+
+	async def run():
+		batcher = JobBatcher(0.05, sent.extend)
+		batcher.add([_job(1)])
+		batcher.add([_job(2)])
+		batcher.add([_job(3, "photo")])
+		await asyncio.sleep(0.1)
+		batcher.flush_all()
+
+	asyncio.run(run())
+	assert [job.message_ids for job in sent] == [(1,), (2, 3)]
+	assert sent[1].media == ("", "photo")
+
+def test_batcher_splits_at_max_ids():
+	sent: list[DeliveryJob] = []
+
+	async def run():
+		batcher = JobBatcher(0.05, sent.extend, max_ids=3)
+		for message_id in range(1, 9):
+			batcher.add([_job(message_id)])
+		await asyncio.sleep(0.1)
+		batcher.flush_all()
+
+	asyncio.run(run())
+	assert [job.message_ids for job in sent] == [(1,), (2, 3, 4), (5, 6, 7), (8,)]
+
+def test_album_flushes_on_another_group():
+	emitted: list[tuple[int, tuple[int, ...], tuple[str, ...]]] = []
+
+	def emit(source_chat_id, message_ids, media_refs, features):
+		emitted.append((source_chat_id, message_ids, media_refs))
+
+	async def run():
+		albums = AlbumBuffer(10.0, emit)
+		albums.add(-100, 2, "g1", "b")
+		albums.add(-100, 1, "g1", "a")
+		assert emitted == []
+		albums.add(-100, 3, "g2", "c")
+		albums.add(-100, 4, None)
+		albums.flush_all()
+
+	asyncio.run(run())
+	assert emitted == [(-100, (1, 2), ("a", "b")), (-100, (3,), ("c",)), (-100, (4,), ("",))]
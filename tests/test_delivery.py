@@ -0,0 +1,14 @@
+# DeliveryJob's compact stream encoding.
+from app.bots.runner.delivery import DeliveryJob
+
+def test_fields_round_trip():
+	job = DeliveryJob(-1001, (5, 6, 7), -1002, "forward", attempt=2, media=("", "AgAD", ""), received_at=1700000000.25)
+	fields = job.to_fields()
+	assert all(isinstance(v, str) for v in fields.values())
+	assert DeliveryJob.from_fields(fields) == job
+
+def test_optional_fields_are_omitted():
+	job = DeliveryJob(1, (2,), 3, "copy")
+	fields = job.to_fields()
+	assert "x" not in fields and "t" not in fields
+	assert DeliveryJob.from_fields(fields) == job
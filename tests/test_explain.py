@@ -0,0 +1,30 @@
+# The index checks of app.db.explain against DATABASE_URL (migrated with alembic upgrade head);
+# skipped when no Postgres is configured or reachable.
+import asyncio
+import os
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+	pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy.exc import DBAPIError
+from app.db.base import engine
+from app.db.explain import check
+
+async def _plans() -> list[tuple[str, set[str], set[str]]]:
+	try:
+		try:
+			conn = await engine.connect()
+		except (OSError, DBAPIError) as e:
+			pytest.skip(f"Postgres not reachable: {e}")
+		try:
+			return await check(conn)
+		finally:
+			await conn.close()
+	finally:
+		await engine.dispose()
+
+def test_hot_queries_use_their_indexes():
+	results = asyncio.run(_plans())
+	missing = {name: sorted(expected - used) for name, expected, used in results if expected - used}
+	assert not missing, f"queries not served by their indexes: {missing}"
@@ -0,0 +1,55 @@
+# FanOut: strict FIFO per destination, destinations served concurrently.
+import asyncio
+from app.bots.runner.fanout import FanOut
+
+def test_fifo_per_key_and_keys_in_parallel():
+	order: list[tuple[str, int]] = []
+	running = 0
+	peak = 0
+
+	def send(key: str, n: int, delay: float):
+		async def _send():
+			nonlocal running, peak
+			running += 1
+			peak = max(peak, running)
+			await asyncio.sleep(delay)
+			running -= 1
+			order.append((key, n))
+			return n
+		return _send
+
+	async def run():
+		fanout = FanOut(10)
+		futures = []
+		for n in range(5):
+			# later items of "a" finish faster: they must still wait for the earlier ones
+			futures.append(fanout.submit("a", send("a", n, 0.05 - n * 0.01)))
+			futures.append(fanout.submit("b", send("b", n, 0.01)))
+		results = await asyncio.gather(*futures)
+		await fanout.close()
+		return results
+
+	results = asyncio.run(run())
+	assert [n for key, n in order if key == "a"] == list(range(5))
+	assert [n for key, n in order if key == "b"] == list(range(5))
+	assert peak == 2
+	assert results == [n for n in range(5) for _ in "ab"]
+
+def test_error_fails_only_its_job():
+	async def boom():
+		raise ValueError("nope")
+
+	async def ok():
+		return "sent"
+
+	async def run():
+		fanout = FanOut(1)
+		failed = fanout.submit(1, boom)
+		sent = fanout.submit(1, ok)
+		results = await asyncio.gather(failed, sent, return_exceptions=True)
+		await fanout.close()
+		return results
+
+	failed, sent = asyncio.run(run())
+	assert isinstance(failed, ValueError)
+	assert sent == "sent"
@@ -0,0 +1,34 @@
+# Keyword automaton, regex compilation and per-rule evaluation of SourceFilters.
+from app.bots.runner.filters import PHOTO, TEXT, KeywordMatcher, MessageFeatures, SourceFilters, _AnyRegex, _compile_regexes
+
+def _text(text: str, sender_id: int | None = 1) -> MessageFeatures:
+	return MessageFeatures(text=text, sender_id=sender_id, media_type=TEXT, has_link=False, is_forward=False)
+
+def test_matcher_reports_overlapping_keywords():
+	matcher = KeywordMatcher(["he", "she", "his", "hers"])
+	assert matcher.scan("ushers") == 0b1011
+	assert matcher.scan("this") == 0b0100
+	assert matcher.scan("nothing") == 0
+
+def test_keywords_are_case_folded():
+	filters = SourceFilters([{"keywords": ["Straße", "BTC"]}, {"exclude_keywords": ["btc"]}, {}])
+	assert filters.evaluate(_text("buy btc now")) == [True, False, True]
+	assert filters.evaluate(_text("STRASSE closed")) == [True, True, True]
+	assert filters.evaluate(_text("no match")) == [False, True, True]
+
+def test_regexes_are_joined_unless_backreferenced():
+	joined = _compile_regexes([r"foo\d+", r"bar"])
+	assert not isinstance(joined, _AnyRegex)
+	assert joined.search("BAR") and joined.search("foo12") and not joined.search("baz")
+	# joining would renumber the group \1 points at
+	separate = _compile_regexes([r"x", r"(a)\1"])
+	assert isinstance(separate, _AnyRegex)
+	assert separate.search("aa") and not separate.search("ab")
+
+def test_invalid_regex_and_senders_are_ignored():
+	assert _compile_regexes(["(unclosed"]) is None
+	filters = SourceFilters([{"regex": ["(unclosed", "ok"], "allow_senders": ["x", 7], "media_types": ["text"]}])
+	assert filters.evaluate(_text("ok", sender_id=7)) == [True]
+	assert filters.evaluate(_text("ok", sender_id=8)) == [False]
+	photo = MessageFeatures(text="ok", sender_id=7, media_type=PHOTO, has_link=False, is_forward=False)
+	assert filters.evaluate(photo) == [False]
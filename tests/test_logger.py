@@ -0,0 +1,19 @@
+# ThrottledLog: full entries up to LOG_ERROR_SAMPLES per key and window, then one summary line.
+from app.config import settings
+from app.utils.logger import ThrottledLog, logger
+
+def test_repeated_errors_collapse_into_a_summary(monkeypatch):
+	monkeypatch.setattr(settings, "log_error_samples", 2)
+	monkeypatch.setattr(settings, "log_error_window", 60.0)
+	messages: list[str] = []
+	sink = logger.add(lambda m: messages.append(m.record["message"]), level="WARNING")
+	try:
+		log = ThrottledLog()
+		for _ in range(5):
+			log.error(("chat", 1), "send failed")
+		log.warning(("chat", 2), "flood")
+		assert messages == ["send failed", "send failed", "flood"]
+		log.flush(force=True)
+	finally:
+		logger.remove(sink)
+	assert messages[3:] == ["send failed (x3 more in 60s)"]
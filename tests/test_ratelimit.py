@@ -0,0 +1,40 @@
+# TokenBucket and TelegramRateLimiter timing, on the monotonic clock the limiter uses.
+import asyncio
+import time
+from app.bots.runner.ratelimit import TelegramRateLimiter, TokenBucket
+
+def test_bucket_goes_into_debt_in_order():
+	bucket = TokenBucket(rate=10.0, capacity=2)
+	now = bucket.updated
+	assert bucket.reserve(now) == 0.0
+	assert bucket.reserve(now) == 0.0
+	# out of tokens: each further caller waits one more token period
+	assert abs(bucket.reserve(now) - 0.1) < 1e-9
+	assert abs(bucket.reserve(now) - 0.2) < 1e-9
+	assert not bucket.idle(now)
+	assert bucket.idle(now + 0.5)
+
+def test_bucket_block_delays_even_with_tokens():
+	bucket = TokenBucket(rate=10.0, capacity=5)
+	now = bucket.updated
+	bucket.block(now, 3.0)
+	assert abs(bucket.reserve(now) - 3.0) < 1e-9
+	# a shorter block never cuts a longer one
+	bucket.block(now, 1.0)
+	assert abs(bucket.reserve(now + 1.0) - 2.0) < 1e-9
+
+def test_penalize_pauses_only_that_chat():
+	limiter = TelegramRateLimiter(global_rate=1000, chat_rate=1000, group_per_minute=60000)
+
+	async def timed(chat_id: int) -> float:
+		started = time.monotonic()
+		await limiter.acquire(chat_id)
+		return time.monotonic() - started
+
+	async def run():
+		limiter.penalize(1, 0.2)
+		return await asyncio.gather(timed(1), timed(2))
+
+	penalized, other = asyncio.run(run())
+	assert penalized >= 0.19
+	assert other < 0.1